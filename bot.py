@@ -1,19 +1,22 @@
 import os
 import asyncio
+import random
+import time as time_module
 from datetime import timedelta, time
-
-# --- Разрешаем unsafe-доступ к Django ORM (только для локального бота!) ---
-os.environ["DJANGO_ALLOW_ASYNC_UNSAFE"] = "true"
+from zoneinfo import ZoneInfo
 
 import django
+from aiohttp import web
 from aiogram import Bot, Dispatcher, types
-from aiogram.filters import Command
-from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, FSInputFile
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, BufferedInputFile
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from django.conf import settings
 from django.utils import timezone
 from dotenv import load_dotenv
-from gtts import gTTS
 
 # --- Установка event loop для Windows ---
 try:
@@ -32,12 +35,97 @@ TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
 if not TOKEN:
     raise ValueError("TELEGRAM_BOT_TOKEN не найден в .env")
 
-bot = Bot(token=TOKEN)
-dp = Dispatcher()
-
 # --- Импорт моделей после django.setup() ---
+from asgiref.sync import sync_to_async
 from django.contrib.auth.models import User
-from cards.models import Card, Schedule, UserStats
+from django.db import IntegrityError, close_old_connections
+from cards.models import Card, Schedule, UserStats, normalize_word
+from cards import metrics, reminders, search, sync, tts
+from cards.cache import card_cache
+from cards.reviewlog import review_log
+from cards.sampling import sampler
+from cards.pagination import keyset_slice
+from bot_activity import ActivityTracker
+from bot_middlewares import ActivityMiddleware, DBConnectionMiddleware, MetricsMiddleware
+from bot_paging import encode_position, page_keyboard, parse_page_data, shorten
+from bot_identity import IdentityCache
+from bot_router import CommandTable
+from bot_storage import build_storage
+from bot_webhook import run_webhook
+
+# --- Хранилище состояний диалогов ---
+# BOT_FSM_STORAGE: memory | sqlite:///bot_fsm.sqlite3 | redis://localhost:6379/0
+FSM_TTL = int(os.getenv('BOT_FSM_TTL', 6 * 3600))
+storage = build_storage(
+    os.getenv('BOT_FSM_STORAGE', 'memory'),
+    ttl=FSM_TTL,
+    max_entries=int(os.getenv('BOT_FSM_MAX_ENTRIES', 100_000))
+)
+
+# Telegram ID → пользователь: горячие чаты не ходят в базу за привязкой
+identities = IdentityCache(ttl=int(os.getenv('BOT_IDENTITY_TTL', 600)))
+
+# BOT_API_SERVER — свой Bot API сервер (локальный или тестовый) вместо api.telegram.org
+API_SERVER = os.getenv('BOT_API_SERVER')
+if API_SERVER:
+    bot = Bot(token=TOKEN, session=AiohttpSession(api=TelegramAPIServer.from_base(API_SERVER)))
+else:
+    bot = Bot(token=TOKEN)
+dp = Dispatcher(storage=storage)
+# Соединения с БД: закрываем устаревшие до и после каждого апдейта
+dp.update.outer_middleware(DBConnectionMiddleware())
+# Активность пользователей: копится в памяти, в UserStats — пачками
+activity = ActivityTracker()
+dp.update.outer_middleware(ActivityMiddleware(activity))
+# Время и SQL каждого обработчика — для /metrics
+dp.message.middleware(MetricsMiddleware())
+dp.callback_query.middleware(MetricsMiddleware())
+
+# Команды и ответы в диалогах: поиск обработчика по таблицам (см. bot_router)
+commands = CommandTable()
+dp.include_router(commands.router)
+
+
+# --- Состояния диалогов ---
+class CardEditor(StatesGroup):
+    add = State()
+    edit_word = State()
+    edit_card = State()
+    delete_word = State()
+
+
+class Quiz(StatesGroup):
+    test = State()
+    match = State()
+
+
+class Review(StatesGroup):
+    answer = State()
+
+
+class Reminder(StatesGroup):
+    time = State()
+
+
+REVIEW_BUTTONS = {"🔴 Забыл": 'hard', "🟡 Сложно": 'good', "🟢 Легко": 'easy'}
+
+CARD_FORMAT = "`слово | перевод | пример | примечание | уровень`"
+
+
+def parse_card_fields(text):
+    """
+    Разбирает «слово | перевод | пример | примечание | уровень».
+    Обязательны слово и перевод; неизвестный уровень — ValueError.
+    """
+    parts = [part.strip() for part in text.split('|')]
+    parts += [''] * (5 - len(parts))
+    word, translation, example, note, level = parts[:5]
+    if not word or not translation:
+        raise ValueError("нужны слово и перевод")
+    level = level or 'beginner'
+    if level not in ('beginner', 'intermediate', 'advanced'):
+        raise ValueError("уровень: beginner, intermediate или advanced")
+    return {'word': word, 'translation': translation, 'example': example, 'note': note, 'level': level}
 
 
 # --- Клавиатура ---
@@ -54,27 +142,27 @@ def get_main_keyboard():
 
 
 # --- /start — с автоматическим /help ---
-@dp.message(Command("start"))
+@commands.command("start")
 async def cmd_start(message: types.Message):
     user_id = message.from_user.id
     try:
-        user_stats = UserStats.objects.get(telegram_id=user_id)
+        await identities.resolve(user_id)
         await message.answer("С возвращением! Я тебя помню 😊", reply_markup=get_main_keyboard())
         await cmd_help(message)
     except UserStats.DoesNotExist:
         try:
-            user = User.objects.first()
+            user = await User.objects.afirst()
             if not user:
                 await message.answer("Ошибка: нет пользователей в системе.")
                 return
 
-            user_stats, created = UserStats.objects.get_or_create(
-                user=user,
-                defaults={'telegram_id': user_id}
-            )
-            if not created:
-                user_stats.telegram_id = user_id
-                user_stats.save()
+            user_stats, _ = await UserStats.objects.aget_or_create(user=user)
+            if user_stats.telegram_id:
+                # Аккаунт был привязан к другому чату — забываем старую привязку
+                identities.invalidate(int(user_stats.telegram_id))
+            user_stats.telegram_id = user_id
+            user_stats.schedule_next_reminder()
+            await user_stats.asave()
 
             await message.answer(
                 f"Привет, {message.from_user.first_name}! 👋\n"
@@ -89,7 +177,7 @@ async def cmd_start(message: types.Message):
 
 
 # --- /help ---
-@dp.message(Command("help"))
+@commands.command("help")
 async def cmd_help(message: types.Message):
     await message.answer(
         "📚 Доступные команды:\n"
@@ -99,6 +187,7 @@ async def cmd_help(message: types.Message):
         "  /review — повторить слова\n"
         "  /progress — мой прогресс\n"
         "  /cards — мои карточки\n"
+        "  /find <текст> — найти карточку\n"
         "  /add — добавить карточку\n"
         "  /edit — изменить карточку\n"
         "  /delete — удалить карточку\n"
@@ -108,48 +197,125 @@ async def cmd_help(message: types.Message):
     )
 
 
-# --- /today — слова на повторении ---
-@dp.message(Command("today"))
-async def cmd_today(message: types.Message):
-    user_id = message.from_user.id
-    try:
-        user_stats = UserStats.objects.select_related('user').get(telegram_id=user_id)
-        user = user_stats.user
+# --- Постраничные списки: /today и /cards ---
+TODAY_PAGE_SIZE = 20
+CARDS_PAGE_SIZE = 10
 
-        due_cards = list(
-            Card.objects.filter(
-                owner=user,
-                schedule__next_review__lte=timezone.now()
-            )
+
+async def list_page(user_id, name, fetch, position=None, backward=False):
+    """
+    Одна страница списка: (строки, позиции крайних строк, есть ли назад, есть ли дальше).
+    fetch(position, backward) -> (строки, позиции строк, есть ли ещё) — один
+    keyset-запрос; результат кэшируется до изменения карточек пользователя.
+    """
+    key = encode_position(*position) if position else ''
+    lines, positions, has_more = await sync_to_async(card_cache.get_or_compute)(
+        user_id, name, lambda: fetch(position, backward), key, 'p' if backward else 'n'
+    )
+    if position is not None and not lines:
+        # Всё, что было раньше (или дальше), удалено — показываем начало списка
+        return await list_page(user_id, name, fetch)
+    if backward:
+        has_prev, has_next = has_more, True
+    else:
+        has_prev, has_next = position is not None, has_more
+    return lines, positions, has_prev, has_next
+
+
+async def today_page(user_id, position=None, backward=False):
+    def fetch(position, backward):
+        schedules, has_more = keyset_slice(
+            Schedule.objects.due(user_id).only('id', 'next_review', 'card__word', 'card__translation'),
+            ('next_review', 'id'), position, TODAY_PAGE_SIZE, backward
         )
+        lines = [f"📌 <b>{shorten(s.card.word)}</b> → {shorten(s.card.translation)}" for s in schedules]
+        return lines, [(s.next_review, s.id) for s in schedules], has_more
 
-        if due_cards:
-            response = "Слова на сегодня:\n\n"
-            for card in due_cards:
-                response += f"📌 *{card.word}* → {card.translation}\n"
-            await message.answer(response, parse_mode="Markdown")
-        else:
-            await message.answer("🎉 Сегодня нет слов для повторения!")
+    lines, positions, has_prev, has_next = await list_page(user_id, 'due', fetch, position, backward)
+    if not lines:
+        return "🎉 Сегодня нет слов для повторения!", None
+    text = "Слова на сегодня:\n\n" + "\n".join(lines)
+    return text, page_keyboard('today', positions[0], positions[-1], has_prev, has_next)
+
+
+async def cards_page(user_id, position=None, backward=False):
+    def fetch(position, backward):
+        cards, has_more = keyset_slice(
+            Card.objects.filter(owner_id=user_id).only('id', 'created_at', 'word', 'translation'),
+            ('created_at', 'id'), position, CARDS_PAGE_SIZE, backward
+        )
+        lines = [f"• <b>{shorten(card.word)}</b> → {shorten(card.translation)}" for card in cards]
+        return lines, [(card.created_at, card.id) for card in cards], has_more
+
+    lines, positions, has_prev, has_next = await list_page(user_id, 'bot_cards', fetch, position, backward)
+    if not lines:
+        return "У тебя пока нет карточек.", None
+    text = "Твои карточки:\n\n" + "\n".join(lines)
+    return text, page_keyboard('cards', positions[0], positions[-1], has_prev, has_next)
+
+
+@commands.command("today")
+async def cmd_today(message: types.Message):
+    try:
+        identity = await identities.resolve(message.from_user.id)
+        text, keyboard = await today_page(identity.user_id)
+        await message.answer(text, parse_mode="HTML", reply_markup=keyboard)
     except Exception as e:
         await message.answer("Ошибка при загрузке слов.")
         print(f"Ошибка /today: {e}")
 
 
+@commands.command("cards")
+async def cmd_cards(message: types.Message):
+    try:
+        identity = await identities.resolve(message.from_user.id)
+        text, keyboard = await cards_page(identity.user_id)
+        await message.answer(text, parse_mode="HTML", reply_markup=keyboard)
+    except Exception as e:
+        await message.answer("Ошибка при загрузке карточек.")
+        print(f"Ошибка /cards: {e}")
+
+
+async def turn_page(callback, data, render):
+    """
+    Кнопка ◀/▶: та же страница строится заново по позиции из callback_data
+    и заменяет текст сообщения — новых сообщений не появляется.
+    """
+    try:
+        identity = await identities.resolve(callback.from_user.id)
+        position, backward = parse_page_data(data)
+        text, keyboard = await render(identity.user_id, position, backward)
+        await callback.message.edit_text(text, parse_mode="HTML", reply_markup=keyboard)
+        await callback.answer()
+    except Exception as e:
+        await callback.answer("Не удалось загрузить страницу.")
+        print(f"Ошибка листания ({render.__name__}): {e}")
+
+
+@commands.callback("today")
+async def page_today(callback: types.CallbackQuery, data):
+    await turn_page(callback, data, today_page)
+
+
+@commands.callback("cards")
+async def page_cards(callback: types.CallbackQuery, data):
+    await turn_page(callback, data, cards_page)
+
+
 # --- /progress — статистика ---
-@dp.message(Command("progress"))
+@commands.command("progress")
 async def cmd_progress(message: types.Message):
     user_id = message.from_user.id
     try:
-        user_stats = UserStats.objects.select_related('user').get(telegram_id=user_id)
-        user = user_stats.user
+        identity = await identities.resolve(user_id)
 
-        total = Card.objects.filter(owner=user).count()
-        learned = Card.objects.filter(owner=user, schedule__repetitions__gte=3).count()
+        # Счётчики хранятся в UserStats — одна строка по первичному ключу
+        user_stats = await UserStats.objects.aget(pk=identity.stats_id)
 
         await message.answer(
             f"📊 Твой прогресс:\n"
-            f"Всего карточек: {total}\n"
-            f"Выучено слов: {learned}\n"
+            f"Всего карточек: {user_stats.total_cards}\n"
+            f"Выучено слов: {user_stats.learned_cards}\n"
             f"Серия повторений: {user_stats.review_streak}"
         )
     except Exception as e:
@@ -157,30 +323,57 @@ async def cmd_progress(message: types.Message):
         print(f"Ошибка /progress: {e}")
 
 
-# --- /cards — список карточек ---
-@dp.message(Command("cards"))
-async def cmd_cards(message: types.Message):
-    user_id = message.from_user.id
-    try:
-        user_stats = UserStats.objects.select_related('user').get(telegram_id=user_id)
-        user = user_stats.user
-
-        cards = list(Card.objects.filter(owner=user)[:10])
+# --- /find — поиск по карточкам ---
+@commands.command("find")
+async def cmd_find(message: types.Message):
+    parts = message.text.split(' ', 1)
+    query = parts[1].strip() if len(parts) > 1 else ''
+    if not search.fts_query(query):
+        await message.answer("Напиши, что искать. Пример: /find cat")
+        return
 
+    try:
+        identity = await identities.resolve(message.from_user.id)
+        cards = await sync_to_async(search.search)(
+            identity.user_id, query, 10, fields=('id', 'word', 'translation')
+        )
         if cards:
-            response = "Твои карточки (первые 10):\n\n"
+            response = "Нашлось:\n\n"
             for card in cards:
                 response += f"• *{card.word}* → {card.translation}\n"
             await message.answer(response, parse_mode="Markdown")
         else:
-            await message.answer("У тебя пока нет карточек.")
+            await message.answer("Ничего не нашлось.")
     except Exception as e:
-        await message.answer("Ошибка при загрузке карточек.")
-        print(f"Ошибка /cards: {e}")
+        await message.answer("Ошибка при поиске.")
+        print(f"Ошибка /find: {e}")
+
+
+async def find_card(owner_id, text):
+    """
+    Карточка по слову: сначала совпадение по word_key (без учёта регистра
+    и лишних пробелов — как при добавлении), затем полнотекстовый поиск.
+    Возвращает (карточка или None, похожие карточки).
+    """
+    card = await Card.objects.filter(owner_id=owner_id, word_key=normalize_word(text)).afirst()
+    if card:
+        return card, []
+    found = await sync_to_async(search.search)(owner_id, text, 5)
+    return None, found
+
+
+def similar_words(cards):
+    return ", ".join(f"*{card.word}*" for card in cards)
 
 
 # --- /say — озвучка слова ---
-@dp.message(Command("say"))
+def read_audio(word):
+    audio, _ = tts.open_audio(word)
+    with audio:
+        return audio.read()
+
+
+@commands.command("say")
 async def cmd_say(message: types.Message):
     text = message.text.split(' ', 1)
     if len(text) < 2:
@@ -192,68 +385,158 @@ async def cmd_say(message: types.Message):
         await message.answer("Слово не может быть пустым.")
         return
 
-    os.makedirs("temp", exist_ok=True)
-    audio_path = f"temp/{word}.mp3"
-
     try:
-        tts = gTTS(text=word, lang='en')
-        tts.save(audio_path)
-        voice = FSInputFile(audio_path)
+        # Общий с сайтом кэш: синтез только при первом запросе слова.
+        # Файл читаем сразу — до отправки его может вытеснить LRU
+        audio = await asyncio.to_thread(read_audio, word)
+        voice = BufferedInputFile(audio, filename=f"{word}.mp3")
         await message.answer_voice(voice, caption=f"🔊 *{word}*", parse_mode="Markdown")
     except Exception as e:
         await message.answer(f"Не удалось озвучить слово: {e}")
-    finally:
-        if os.path.exists(audio_path):
-            os.remove(audio_path)
 
 
 # --- Редактор карточек ---
-@dp.message(Command("add"))
-async def cmd_add(message: types.Message):
-    await message.answer("Отправь: `слово | перевод | пример | примечание | уровень`")
-    if not hasattr(bot, 'waiting_for'):
-        bot.waiting_for = {}
-    bot.waiting_for[message.from_user.id] = 'add_card'
+@commands.command("add")
+async def cmd_add(message: types.Message, state: FSMContext):
+    await message.answer(f"Отправь: {CARD_FORMAT}", parse_mode="Markdown")
+    await state.set_state(CardEditor.add)
+
 
+@commands.state(CardEditor.add)
+async def handle_add_card(message: types.Message, state: FSMContext):
+    try:
+        fields = parse_card_fields(message.text)
+    except ValueError as e:
+        await message.answer(f"Не получилось: {e}. Формат: {CARD_FORMAT}", parse_mode="Markdown")
+        return
+
+    try:
+        identity = await identities.resolve(message.from_user.id)
+        # Слово уже есть в колоде — обновляем карточку, а не заводим дубликат
+        [card], inserted = await sync_to_async(Card.objects.upsert)(identity.user_id, [Card(**fields)])
+        sampler.invalidate(identity.user_id)
+        await state.clear()
+        done = "✅ Добавлено" if inserted else "✏️ Обновлено"
+        await message.answer(f"{done}: *{card.word}* → {card.translation}", parse_mode="Markdown")
+    except Exception as e:
+        await message.answer("Ошибка при добавлении карточки.")
+        print(f"Ошибка /add: {e}")
 
-@dp.message(Command("edit"))
-async def cmd_edit(message: types.Message):
+
+@commands.command("edit")
+async def cmd_edit(message: types.Message, state: FSMContext):
     await message.answer("Напиши слово, которое хочешь изменить.")
-    if not hasattr(bot, 'waiting_for'):
-        bot.waiting_for = {}
-    bot.waiting_for[message.from_user.id] = 'edit_word'
+    await state.set_state(CardEditor.edit_word)
+
+
+@commands.state(CardEditor.edit_word)
+async def handle_edit_word(message: types.Message, state: FSMContext):
+    try:
+        identity = await identities.resolve(message.from_user.id)
+        card, found = await find_card(identity.user_id, message.text.strip())
+        if not card and len(found) == 1:
+            # Единственное похожее слово — его и правим
+            card = found[0]
+        if not card:
+            if found:
+                await message.answer(
+                    f"Точного совпадения нет. Похожие: {similar_words(found)}. Напиши слово целиком.",
+                    parse_mode="Markdown"
+                )
+            else:
+                await message.answer("Такого слова нет. Попробуй ещё раз или /find.")
+            return
+        await state.set_state(CardEditor.edit_card)
+        await state.set_data({'card_id': card.id})
+        await message.answer(
+            f"Сейчас: `{card.word} | {card.translation} | {card.example or ''} | {card.note or ''} | {card.level}`\n"
+            f"Отправь новое значение: {CARD_FORMAT}",
+            parse_mode="Markdown"
+        )
+    except Exception as e:
+        await message.answer("Ошибка при поиске карточки.")
+        print(f"Ошибка /edit: {e}")
+
+
+@commands.state(CardEditor.edit_card)
+async def handle_edit_card(message: types.Message, state: FSMContext):
+    try:
+        fields = parse_card_fields(message.text)
+    except ValueError as e:
+        await message.answer(f"Не получилось: {e}. Формат: {CARD_FORMAT}", parse_mode="Markdown")
+        return
+
+    data = await state.get_data()
+    try:
+        identity = await identities.resolve(message.from_user.id)
+        card = await Card.objects.aget(id=data['card_id'], owner_id=identity.user_id)
+        for name, value in fields.items():
+            setattr(card, name, value)
+        try:
+            await card.asave()
+        except IntegrityError:
+            await message.answer(f"Слово *{card.word}* уже есть в колоде. Отправь другое.", parse_mode="Markdown")
+            return
+        await state.clear()
+        await message.answer(f"✅ Сохранено: *{card.word}* → {card.translation}", parse_mode="Markdown")
+    except Exception as e:
+        await message.answer("Ошибка при изменении карточки.")
+        print(f"Ошибка /edit: {e}")
 
 
-@dp.message(Command("delete"))
-async def cmd_delete(message: types.Message):
+@commands.command("delete")
+async def cmd_delete(message: types.Message, state: FSMContext):
     await message.answer("Напиши слово, которое хочешь удалить.")
-    if not hasattr(bot, 'waiting_for'):
-        bot.waiting_for = {}
-    bot.waiting_for[message.from_user.id] = 'delete_word'
+    await state.set_state(CardEditor.delete_word)
+
+
+@commands.state(CardEditor.delete_word)
+async def handle_delete_word(message: types.Message, state: FSMContext):
+    try:
+        identity = await identities.resolve(message.from_user.id)
+        deleted, _ = await Card.objects.filter(
+            owner_id=identity.user_id, word_key=normalize_word(message.text)
+        ).adelete()
+        if deleted:
+            sampler.invalidate(identity.user_id)
+            await state.clear()
+            await message.answer(f"🗑️ Удалено: *{message.text.strip()}*", parse_mode="Markdown")
+            return
+
+        # Удаляем только по слову целиком; похожие — подсказкой
+        found = await sync_to_async(search.search)(identity.user_id, message.text, 5)
+        if found:
+            await message.answer(
+                f"Точного совпадения нет. Похожие: {similar_words(found)}. Напиши слово целиком.",
+                parse_mode="Markdown"
+            )
+        else:
+            await state.clear()
+            await message.answer("Такого слова нет.")
+    except Exception as e:
+        await message.answer("Ошибка при удалении карточки.")
+        print(f"Ошибка /delete: {e}")
 
 
 # --- /test — тест с карточками ---
-@dp.message(Command("test"))
-async def cmd_test(message: types.Message):
+@commands.command("test")
+async def cmd_test(message: types.Message, state: FSMContext):
     user_id = message.from_user.id
     try:
-        user_stats = UserStats.objects.get(telegram_id=user_id)
-        user = user_stats.user
+        identity = await identities.resolve(user_id)
 
-        cards = list(Card.objects.filter(owner=user))
+        # Загаданная карточка — по возможности из тех, что пора повторить
+        cards = await sync_to_async(sampler.sample)(identity.user_id, 4, prefer_due=True)
         if len(cards) < 4:
             await message.answer("Нужно хотя бы 4 слова.")
             return
 
-        import random
-        random.shuffle(cards)
         card = cards[0]
-        options = [card.translation] + [c.translation for c in random.sample(cards[1:], 3)]
+        options = [c.translation for c in cards]
         random.shuffle(options)
 
-        if not hasattr(bot, 'test_data'):
-            bot.test_data = {}
-        bot.test_data[user_id] = card.translation
+        await state.set_state(Quiz.test)
+        await state.set_data({'correct': card.translation})
 
         keyboard = ReplyKeyboardMarkup(
             keyboard=[[KeyboardButton(text=opt)] for opt in options],
@@ -272,43 +555,35 @@ async def cmd_test(message: types.Message):
 
 
 # --- Ответ на тест ---
-@dp.message(lambda m: hasattr(bot, 'test_data') and m.from_user.id in bot.test_data)
-async def handle_test_answer(message: types.Message):
-    user_id = message.from_user.id
-    correct = bot.test_data[user_id]
+@commands.state(Quiz.test)
+async def handle_test_answer(message: types.Message, state: FSMContext):
+    correct = (await state.get_data()).get('correct')
+    await state.clear()
 
     if message.text == correct:
         await message.answer("✅ Правильно!", reply_markup=get_main_keyboard())
     else:
         await message.answer(f"❌ Правильно: *{correct}*", parse_mode="Markdown", reply_markup=get_main_keyboard())
 
-    del bot.test_data[user_id]
-
 
 # --- /match — игра ---
-@dp.message(Command("match"))
-async def cmd_match(message: types.Message):
+@commands.command("match")
+async def cmd_match(message: types.Message, state: FSMContext):
     user_id = message.from_user.id
     try:
-        user_stats = UserStats.objects.get(telegram_id=user_id)
-        user = user_stats.user
+        identity = await identities.resolve(user_id)
 
-        cards = list(Card.objects.filter(owner=user))
-        if len(cards) < 2:
+        sample = await sync_to_async(sampler.sample)(identity.user_id, 4)
+        if len(sample) < 2:
             await message.answer("Нужно хотя бы 2 слова.")
             return
 
-        import random
-        random.shuffle(cards)
-        sample = cards[:4]
-
         words = [c.word for c in sample]
         translations = [c.translation for c in sample]
         random.shuffle(translations)
 
-        if not hasattr(bot, 'match_data'):
-            bot.match_data = {}
-        bot.match_data[user_id] = {c.word: c.translation for c in sample}
+        await state.set_state(Quiz.match)
+        await state.set_data({'pairs': {c.word: c.translation for c in sample}})
 
         options = translations[:]
         random.shuffle(options)
@@ -330,50 +605,36 @@ async def cmd_match(message: types.Message):
 
 
 # --- Ответ на игру ---
-@dp.message(lambda m: '→' in m.text and m.text.count('→') == 1)
-async def handle_match_answer(message: types.Message):
-    user_id = message.from_user.id
-    if not hasattr(bot, 'match_data') or user_id not in bot.match_data:
-        return
-
-    try:
-        word, given = [part.strip() for part in message.text.split('→')]
-    except:
-        return
+@commands.state(Quiz.match, when=lambda text: text.count('→') == 1)
+async def handle_match_answer(message: types.Message, state: FSMContext):
+    word, given = [part.strip() for part in message.text.split('→')]
 
-    correct = bot.match_data[user_id].get(word)
+    correct = (await state.get_data()).get('pairs', {}).get(word)
     if not correct:
         await message.answer("Ошибка проверки.")
         return
 
     result = "✅ Правильно!" if given == correct else f"❌ Правильно: *{correct}*"
     await message.answer(result, reply_markup=get_main_keyboard(), parse_mode="Markdown")
-    del bot.match_data[user_id]
+    await state.clear()
 
 
 # --- /review — повторение ---
-@dp.message(Command("review"))
-async def cmd_review(message: types.Message):
+@commands.command("review")
+async def cmd_review(message: types.Message, state: FSMContext):
     user_id = message.from_user.id
     try:
-        user_stats = UserStats.objects.get(telegram_id=user_id)
-        user = user_stats.user
+        identity = await identities.resolve(user_id)
 
-        due_cards = list(
-            Card.objects.filter(
-                owner=user,
-                schedule__next_review__lte=timezone.now()
-            )
-        )
+        due_cards = await Card.objects.anext_due(identity.user_id)
 
         if not due_cards:
             await message.answer("🎉 Сегодня нет слов для повторения!")
             return
 
         card = due_cards[0]
-        if not hasattr(bot, 'review_data'):
-            bot.review_data = {}
-        bot.review_data[user_id] = {'card_id': card.id, 'word': card.word}
+        await state.set_state(Review.answer)
+        await state.set_data({'card_id': card.id, 'word': card.word, 'shown_at': time_module.time()})
 
         keyboard = ReplyKeyboardMarkup(
             keyboard=[
@@ -396,30 +657,24 @@ async def cmd_review(message: types.Message):
 
 
 # --- Обработка ответа на повторение ---
-@dp.message(lambda m: m.text in ["🔴 Забыл", "🟡 Сложно", "🟢 Легко"])
-async def handle_review_answer(message: types.Message):
+@commands.state(Review.answer, when=lambda text: text in REVIEW_BUTTONS)
+async def handle_review_answer(message: types.Message, state: FSMContext):
     user_id = message.from_user.id
-    if not hasattr(bot, 'review_data') or user_id not in bot.review_data:
-        return
-
-    data = bot.review_data[user_id]
+    data = await state.get_data()
     try:
-        card = Card.objects.get(id=data['card_id'])
-        schedule = card.schedule
-
-        difficulty = 'hard' if message.text == "🔴 Забыл" \
-            else 'good' if message.text == "🟡 Сложно" else 'easy'
+        identity = await identities.resolve(user_id)
+        difficulty = REVIEW_BUTTONS[message.text]
 
-        # Прямо вызываем — без sync_to_async
-        schedule.update_schedule(difficulty)
-        schedule.save()
+        latency_ms = None
+        if data.get('shown_at'):
+            latency_ms = int((time_module.time() - data['shown_at']) * 1000)
 
-        user_stats = UserStats.objects.get(telegram_id=user_id)
-        user_stats.review_streak += 1
-        user_stats.last_reviewed = timezone.now()
-        user_stats.save()
+        # Расписание и статистика — одной транзакцией
+        await sync_to_async(Schedule.objects.apply_reviews)(
+            identity.user_id, [(data['card_id'], difficulty, timezone.now(), latency_ms)], source='bot'
+        )
 
-        del bot.review_data[user_id]
+        await state.clear()
         await message.answer("✅ Готово!", reply_markup=get_main_keyboard())
     except Exception as e:
         await message.answer("Ошибка при обработке ответа.")
@@ -427,76 +682,131 @@ async def handle_review_answer(message: types.Message):
 
 
 # --- /set_reminder — установка времени напоминаний ---
-@dp.message(Command("set_reminder"))
-async def cmd_set_reminder(message: types.Message):
-    await message.answer("Напиши время в формате `ЧЧ:ММ` (например, `09:00`).")
-    if not hasattr(bot, 'waiting_for'):
-        bot.waiting_for = {}
-    bot.waiting_for[message.from_user.id] = 'set_reminder_time'
+@commands.command("set_reminder")
+async def cmd_set_reminder(message: types.Message, state: FSMContext):
+    await message.answer(
+        "Напиши время в формате `ЧЧ:ММ` (например, `09:00`).\n"
+        "Можно указать часовой пояс: `09:00 Europe/Berlin`."
+    )
+    await state.set_state(Reminder.time)
 
 
 # --- Обработка времени ---
-@dp.message()
-async def handle_reminder_time(message: types.Message):
-    if not hasattr(bot, 'waiting_for') or message.from_user.id not in bot.waiting_for:
-        return
-
-    if bot.waiting_for[message.from_user.id] != 'set_reminder_time':
-        return
-
+@commands.state(Reminder.time)
+async def handle_reminder_time(message: types.Message, state: FSMContext):
     try:
-        time_str = message.text.strip()
+        parts = message.text.split()
+        time_str = parts[0]
         hours, minutes = map(int, time_str.split(':'))
         reminder_time = time(hour=hours, minute=minutes)
 
-        user_stats = UserStats.objects.get(telegram_id=message.from_user.id)
+        identity = await identities.resolve(message.from_user.id)
+        user_stats = await UserStats.objects.aget(pk=identity.stats_id)
         user_stats.reminder_time = reminder_time
-        user_stats.save()
-
+        if len(parts) > 1:
+            # Неизвестный пояс — ZoneInfoNotFoundError, сообщаем о неверном формате
+            ZoneInfo(parts[1])
+            user_stats.timezone = parts[1]
+        user_stats.schedule_next_reminder()
+        await user_stats.asave()
+
+        await state.clear()
         await message.answer(f"✅ Напоминания установлены на {time_str}.")
-        del bot.waiting_for[message.from_user.id]
     except Exception:
         await message.answer("Неверный формат. Используй `ЧЧ:ММ`.")
 
 
-# --- Логирование активных пользователей ---
-@dp.message()
-async def log_user(message: types.Message):
-    if not hasattr(bot, 'active_users'):
-        bot.active_users = set()
-    bot.active_users.add(message.from_user.id)
-
-
 # --- Напоминания ---
 async def send_local_reminders():
-    if not hasattr(bot, 'active_users') or not bot.active_users:
-        return
-
-    now = timezone.now().time()
-    for user_id in list(bot.active_users):
-        try:
-            user_stats = UserStats.objects.get(telegram_id=user_id)
-            if user_stats.reminder_time:
-                if (user_stats.reminder_time.hour == now.hour and
-                        abs(user_stats.reminder_time.minute - now.minute) < 2):
-                    await bot.send_message(
-                        chat_id=user_id,
-                        text="🔔 *Напоминание!* ⏰\n"
-                             "Не забудь повторить слова сегодня!\n\n"
-                             "📌 /today — начать повторение",
-                        parse_mode="Markdown"
-                    )
-        except Exception as e:
-            print(f"❌ Не удалось отправить напоминание {user_id}: {e}")
+    # Задача планировщика идёт мимо диспетчера — соединения освобождаем сами
+    await sync_to_async(close_old_connections)()
+
+    while True:
+        # Слоты переносятся до отправки: повторный тик не продублирует напоминание
+        recipients, claimed = await sync_to_async(reminders.claim_due_reminders)()
+        for telegram_id, due_count in recipients:
+            due_line = f"На повторении: *{due_count}* сл.\n\n" if due_count else ""
+            try:
+                await bot.send_message(
+                    chat_id=telegram_id,
+                    text="🔔 *Напоминание!* ⏰\n"
+                         "Не забудь повторить слова сегодня!\n\n"
+                         f"{due_line}"
+                         "📌 /today — начать повторение",
+                    parse_mode="Markdown"
+                )
+            except Exception as e:
+                print(f"❌ Не удалось отправить напоминание {telegram_id}: {e}")
+        # Считаем забранные строки, а не получателей: опоздавшие напоминания
+        # не отправляются, но порция от этого не становится последней
+        if claimed < reminders.BATCH_SIZE:
+            break
 
 
 # --- Запуск бота ---
+# --- Метрики процесса бота для Prometheus ---
+# BOT_METRICS_PORT=0 — не поднимать
+METRICS_HOST = os.getenv('BOT_METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('BOT_METRICS_PORT', 9101))
+
+
+async def serve_metrics(request):
+    return web.Response(body=metrics.render().encode('utf-8'), headers={'Content-Type': metrics.CONTENT_TYPE})
+
+
+async def start_metrics_server():
+    app = web.Application()
+    app.router.add_get('/metrics', serve_metrics)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, METRICS_HOST, METRICS_PORT).start()
+    print(f"📈 Метрики: http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+    return runner
+
+
+# --- Режим получения апдейтов ---
+# BOT_MODE=polling (по умолчанию) | webhook
+BOT_MODE = os.getenv('BOT_MODE', 'polling')
+
+
+async def run_updates():
+    if BOT_MODE == 'webhook':
+        await run_webhook(
+            dp, bot,
+            url=os.environ['BOT_WEBHOOK_URL'],
+            path=os.getenv('BOT_WEBHOOK_PATH', '/webhook'),
+            host=os.getenv('BOT_WEBHOOK_HOST', '0.0.0.0'),
+            port=int(os.getenv('BOT_WEBHOOK_PORT', 8081)),
+            secret=os.getenv('BOT_WEBHOOK_SECRET'),
+            workers=int(os.getenv('BOT_WEBHOOK_WORKERS', 16)),
+            max_pending=int(os.getenv('BOT_WEBHOOK_MAX_PENDING', 1000)),
+            max_per_chat=int(os.getenv('BOT_WEBHOOK_MAX_PER_CHAT', 20)),
+            drain_timeout=int(os.getenv('BOT_WEBHOOK_DRAIN_TIMEOUT', 30)),
+        )
+    else:
+        await dp.start_polling(bot)
+
+
 async def main():
+    metrics_runner = await start_metrics_server() if METRICS_PORT else None
     scheduler = AsyncIOScheduler()
     scheduler.add_job(send_local_reminders, 'interval', minutes=1)
+    scheduler.add_job(activity.flush, 'interval', seconds=int(os.getenv('BOT_ACTIVITY_FLUSH_SECONDS', 60)))
+    # Старые надгробия синхронизации — раз в сутки (или manage.py prune_tombstones)
+    scheduler.add_job(sync_to_async(sync.prune_tombstones), 'interval', hours=24)
+    if hasattr(storage, 'purge_expired'):
+        # Брошенные диалоги вычищаем и без обращений к ним
+        scheduler.add_job(storage.purge_expired, 'interval', minutes=10)
     scheduler.start()
-    print("🚀 Бот запущен")
-    await dp.start_polling(bot)
+    print(f"🚀 Бот запущен ({BOT_MODE})")
+    try:
+        await run_updates()
+    finally:
+        # Неполная пачка журнала повторений не должна потеряться при остановке
+        await sync_to_async(review_log.flush)()
+        await activity.flush()
+        if metrics_runner:
+            await metrics_runner.cleanup()
 
 
 if __name__ == "__main__":
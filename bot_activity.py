@@ -0,0 +1,58 @@
+# bot_activity.py — учёт активности пользователей бота
+
+from asgiref.sync import sync_to_async
+from django.db.models import F
+
+from cards.models import UserStats
+
+
+class ActivityTracker:
+    """
+    Время последнего обращения и число сообщений по пользователям.
+    Апдейты только отмечаются в памяти (без запросов к базе), а в UserStats
+    всё накопленное уходит периодически: одна выборка по telegram_id и один
+    bulk_update на порцию, счётчик прибавляется через F().
+    Работает в одном event loop, поэтому без блокировок.
+    """
+
+    def __init__(self, batch_size=500):
+        self.batch_size = batch_size
+        # telegram_id -> [last_seen, сообщений]
+        self._pending = {}
+
+    def touch(self, telegram_id, seen_at, is_message=True):
+        entry = self._pending.get(telegram_id)
+        if entry is None:
+            self._pending[telegram_id] = [seen_at, int(is_message)]
+        else:
+            entry[0] = max(entry[0], seen_at)
+            entry[1] += int(is_message)
+
+    async def flush(self):
+        """Записывает накопленное. Возвращает число обновлённых строк статистики."""
+        if not self._pending:
+            return 0
+        pending, self._pending = self._pending, {}
+        try:
+            return await sync_to_async(self._write)(pending)
+        except Exception as e:
+            # Не потеряем отметки: вернём их к тем, что пришли за время записи
+            for telegram_id, (seen_at, count) in pending.items():
+                entry = self._pending.setdefault(telegram_id, [seen_at, 0])
+                entry[0] = max(entry[0], seen_at)
+                entry[1] += count
+            print(f"❌ Не удалось записать активность: {e}")
+            return 0
+
+    def _write(self, pending):
+        stats = list(
+            UserStats.objects
+            .filter(telegram_id__in=[str(telegram_id) for telegram_id in pending])
+            .only('id', 'telegram_id')
+        )
+        for item in stats:
+            seen_at, count = pending[int(item.telegram_id)]
+            item.last_seen = seen_at
+            item.message_count = F('message_count') + count
+        UserStats.objects.bulk_update(stats, ['last_seen', 'message_count'], batch_size=self.batch_size)
+        return len(stats)
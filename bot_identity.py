@@ -0,0 +1,46 @@
+# bot_identity.py — кэш соответствия Telegram ID → пользователь сайта
+
+import time
+from collections import OrderedDict, namedtuple
+
+from cards.models import UserStats
+
+# Кому принадлежит чат: пользователь сайта и его строка статистики
+Identity = namedtuple('Identity', ['user_id', 'stats_id'])
+
+
+class IdentityCache:
+    """
+    LRU-кэш с TTL в памяти процесса: активные чаты определяют пользователя
+    без запроса к базе. Хранятся только ID — изменчивые поля статистики
+    (серия, время напоминания) всегда читаются из базы.
+    """
+
+    def __init__(self, ttl=600, max_entries=50_000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    async def resolve(self, telegram_id):
+        """
+        Identity для чата. Если чат не привязан — UserStats.DoesNotExist
+        (отсутствие не кэшируется, чтобы /start сработал сразу).
+        """
+        entry = self._entries.get(telegram_id)
+        if entry is not None and entry[1] > time.monotonic():
+            self._entries.move_to_end(telegram_id)
+            return entry[0]
+
+        stats = await UserStats.objects.aresolve_telegram(telegram_id)
+        identity = Identity(stats.user_id, stats.id)
+        self._entries[telegram_id] = (identity, time.monotonic() + self.ttl)
+        self._entries.move_to_end(telegram_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return identity
+
+    def invalidate(self, telegram_id):
+        self._entries.pop(telegram_id, None)
+
+    def clear(self):
+        self._entries.clear()
@@ -0,0 +1,59 @@
+# bot_middlewares.py — middleware диспетчера aiogram
+
+from asgiref.sync import sync_to_async
+from aiogram import BaseMiddleware
+from django.db import close_old_connections
+from django.utils import timezone
+
+from cards.metrics import Recorder, current_recorder
+
+
+class DBConnectionMiddleware(BaseMiddleware):
+    """
+    Бот — долгоживущий процесс: без запроса-ответа Django сам не закрывает
+    соединения. Делаем то же, что request_started/request_finished на сайте:
+    перед и после каждого апдейта закрываем устаревшие и сломанные соединения.
+    Вызов идёт через sync_to_async — в том же потоке, где работает async ORM.
+    """
+
+    async def __call__(self, handler, event, data):
+        await sync_to_async(close_old_connections)()
+        try:
+            return await handler(event, data)
+        finally:
+            await sync_to_async(close_old_connections)()
+
+
+class ActivityMiddleware(BaseMiddleware):
+    """
+    Отмечает активность автора апдейта в ActivityTracker — только в памяти,
+    запись в базу идёт пачками по расписанию.
+    """
+
+    def __init__(self, tracker):
+        self.tracker = tracker
+
+    async def __call__(self, handler, event, data):
+        user = data.get('event_from_user')
+        if user is not None and not user.is_bot:
+            self.tracker.touch(user.id, timezone.now(), is_message=event.message is not None)
+        return await handler(event, data)
+
+
+class MetricsMiddleware(BaseMiddleware):
+    """
+    Время обработчика, число и время его SQL-запросов — в метрики процесса
+    (подключается как внутренний middleware: обработчик уже выбран).
+    Учёт SQL идёт через ContextVar, который sync_to_async переносит в поток ORM.
+    """
+
+    async def __call__(self, handler, event, data):
+        handler_object = data.get('handler')
+        route = handler_object.callback.__name__ if handler_object else type(event).__name__
+        recorder = Recorder('bot', route)
+        token = current_recorder.set(recorder)
+        try:
+            return await handler(event, data)
+        finally:
+            current_recorder.reset(token)
+            recorder.finish()
@@ -0,0 +1,76 @@
+# bot_paging.py — постраничные списки бота: позиция в callback_data и кнопки ◀ ▶
+
+import html
+import string
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+DIGITS = string.digits + string.ascii_lowercase
+
+# Длина одной строки списка: 20 строк с запасом влезают в лимит Telegram (4096)
+MAX_FIELD = 80
+
+
+def _base36(number):
+    if number < 0:
+        return '-' + _base36(-number)
+    text = ''
+    while True:
+        number, digit = divmod(number, 36)
+        text = DIGITS[digit] + text
+        if not number:
+            return text
+
+
+def encode_position(moment, row_id):
+    """
+    Позиция (время, id) для callback_data: микросекунды и id в base36.
+    callback_data ограничен 64 байтами, поэтому не isoformat и не base64.
+    """
+    micros = (moment - EPOCH) // timedelta(microseconds=1)
+    return f"{_base36(micros)}.{_base36(row_id)}"
+
+
+def decode_position(token):
+    """Обратно в (время, id). Для битой позиции — ValueError."""
+    micros, row_id = token.split('.')
+    return EPOCH + timedelta(microseconds=int(micros, 36)), int(row_id, 36)
+
+
+def page_keyboard(prefix, first, last, has_prev, has_next):
+    """
+    Кнопки «◀ Назад» / «Дальше ▶». first и last — позиции крайних строк
+    страницы; callback_data — «prefix:p:позиция» или «prefix:n:позиция».
+    """
+    buttons = []
+    if has_prev:
+        buttons.append(InlineKeyboardButton(text="◀ Назад", callback_data=f"{prefix}:p:{encode_position(*first)}"))
+    if has_next:
+        buttons.append(InlineKeyboardButton(text="Дальше ▶", callback_data=f"{prefix}:n:{encode_position(*last)}"))
+    return InlineKeyboardMarkup(inline_keyboard=[buttons]) if buttons else None
+
+
+def parse_page_data(data):
+    """
+    «n:позиция» / «p:позиция» → (позиция, backward). Пустые или битые
+    данные — первая страница: (None, False).
+    """
+    direction, _, token = data.partition(':')
+    try:
+        return decode_position(token), direction == 'p'
+    except ValueError:
+        return None, False
+
+
+def shorten(text, limit=MAX_FIELD):
+    """
+    Поле для строки списка: в одну строку, не длиннее limit, с HTML-экранированием
+    (списки отправляются с parse_mode="HTML" — слово с < или & их не ломает).
+    """
+    text = ' '.join((text or '').split())
+    if len(text) > limit:
+        text = text[:limit - 1] + '…'
+    return html.escape(text, quote=False)
+
@@ -0,0 +1,100 @@
+# bot_router.py — диспетчеризация текстовых сообщений по таблицам
+
+import inspect
+
+from aiogram import F, Router, types
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State
+
+from cards.metrics import current_recorder
+
+
+class CommandTable:
+    """
+    Один обработчик текстовых сообщений вместо цепочки фильтров:
+    команда ищется в словаре по имени, ответ в диалоге — в словаре по
+    текущему состоянию FSM. На каждое сообщение — два поиска в dict,
+    а не проверка всех фильтров по очереди.
+
+    Команды обрабатываются всегда, даже посреди диалога; текст без
+    команды уходит обработчику текущего состояния (если он есть и его
+    условие выполнено).
+
+    Нажатия inline-кнопок — так же: callback_data вида «префикс:данные»,
+    обработчик ищется по префиксу.
+    """
+
+    def __init__(self, name='commands'):
+        self.router = Router(name=name)
+        self.commands = {}
+        self.states = {}
+        self.callbacks = {}
+        self.router.message.register(self.dispatch, F.text)
+        self.router.callback_query.register(self.dispatch_callback, F.data)
+
+    def command(self, name):
+        def decorator(handler):
+            self.commands[name] = (handler, self._wants_state(handler))
+            return handler
+        return decorator
+
+    def state(self, state, when=None):
+        """
+        Ответ в состоянии `state`. `when(text)` — необязательное условие:
+        если не выполнено, сообщение остаётся без ответа, как и раньше.
+        """
+        key = state.state if isinstance(state, State) else state
+
+        def decorator(handler):
+            self.states[key] = (handler, self._wants_state(handler), when)
+            return handler
+        return decorator
+
+    def callback(self, prefix):
+        """Нажатие кнопки с callback_data «prefix:...»; обработчик получает данные после префикса."""
+        def decorator(handler):
+            self.callbacks[prefix] = handler
+            return handler
+        return decorator
+
+    @staticmethod
+    def _wants_state(handler):
+        return 'state' in inspect.signature(handler).parameters
+
+    async def dispatch(self, message: types.Message, state: FSMContext):
+        text = message.text
+        if text.startswith('/'):
+            # «/cmd@bot аргументы» → cmd
+            name = text.split(maxsplit=1)[0][1:].split('@', 1)[0]
+            entry = self.commands.get(name)
+            if entry is None:
+                return
+            handler, wants_state = entry
+        else:
+            entry = self.states.get(await state.get_state())
+            if entry is None:
+                return
+            handler, wants_state, when = entry
+            if when is not None and not when(text):
+                return
+
+        self._set_route(handler)
+        if wants_state:
+            return await handler(message, state)
+        return await handler(message)
+
+    async def dispatch_callback(self, callback: types.CallbackQuery):
+        prefix, _, data = callback.data.partition(':')
+        handler = self.callbacks.get(prefix)
+        if handler is None:
+            # Кнопка от старой версии бота — просто убираем «часики»
+            return await callback.answer()
+        self._set_route(handler)
+        return await handler(callback, data)
+
+    @staticmethod
+    def _set_route(handler):
+        # В метриках — имя настоящего обработчика, а не dispatch
+        recorder = current_recorder.get()
+        if recorder is not None:
+            recorder.route = handler.__name__
@@ -0,0 +1,183 @@
+# bot_storage.py — хранилища состояний диалогов (FSM) для бота
+
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from aiogram.exceptions import DataNotDictLikeError
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder
+
+
+def _state_name(state):
+    return state.state if isinstance(state, State) else state
+
+
+class TTLMemoryStorage(BaseStorage):
+    """
+    Хранилище в памяти процесса с ограничениями:
+    - запись, к которой не обращались дольше ttl секунд, считается брошенной
+      и удаляется;
+    - записей не больше max_entries — лишние вытесняются по LRU.
+    """
+
+    def __init__(self, ttl=6 * 3600, max_entries=100_000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # key -> [state, data, expires_at]
+        self.records = OrderedDict()
+
+    async def close(self):
+        self.records.clear()
+
+    def _get(self, key):
+        record = self.records.get(key)
+        if record is None:
+            return None
+        if record[2] <= time.monotonic():
+            del self.records[key]
+            return None
+        self.records.move_to_end(key)
+        return record
+
+    def _put(self, key, state, data):
+        if state is None and not data:
+            # Пустой диалог не храним — так память не растёт от разовых команд
+            self.records.pop(key, None)
+            return
+        self.records[key] = [state, data, time.monotonic() + self.ttl]
+        self.records.move_to_end(key)
+        while len(self.records) > self.max_entries:
+            self.records.popitem(last=False)
+
+    async def set_state(self, key, state=None):
+        record = self._get(key)
+        self._put(key, _state_name(state), record[1] if record else {})
+
+    async def get_state(self, key):
+        record = self._get(key)
+        return record[0] if record else None
+
+    async def set_data(self, key, data):
+        if not isinstance(data, dict):
+            raise DataNotDictLikeError(
+                f"Data must be a dict or dict-like object, got {type(data).__name__}"
+            )
+        record = self._get(key)
+        self._put(key, record[0] if record else None, data.copy())
+
+    async def get_data(self, key):
+        record = self._get(key)
+        return dict(record[1]) if record else {}
+
+    async def purge_expired(self):
+        """Удаляет все просроченные записи (вызывается по расписанию)."""
+        now = time.monotonic()
+        expired = [key for key, record in self.records.items() if record[2] <= now]
+        for key in expired:
+            del self.records[key]
+        return len(expired)
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    Хранилище в отдельном файле SQLite: состояние переживает перезапуск бота.
+    Отдельный файл — чтобы не спорить за блокировку с основной базой сайта.
+    Запросы выполняются в пуле потоков и не блокируют event loop.
+    """
+
+    def __init__(self, path, ttl=6 * 3600):
+        self.ttl = ttl
+        self.key_builder = DefaultKeyBuilder(with_destiny=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS fsm ("
+            " key TEXT PRIMARY KEY,"
+            " state TEXT,"
+            " data TEXT NOT NULL DEFAULT '{}',"
+            " expires_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS fsm_expires_idx ON fsm (expires_at)")
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    async def _run(self, sql, params=()):
+        return await asyncio.to_thread(self._execute, sql, params)
+
+    async def _load(self, key):
+        rows = await self._run(
+            "SELECT state, data FROM fsm WHERE key = ? AND expires_at > ?",
+            (self.key_builder.build(key), time.time())
+        )
+        if not rows:
+            return None, {}
+        return rows[0][0], json.loads(rows[0][1])
+
+    async def _store(self, key, state, data):
+        db_key = self.key_builder.build(key)
+        if state is None and not data:
+            await self._run("DELETE FROM fsm WHERE key = ?", (db_key,))
+            return
+        await self._run(
+            "INSERT INTO fsm (key, state, data, expires_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET state = excluded.state, "
+            "data = excluded.data, expires_at = excluded.expires_at",
+            (db_key, state, json.dumps(data, ensure_ascii=False), time.time() + self.ttl)
+        )
+
+    async def close(self):
+        await asyncio.to_thread(self._conn.close)
+
+    async def set_state(self, key, state=None):
+        _, data = await self._load(key)
+        await self._store(key, _state_name(state), data)
+
+    async def get_state(self, key):
+        state, _ = await self._load(key)
+        return state
+
+    async def set_data(self, key, data):
+        if not isinstance(data, dict):
+            raise DataNotDictLikeError(
+                f"Data must be a dict or dict-like object, got {type(data).__name__}"
+            )
+        state, _ = await self._load(key)
+        await self._store(key, state, data)
+
+    async def get_data(self, key):
+        _, data = await self._load(key)
+        return data
+
+    async def purge_expired(self):
+        """Удаляет брошенные диалоги одним DELETE по индексу expires_at."""
+        def purge():
+            with self._lock:
+                return self._conn.execute("DELETE FROM fsm WHERE expires_at <= ?", (time.time(),)).rowcount
+
+        return await asyncio.to_thread(purge)
+
+
+def build_storage(url, ttl=6 * 3600, max_entries=100_000):
+    """
+    Хранилище по адресу из настроек:
+      memory                — в памяти (по умолчанию);
+      sqlite:///path.db     — файл SQLite;
+      redis://host:port/db  — любой сервер с протоколом Redis.
+    """
+    if not url or url == 'memory':
+        return TTLMemoryStorage(ttl=ttl, max_entries=max_entries)
+    if url.startswith('sqlite:///'):
+        return SQLiteStorage(url[len('sqlite:///'):], ttl=ttl)
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        # Модуль тянет за собой redis.asyncio — импортируем только для этого бэкенда
+        from aiogram.fsm.storage.redis import RedisStorage
+
+        return RedisStorage.from_url(url, state_ttl=ttl, data_ttl=ttl)
+    raise ValueError(f"Неизвестное хранилище состояний: {url}")
@@ -0,0 +1,187 @@
+# bot_webhook.py — режим webhook: приём апдейтов по HTTP и пул обработчиков
+
+import asyncio
+import signal
+from collections import deque
+
+from aiogram import types
+from aiohttp import web
+
+from cards.metrics import WEBHOOK_REJECTED
+
+ACCEPTED = 'accepted'
+CHAT_FULL = 'chat_full'
+FULL = 'full'
+CLOSING = 'closing'
+
+
+def chat_key(update):
+    """
+    Ключ очереди апдейта: чат (или пользователь). Апдейты одного чата
+    обрабатываются строго по порядку, разных чатов — параллельно.
+    """
+    event = update.event
+    chat = getattr(event, 'chat', None) or getattr(getattr(event, 'message', None), 'chat', None)
+    if chat is not None:
+        return chat.id
+    user = getattr(event, 'from_user', None)
+    if user is not None:
+        return user.id
+    # Апдейт без чата и пользователя порядок ни с кем не делит
+    return ('update', update.update_id)
+
+
+class UpdatePool:
+    """
+    Ограниченный пул обработки апдейтов:
+    - не больше `workers` обработчиков одновременно;
+    - у каждого чата своя очередь, и её берёт только один обработчик за раз —
+      так сохраняется порядок сообщений внутри диалога (важно для FSM);
+    - всего в очередях не больше `max_pending` апдейтов, у одного чата —
+      не больше `max_per_chat`: сверх лимита submit() отказывает, и вебхук
+      отвечает Telegram ошибкой — тот повторит доставку позже.
+    """
+
+    def __init__(self, dispatcher, bot, workers=16, max_pending=1000, max_per_chat=20):
+        self.dispatcher = dispatcher
+        self.bot = bot
+        self.workers = workers
+        self.max_pending = max_pending
+        self.max_per_chat = max_per_chat
+        self.pending = 0
+        self._queues = {}
+        self._ready = asyncio.Queue()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._tasks = []
+        self._closing = False
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    def submit(self, update):
+        if self._closing:
+            return CLOSING
+        if self.pending >= self.max_pending:
+            return FULL
+
+        key = chat_key(update)
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = deque()
+            # Новая очередь — в список готовых; занятая вернётся туда сама
+            self._ready.put_nowait(key)
+        elif len(queue) >= self.max_per_chat:
+            return CHAT_FULL
+
+        queue.append(update)
+        self.pending += 1
+        self._idle.clear()
+        return ACCEPTED
+
+    async def _worker(self):
+        while True:
+            key = await self._ready.get()
+            queue = self._queues[key]
+            update = queue.popleft()
+            try:
+                await self.dispatcher.feed_update(self.bot, update)
+            except Exception as e:
+                print(f"Ошибка обработки апдейта {update.update_id}: {e}")
+            finally:
+                self.pending -= 1
+                if queue:
+                    # Следующий апдейт чата — в конец: другие чаты не ждут
+                    self._ready.put_nowait(key)
+                else:
+                    del self._queues[key]
+                if not self.pending:
+                    self._idle.set()
+
+    async def drain(self, timeout=30):
+        """
+        Перестаёт принимать апдейты, дожидается обработки уже принятых
+        (не дольше timeout секунд) и останавливает обработчики.
+        """
+        self._closing = True
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            print(f"⚠️ Не дождались обработки {self.pending} апдейтов")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+def build_app(pool, path, secret=None):
+    async def handle(request):
+        if secret and request.headers.get('X-Telegram-Bot-Api-Secret-Token') != secret:
+            return web.Response(status=401)
+        try:
+            update = types.Update.model_validate(await request.json(), context={'bot': pool.bot})
+        except ValueError:
+            return web.Response(status=400)
+
+        status = pool.submit(update)
+        if status == ACCEPTED:
+            return web.Response()
+        WEBHOOK_REJECTED.inc(status)
+        if status == CHAT_FULL:
+            # Один чат шлёт слишком часто — пусть Telegram повторит позже
+            return web.Response(status=429, headers={'Retry-After': '1'})
+        return web.Response(status=503, headers={'Retry-After': '5'})
+
+    dispatcher = pool.dispatcher
+    workflow_data = {'bot': pool.bot, 'dispatcher': dispatcher, **dispatcher.workflow_data}
+
+    async def on_startup(app):
+        await dispatcher.emit_startup(app=app, **workflow_data)
+
+    async def on_cleanup(app):
+        # Пул к этому моменту уже дообработал принятые апдейты (см. run_webhook),
+        # и хранилище FSM можно закрывать — этим занят shutdown диспетчера
+        await dispatcher.emit_shutdown(app=app, **workflow_data)
+
+    app = web.Application()
+    app.router.add_post(path, handle)
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    return app
+
+
+async def run_webhook(dispatcher, bot, url, path='/webhook', host='0.0.0.0', port=8081,
+                      secret=None, workers=16, max_pending=1000, max_per_chat=20, drain_timeout=30):
+    """
+    Поднимает HTTP-сервер вебхука, регистрирует его в Telegram и работает
+    до SIGINT/SIGTERM. При остановке новые апдейты получают 503, а принятые
+    дообрабатываются.
+    """
+    pool = UpdatePool(dispatcher, bot, workers=workers, max_pending=max_pending, max_per_chat=max_per_chat)
+    pool.start()
+
+    # setup() вызывает startup диспетчера, cleanup() — shutdown (закрывает хранилище FSM)
+    runner = web.AppRunner(build_app(pool, path, secret))
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    await bot.set_webhook(
+        url.rstrip('/') + path,
+        secret_token=secret,
+        allowed_updates=dispatcher.resolve_used_update_types(),
+        max_connections=min(max(workers, 1), 100),
+    )
+    print(f"🌐 Webhook: {host}:{port}{path}")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):
+            # Windows: остановка через KeyboardInterrupt
+            pass
+
+    try:
+        await stop.wait()
+    finally:
+        await pool.drain(drain_timeout)
+        await runner.cleanup()
@@ -4,3 +4,14 @@ from django.apps import AppConfig
 class CardsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'cards'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from django.db.models.signals import post_migrate
+        from .metrics import install_sql_wrapper
+        from .search import restore_index
+
+        # Учёт SQL для метрик — на каждом новом соединении, в любом потоке
+        connection_created.connect(install_sql_wrapper)
+        # Триггеры поискового индекса после миграций, пересоздающих cards_card
+        post_migrate.connect(restore_index, sender=self)
@@ -0,0 +1,151 @@
+# cards/batch.py
+
+from dataclasses import dataclass, field
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .cache import card_cache
+from .importers import LEVELS, clean_record
+from .models import Card, Schedule, UserStats, LEARNED_REPETITIONS
+
+# Сколько операций принимаем в одном пакете
+MAX_BATCH = 500
+
+# Поля карточки, которые можно менять через update
+EDITABLE_FIELDS = ('word', 'translation', 'example', 'note', 'level')
+
+
+@dataclass
+class BatchResult:
+    created: list = field(default_factory=list)
+    updated: int = 0
+    deleted: int = 0
+    missing: list = field(default_factory=list)
+    errors: list = field(default_factory=list)
+
+
+def clean_update(item):
+    """
+    Частичное изменение: id и любые из EDITABLE_FIELDS.
+    Возвращает (id, {поле: значение}); ошибка — ValueError.
+    """
+    if not isinstance(item, dict):
+        raise ValueError("запись должна быть объектом")
+    try:
+        card_id = int(item['id'])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("нужен числовой id")
+
+    changes = {}
+    for name in EDITABLE_FIELDS:
+        if name not in item:
+            continue
+        value = str(item[name] or '').strip()
+        if name in ('word', 'translation'):
+            if not value:
+                raise ValueError(f"{name} не может быть пустым")
+            if len(value) > 200:
+                raise ValueError(f"{name} длиннее 200 символов")
+        if name == 'level' and value not in LEVELS:
+            raise ValueError(f"неизвестный уровень «{value}»")
+        changes[name] = value
+    if not changes:
+        raise ValueError("нет полей для изменения")
+    return card_id, changes
+
+
+def clean_batch(payload):
+    """
+    Проверяет весь пакет до записи. Возвращает (creates, updates, deletes, errors).
+    """
+    creates, updates, deletes, errors = [], [], [], []
+    if not isinstance(payload, dict):
+        return creates, updates, deletes, [{'error': "ожидается объект с create/update/delete"}]
+
+    lists = {name: payload.get(name) or [] for name in ('create', 'update', 'delete')}
+    if not all(isinstance(items, list) for items in lists.values()):
+        return creates, updates, deletes, [{'error': "create, update и delete должны быть списками"}]
+    if sum(len(items) for items in lists.values()) > MAX_BATCH:
+        return creates, updates, deletes, [{'error': f"не больше {MAX_BATCH} операций в пакете"}]
+
+    for index, item in enumerate(lists['create']):
+        try:
+            creates.append(clean_record(item))
+        except ValueError as e:
+            errors.append({'op': 'create', 'index': index, 'error': str(e)})
+
+    for index, item in enumerate(lists['update']):
+        try:
+            updates.append(clean_update(item))
+        except ValueError as e:
+            errors.append({'op': 'update', 'index': index, 'error': str(e)})
+
+    for index, item in enumerate(lists['delete']):
+        try:
+            deletes.append(int(item))
+        except (TypeError, ValueError):
+            errors.append({'op': 'delete', 'index': index, 'error': "нужен числовой id"})
+
+    return creates, updates, deletes, errors
+
+
+def apply_batch(user, payload):
+    """
+    Применяет пакет создания, изменения и удаления карточек пользователя
+    одной транзакцией: удаление одним DELETE по списку id, изменения —
+    bulk_update, новые карточки — bulk_create вместе с расписанием.
+    Если хоть одна операция не прошла проверку или слово оказалось
+    дубликатом, не пишется ничего.
+    """
+    result = BatchResult()
+    creates, updates, deletes, result.errors = clean_batch(payload)
+    if result.errors:
+        return result
+
+    deleted = set(deletes)
+    try:
+        with transaction.atomic():
+            if deletes:
+                existing = set(Card.objects.filter(owner=user, id__in=deleted).values_list('id', flat=True))
+                result.missing.extend(sorted(deleted - existing))
+                if existing:
+                    # CardQuerySet.delete сам поправит счётчики и версию кэша
+                    Card.objects.filter(owner=user, id__in=existing).delete()
+                    result.deleted = len(existing)
+
+            changes = {card_id: fields for card_id, fields in updates if card_id not in deleted}
+            if changes:
+                cards = list(Card.objects.filter(owner=user, id__in=changes.keys()))
+                result.missing.extend(sorted(set(changes) - {card.id for card in cards}))
+                touched = {'updated_at'}
+                updated_at = timezone.now()
+                for card in cards:
+                    for name, value in changes[card.id].items():
+                        setattr(card, name, value)
+                        touched.add(name)
+                    # bulk_update не трогает auto_now
+                    card.updated_at = updated_at
+                if cards:
+                    Card.objects.bulk_update(cards, sorted(touched), batch_size=MAX_BATCH)
+                    result.updated = len(cards)
+
+            if creates:
+                cards = Card.objects.bulk_create(
+                    [Card(owner=user, **data) for data, _ in creates], batch_size=MAX_BATCH
+                )
+                Schedule.objects.bulk_create(
+                    [Schedule(card=card, owner=user, **schedule) for card, (_, schedule) in zip(cards, creates)],
+                    batch_size=MAX_BATCH
+                )
+                learned = sum(1 for _, schedule in creates if schedule.get('repetitions', 0) >= LEARNED_REPETITIONS)
+                UserStats.objects.bump_counters(user.id, total=len(cards), learned=learned)
+                result.created = [card.id for card in cards]
+
+            if result.updated or result.created:
+                # bulk_* не вызывают save() — версию кэша сдвигаем сами
+                card_cache.bump_on_commit(user.id)
+    except IntegrityError:
+        # Уникальность (owner, word_key): новое или переименованное слово уже есть
+        return BatchResult(errors=[{'error': "слово уже есть в колоде (или повторяется в пакете)"}])
+    return result
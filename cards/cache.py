@@ -0,0 +1,108 @@
+# cards/cache.py
+
+import hashlib
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+
+def hashed(text):
+    """
+    Произвольный текст пользователя (поиск, курсор) как часть ключа кэша:
+    sha1 вместо сырой строки — без пробелов и не-ASCII, которые не
+    принимает memcached, и без риска превысить его 250 символов.
+    get_or_compute хэширует parts сам.
+    """
+    return hashlib.sha1(str(text).encode('utf-8')).hexdigest()
+
+
+class VersionedCache:
+    """
+    Read-through кэш данных пользователя поверх Django cache framework
+    (locmem, файлы, Redis — что настроено в CACHES).
+
+    Ключ включает номер версии пользователя; любое изменение его карточек
+    или расписания увеличивает версию, и все старые записи разом перестают
+    читаться — удалять их не нужно, они уйдут по timeout.
+    """
+
+    def __init__(self, alias='default', timeout=60, prefix='cards'):
+        self.alias = alias
+        self.timeout = timeout
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._hits = Counter()
+        self._misses = Counter()
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def _version_key(self, user_id):
+        return f"{self.prefix}:v:{user_id}"
+
+    @staticmethod
+    def _fresh_version():
+        # Версия после вытеснения ключа начинается «с часов», а не с 1 —
+        # иначе можно снова попасть в старые записи
+        return int(time.time() * 1000)
+
+    def version(self, user_id):
+        key = self._version_key(user_id)
+        version = self.cache.get(key)
+        if version is None:
+            self.cache.add(key, self._fresh_version(), None)
+            version = self.cache.get(key, self._fresh_version())
+        return version
+
+    def bump(self, user_id):
+        key = self._version_key(user_id)
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            self.cache.set(key, self._fresh_version(), None)
+
+    def bump_on_commit(self, user_id):
+        """
+        Сдвигает версию после коммита: иначе параллельный запрос успел бы
+        положить в кэш ещё старые данные уже под новой версией.
+        """
+        transaction.on_commit(lambda: self.bump(user_id))
+
+    def key(self, user_id, name, *parts):
+        key = f"{self.prefix}:{user_id}:{self.version(user_id)}:{name}"
+        if parts:
+            key += ':' + hashed('\x1f'.join(str(part) for part in parts))
+        return key
+
+    def get_or_compute(self, user_id, name, compute, *parts, timeout=None):
+        """
+        Значение из кэша или compute() с сохранением. parts уточняют ключ
+        (фильтр, курсор страницы, текст поиска и т. п.) и попадают в него
+        хэшем — в них может быть что угодно от пользователя.
+        """
+        key = self.key(user_id, name, *parts)
+        value = self.cache.get(key)
+        if value is not None:
+            with self._lock:
+                self._hits[name] += 1
+            return value
+
+        with self._lock:
+            self._misses[name] += 1
+        value = compute()
+        self.cache.set(key, value, self.timeout if timeout is None else timeout)
+        return value
+
+    def stats(self):
+        """Попадания и промахи по видам данных (в пределах процесса)."""
+        with self._lock:
+            names = sorted(set(self._hits) | set(self._misses))
+            return {name: {'hits': self._hits[name], 'misses': self._misses[name]} for name in names}
+
+
+card_cache = VersionedCache(timeout=settings.CARDS_CACHE_TIMEOUT)
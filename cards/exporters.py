@@ -0,0 +1,101 @@
+# cards/exporters.py
+
+import csv
+import json
+import zlib
+
+from .models import Card
+
+# Поля карточки в экспорте (совпадают с тем, что понимает импорт)
+CARD_FIELDS = ['word', 'translation', 'example', 'note', 'level']
+
+# Состояние расписания — для полного бэкапа
+SCHEDULE_FIELDS = ['next_review', 'ease_factor', 'interval', 'repetitions']
+
+# Сколько строк база отдаёт за один проход курсора
+CHUNK_SIZE = 2000
+
+FORMATS = {
+    'json': ('application/json', 'json'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv', 'csv'),
+}
+
+
+def iter_rows(user, with_schedule=False):
+    """
+    Карточки пользователя порциями по CHUNK_SIZE — весь набор в память не грузится.
+    """
+    lookups = list(CARD_FIELDS)
+    if with_schedule:
+        lookups += [f'schedule__{name}' for name in SCHEDULE_FIELDS]
+
+    rows = (
+        Card.objects.filter(owner=user)
+        .order_by('id')
+        .values_list(*lookups)
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+    names = CARD_FIELDS + (SCHEDULE_FIELDS if with_schedule else [])
+    for values in rows:
+        row = dict(zip(names, values))
+        if with_schedule and row['next_review'] is not None:
+            row['next_review'] = row['next_review'].isoformat()
+        yield row
+
+
+def render_json(rows):
+    yield '['
+    first = True
+    for row in rows:
+        yield ('\n' if first else ',\n') + json.dumps(row, ensure_ascii=False)
+        first = False
+    yield '\n]\n'
+
+
+def render_ndjson(rows):
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + '\n'
+
+
+class _Line:
+    """Файлоподобный буфер для csv.writer: возвращает записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def render_csv(rows, fieldnames):
+    writer = csv.DictWriter(_Line(), fieldnames=fieldnames)
+    yield writer.writeheader()
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def gzip_stream(chunks):
+    """
+    Сжимает поток на лету: каждый кусок проходит через один gzip-компрессор.
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_stream(user, fmt='json', with_schedule=False, compress=False):
+    """
+    Генератор содержимого файла экспорта в выбранном формате.
+    """
+    rows = iter_rows(user, with_schedule)
+    if fmt == 'ndjson':
+        chunks = render_ndjson(rows)
+    elif fmt == 'csv':
+        chunks = render_csv(rows, CARD_FIELDS + (SCHEDULE_FIELDS if with_schedule else []))
+    else:
+        chunks = render_json(rows)
+
+    if compress:
+        return gzip_stream(chunks)
+    return (chunk.encode('utf-8') for chunk in chunks)
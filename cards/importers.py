@@ -0,0 +1,295 @@
+# cards/importers.py
+
+import csv
+import gzip
+import io
+import json
+from dataclasses import dataclass, field
+
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Card, LEVEL_CHOICES, normalize_word
+
+# Сколько карточек вставляем за одну транзакцию
+BATCH_SIZE = 500
+
+# Порядок колонок для CSV/TSV без заголовка
+FIELDS = ['word', 'translation', 'example', 'note', 'level']
+
+LEVELS = {value for value, _ in LEVEL_CHOICES}
+
+# Сколько текстов ошибок показываем пользователю
+MAX_ERRORS = 20
+
+# Размер порции при чтении JSON
+CHUNK_SIZE = 64 * 1024
+
+
+class ImportFormatError(ValueError):
+    """Файл целиком не удаётся разобрать (битый JSON, неизвестный формат)."""
+
+
+# Ошибки чтения файла (формат, кодировка, gzip) — в отличие от ошибок
+# отдельных записей, дальше такой файл читать нельзя
+READ_ERRORS = (ImportFormatError, UnicodeDecodeError, csv.Error, EOFError, OSError)
+
+
+@dataclass
+class ImportResult:
+    inserted: int = 0
+    updated: int = 0
+    skipped: int = 0
+    invalid: int = 0
+    errors: list = field(default_factory=list)
+    # Файл оборвался или сломан посередине: сколько записей прочитано до
+    # ошибки и сама ошибка. Всё прочитанное до неё уже записано
+    stopped_after: int = None
+    stopped_error: str = ''
+
+    def add_error(self, line, message):
+        self.invalid += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append(f"#{line}: {message}")
+
+
+def detect_format(filename, requested=None):
+    """
+    Формат берём из формы, иначе — по расширению файла.
+    """
+    if requested in ('json', 'ndjson', 'csv', 'tsv'):
+        return requested
+    name = (filename or '').lower()
+    if name.endswith('.gz'):
+        name = name[:-3]
+    if name.endswith('.ndjson') or name.endswith('.jsonl'):
+        return 'ndjson'
+    if name.endswith('.csv'):
+        return 'csv'
+    if name.endswith('.tsv') or name.endswith('.tab'):
+        return 'tsv'
+    return 'json'
+
+
+def iter_json_array(text_stream):
+    """
+    Потоково читает JSON-массив объектов: в памяти только текущая порция файла,
+    а не весь документ. Синтаксис массива проверяется строго: пропущенная или
+    лишняя запятая и данные после «]» — ImportFormatError.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    # Что ждём дальше: 'open' — «[», 'first' — элемент или «]» сразу после «[»,
+    # 'separator' — «,» или «]» после элемента, 'item' — элемент после «,»,
+    # 'end' — только пробелы до конца файла
+    expect = 'open'
+    eof = False
+
+    while True:
+        buffer = buffer.lstrip()
+        if buffer:
+            if expect == 'open':
+                if buffer[0] != '[':
+                    raise ImportFormatError("Ожидается JSON-массив карточек")
+                buffer = buffer[1:]
+                expect = 'first'
+                continue
+            if expect == 'end':
+                raise ImportFormatError("Лишние данные после конца JSON-массива")
+            if expect in ('first', 'separator') and buffer[0] == ']':
+                buffer = buffer[1:]
+                expect = 'end'
+                continue
+            if expect == 'separator':
+                if buffer[0] != ',':
+                    raise ImportFormatError("Между элементами JSON-массива пропущена запятая")
+                buffer = buffer[1:]
+                expect = 'item'
+                continue
+            if buffer[0] in ',]':
+                raise ImportFormatError("Лишняя запятая в JSON-массиве")
+            try:
+                item, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                # Элемент не дочитан до конца — нужна следующая порция
+                if eof:
+                    raise ImportFormatError("Некорректный JSON")
+            else:
+                buffer = buffer[end:]
+                expect = 'separator'
+                yield item
+                continue
+
+        if eof:
+            if expect == 'end':
+                return
+            raise ImportFormatError("Неожиданный конец JSON")
+        chunk = text_stream.read(CHUNK_SIZE)
+        if not chunk:
+            eof = True
+        buffer += chunk
+
+
+def iter_ndjson(text_stream):
+    """
+    NDJSON: один объект на строку, пустые строки пропускаются.
+    """
+    for line in text_stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError:
+            # Битая строка — это ошибка записи, а не всего файла
+            yield None
+
+
+def iter_delimited(text_stream, delimiter):
+    """
+    Строки CSV/TSV как словари. Заголовок необязателен: без него колонки
+    идут в порядке FIELDS.
+    """
+    reader = csv.reader(text_stream, delimiter=delimiter)
+    header = next(reader, None)
+    if header is None:
+        return
+    names = [h.strip().lower() for h in header]
+    if 'word' in names:
+        columns = names
+    else:
+        columns = FIELDS
+        yield dict(zip(columns, header))
+    for row in reader:
+        if not any(cell.strip() for cell in row):
+            continue
+        yield dict(zip(columns, row))
+
+
+def iter_records(uploaded_file, fmt):
+    if uploaded_file.name and uploaded_file.name.lower().endswith('.gz'):
+        uploaded_file = gzip.GzipFile(fileobj=uploaded_file)
+    text_stream = io.TextIOWrapper(uploaded_file, encoding='utf-8-sig', newline='')
+    if fmt == 'ndjson':
+        return iter_ndjson(text_stream)
+    if fmt == 'csv':
+        return iter_delimited(text_stream, ',')
+    if fmt == 'tsv':
+        return iter_delimited(text_stream, '\t')
+    return iter_json_array(text_stream)
+
+
+def clean_schedule(item):
+    """
+    Необязательное состояние расписания из бэкапа (см. экспорт с schedule=1).
+    Пустые значения — значения по умолчанию.
+    """
+    schedule = {}
+    raw = item.get('next_review')
+    if raw:
+        next_review = parse_datetime(str(raw))
+        if next_review is None:
+            raise ValueError(f"некорректная дата «{raw}»")
+        if timezone.is_naive(next_review):
+            next_review = timezone.make_aware(next_review)
+        schedule['next_review'] = next_review
+    for name, cast in (('ease_factor', float), ('interval', int), ('repetitions', int)):
+        value = item.get(name)
+        if value not in (None, ''):
+            try:
+                schedule[name] = cast(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"некорректное значение {name}: «{value}»")
+    return schedule
+
+
+def clean_record(item):
+    """
+    Проверяет одну запись и возвращает (поля карточки, поля расписания).
+    Ошибка описывается через ValueError.
+    """
+    if not isinstance(item, dict):
+        raise ValueError("запись должна быть объектом")
+
+    word = str(item.get('word') or '').strip()
+    translation = str(item.get('translation') or '').strip()
+    if not word or not translation:
+        raise ValueError("нужны слово и перевод")
+    if len(word) > 200 or len(translation) > 200:
+        raise ValueError("слово или перевод длиннее 200 символов")
+
+    level = str(item.get('level') or 'beginner').strip()
+    if level not in LEVELS:
+        raise ValueError(f"неизвестный уровень «{level}»")
+
+    card = {
+        'word': word,
+        'translation': translation,
+        'example': item.get('example') or '',
+        'note': item.get('note') or '',
+        'level': level,
+    }
+    return card, clean_schedule(item)
+
+
+def _flush(user, batch, seen, result):
+    """
+    Записывает порцию одним upsert по (owner, word_key): новые слова
+    вставляются вместе с расписанием, у уже существующих обновляются
+    перевод, пример, примечание и уровень. Повторы слова внутри файла
+    пропускаются.
+    """
+    cards = []
+    schedules = []
+    for data, schedule in batch:
+        key = normalize_word(data['word'])
+        if key in seen:
+            result.skipped += 1
+            continue
+        seen.add(key)
+        cards.append(Card(**data))
+        schedules.append(schedule)
+
+    if not cards:
+        return
+
+    cards, inserted = Card.objects.upsert(user.id, cards, schedules)
+    result.inserted += inserted
+    result.updated += len(cards) - inserted
+
+
+def import_cards(user, uploaded_file, fmt='json', batch_size=BATCH_SIZE):
+    """
+    Потоковый импорт: файл читается по частям, карточки пишутся порциями
+    через upsert. Слова, которые уже есть в колоде, обновляются; повторы
+    внутри файла пропускаются.
+
+    Порции коммитятся по отдельности, поэтому если файл ломается посередине,
+    записывается всё прочитанное до ошибки, а в результате указано, где
+    чтение остановилось (stopped_after, stopped_error). Если не прочитано
+    ни одной записи, ошибка чтения пробрасывается как есть.
+    """
+    result = ImportResult()
+    seen = set()
+    batch = []
+    line = 0
+
+    try:
+        for line, item in enumerate(iter_records(uploaded_file, fmt), start=1):
+            try:
+                batch.append(clean_record(item))
+            except ValueError as e:
+                result.add_error(line, str(e))
+                continue
+            if len(batch) >= batch_size:
+                _flush(user, batch, seen, result)
+                batch = []
+    except READ_ERRORS as e:
+        if not line:
+            raise
+        result.stopped_after = line
+        result.stopped_error = str(e)
+
+    if batch:
+        _flush(user, batch, seen, result)
+    return result
@@ -0,0 +1,503 @@
+import asyncio
+import json
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import threading
+import time
+from datetime import datetime, timedelta
+from math import ceil
+from statistics import mean, median
+
+import django
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.utils import timezone
+
+# Сценарии по умолчанию — в порядке запуска
+SCENARIOS = [
+    'card_list', 'card_list_cached', 'review', 'review_answer', 'import_cards', 'export_cards',
+    'bot_today', 'bot_cards', 'bot_cards_next', 'bot_progress', 'bot_test', 'bot_review', 'bot_review_answer',
+    'bot_concurrent',
+]
+
+
+class QueryCounter:
+    """
+    Считает SQL-запросы во всех потоках: бот работает с базой через
+    sync_to_async в отдельном потоке, и CaptureQueriesContext его не видит.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        with self._lock:
+            self.count += 1
+        return execute(sql, params, many, context)
+
+    def install(self):
+        connection.execute_wrappers.append(self)
+        connection_created.connect(self._on_connection, weak=False)
+
+    def uninstall(self):
+        connection_created.disconnect(self._on_connection)
+        if self in connection.execute_wrappers:
+            connection.execute_wrappers.remove(self)
+
+    def _on_connection(self, sender, connection, **kwargs):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[max(0, ceil(p / 100 * len(ordered)) - 1)]
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагрузочный замер на временной базе: создаёт N пользователей по M карточек "
+        "и меряет задержки (перцентили) и число SQL-запросов страниц сайта и команд бота. "
+        "Результат — JSON, который удобно сравнивать между коммитами."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=5, help="Сколько пользователей создать")
+        parser.add_argument('--cards', type=int, default=2000, help="Карточек у каждого пользователя")
+        parser.add_argument('--iterations', type=int, default=30, help="Повторов каждого сценария")
+        parser.add_argument('--import-size', type=int, default=200, help="Карточек в одном файле импорта")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument(
+            '--api-latency-ms', type=float, default=0,
+            help="Задержка ответа поддельного Telegram API (имитация сети) в сценариях бота"
+        )
+        parser.add_argument('--only', nargs='+', choices=SCENARIOS, help="Запустить только эти сценарии")
+        parser.add_argument('--output', help="Куда записать JSON (по умолчанию — stdout)")
+        parser.add_argument('--compare', help="Прошлый отчёт: вывести изменение p50 по сценариям")
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['cards'] < 10:
+            raise CommandError("Нужен хотя бы 1 пользователь и 10 карточек")
+
+        # Замер всегда идёт на отдельной тестовой базе — рабочие данные не трогаем
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            results, seeded_in = self.run(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        report = {
+            'meta': self.meta(seeded_in),
+            'scenarios': results,
+        }
+        text = json.dumps(report, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(text + '\n')
+            self.stderr.write(self.style.SUCCESS(f"Отчёт записан в {options['output']}"))
+        else:
+            self.stdout.write(text)
+
+        if options['compare']:
+            self.compare(options['compare'], results)
+
+    def run(self, options):
+        """
+        Наполняет текущую базу и прогоняет сценарии. Возвращает
+        ({сценарий: замер}, секунд на наполнение). Базу готовит вызывающий:
+        handle() — временную, тесты — тестовую.
+        """
+        self.options = options
+        self.random = random.Random(options['seed'])
+        self.counter = QueryCounter()
+        self.counter.install()
+        try:
+            caches['default'].clear()
+            started = time.perf_counter()
+            self.users = self.seed()
+            seeded_in = time.perf_counter() - started
+
+            results = {}
+            for name in options['only'] or SCENARIOS:
+                self.stderr.write(f"… {name}")
+                results[name] = getattr(self, f'run_{name}')()
+
+            from cards.reviewlog import review_log
+            review_log.flush()
+        finally:
+            self.counter.uninstall()
+            if hasattr(self, '_bot'):
+                self._bot[2].close()
+                del self._bot
+        return results, seeded_in
+
+    # --- Данные ---
+
+    def seed(self):
+        """
+        Пользователи с привязкой к Telegram и колодами с реалистичным
+        расписанием: часть карточек новые, часть просрочена, остальные
+        разнесены по будущим интервалам разной длины.
+        """
+        from django.contrib.auth.models import User
+        from cards.models import Card, Schedule, UserStats, LEVEL_CHOICES
+
+        rnd = self.random
+        now = timezone.now()
+        levels = [value for value, _ in LEVEL_CHOICES]
+
+        users = []
+        for i in range(self.options['users']):
+            user = User(username=f'bench{i}')
+            user.set_unusable_password()
+            users.append(user)
+        users = User.objects.bulk_create(users)
+        UserStats.objects.bulk_create(
+            [UserStats(user=user, telegram_id=str(100_000 + i)) for i, user in enumerate(users)]
+        )
+
+        for user in users:
+            cards = Card.objects.bulk_create([
+                Card(
+                    owner=user,
+                    word=f'word{j}',
+                    translation=f'перевод {j}',
+                    example=f'An example sentence with word{j}.' if rnd.random() < 0.6 else '',
+                    level=rnd.choices(levels, weights=(5, 3, 2))[0],
+                )
+                for j in range(self.options['cards'])
+            ], batch_size=1000)
+
+            schedules = []
+            for card in cards:
+                kind = rnd.random()
+                if kind < 0.2:
+                    # Новая карточка
+                    schedule = Schedule(next_review=now, interval=1, repetitions=0)
+                elif kind < 0.45:
+                    # Просроченная
+                    interval = rnd.choice((1, 2, 3, 6, 15))
+                    schedule = Schedule(
+                        next_review=now - timedelta(hours=rnd.uniform(1, 24 * 14)),
+                        interval=interval, repetitions=rnd.randint(1, 4),
+                    )
+                else:
+                    # Выученная с будущим повторением
+                    interval = min(int(rnd.expovariate(1 / 20)) + 1, 365)
+                    schedule = Schedule(
+                        next_review=now + timedelta(days=rnd.uniform(0, interval)),
+                        interval=interval, repetitions=rnd.randint(2, 10),
+                    )
+                schedule.card = card
+                schedule.owner = user
+                schedule.ease_factor = round(rnd.uniform(1.3, 3.0), 2)
+                schedules.append(schedule)
+            Schedule.objects.bulk_create(schedules, batch_size=1000)
+
+        UserStats.objects.reconcile_counters()
+        return users
+
+    # --- Замер ---
+
+    def measure(self, fn, setup=None):
+        timings = []
+        queries = []
+        for i in range(self.options['iterations']):
+            if setup:
+                setup(i)
+            before = self.counter.count
+            started = time.perf_counter()
+            fn(i)
+            timings.append((time.perf_counter() - started) * 1000)
+            queries.append(self.counter.count - before)
+        return {
+            'iterations': len(timings),
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p90_ms': round(percentile(timings, 90), 3),
+            'p99_ms': round(percentile(timings, 99), 3),
+            'max_ms': round(max(timings), 3),
+            'mean_ms': round(mean(timings), 3),
+            'queries_median': median(queries),
+            'queries_max': max(queries),
+        }
+
+    def client(self, i=0):
+        client = Client()
+        client.force_login(self.users[i % len(self.users)])
+        return client
+
+    def get(self, client, url, expected=200):
+        response = client.get(url)
+        if response.status_code != expected:
+            raise CommandError(f"{url}: ответ {response.status_code}")
+        return response
+
+    # --- Сайт ---
+
+    def run_card_list(self):
+        clients = [self.client(i) for i in range(len(self.users))]
+        # Без кэша: каждый раз считаем заново
+        return self.measure(
+            lambda i: self.get(clients[i % len(clients)], '/cards/'),
+            setup=lambda i: caches['default'].clear(),
+        )
+
+    def run_card_list_cached(self):
+        client = self.client()
+        self.get(client, '/cards/')
+        return self.measure(lambda i: self.get(client, '/cards/'))
+
+    def run_review(self):
+        client = self.client()
+        return self.measure(lambda i: self.get(client, '/review/'))
+
+    def run_review_answer(self):
+        from cards.models import Schedule
+
+        user = self.users[0]
+        client = self.client()
+        due = list(
+            Schedule.objects.due(user).values_list('card_id', flat=True)[:self.options['iterations']]
+        )
+        if len(due) < self.options['iterations']:
+            raise CommandError("Мало карточек на повторении — увеличьте --cards")
+        difficulties = ('hard', 'good', 'easy')
+        return self.measure(
+            lambda i: self.get(client, f'/review/{due[i]}/answer/{difficulties[i % 3]}/', expected=302)
+        )
+
+    def run_import_cards(self):
+        client = self.client()
+        size = self.options['import_size']
+        files = {}
+
+        def prepare(i):
+            # Половина файла — новые слова, половина — уже существующие
+            records = [
+                {'word': f'import{i}-{j}' if j % 2 else f'word{j}', 'translation': f'импорт {j}'}
+                for j in range(size)
+            ]
+            files[i] = SimpleUploadedFile(
+                'bench.json', json.dumps(records).encode('utf-8'), content_type='application/json'
+            )
+
+        def run(i):
+            response = client.post('/import/', {'file': files.pop(i)})
+            if response.status_code != 200:
+                raise CommandError(f"/import/: ответ {response.status_code}")
+
+        return self.measure(run, setup=prepare)
+
+    def run_export_cards(self):
+        client = self.client(1)
+
+        def run(i):
+            response = self.get(client, '/export/?format=json&schedule=1')
+            b''.join(response.streaming_content)
+
+        return self.measure(run)
+
+    # --- Бот ---
+
+    def bot(self):
+        if hasattr(self, '_bot'):
+            return self._bot
+
+        os.environ.setdefault('TELEGRAM_BOT_TOKEN', '123456:BENCHMARK')
+        from aiogram import types
+        from aiogram.client.session.base import BaseSession
+        import bot as bot_module
+
+        latency = self.options['api_latency_ms'] / 1000
+
+        class FakeSession(BaseSession):
+            """Вместо Telegram API: отвечает на любой метод «отправленным» сообщением."""
+
+            async def make_request(self, bot, method, timeout=None):
+                if latency:
+                    await asyncio.sleep(latency)
+                chat = types.Chat(id=getattr(method, 'chat_id', 1) or 1, type='private')
+                return types.Message(
+                    message_id=1, date=datetime.now(), chat=chat, text=getattr(method, 'text', None)
+                )
+
+            async def stream_content(self, *args, **kwargs):
+                yield b''
+
+            async def close(self):
+                pass
+
+        bot_module.bot.session = FakeSession()
+        # Привязки чатов могли остаться от прошлого прогона в этом процессе
+        bot_module.identities.clear()
+        loop = asyncio.new_event_loop()
+        self._bot = (bot_module, types, loop)
+        return self._bot
+
+    def message_update(self, text, user_index=0):
+        _, types, _ = self.bot()
+        telegram_id = 100_000 + user_index
+        self._update_id = getattr(self, '_update_id', 0) + 1
+        entities = None
+        if text.startswith('/'):
+            entities = [types.MessageEntity(type='bot_command', offset=0, length=len(text.split()[0]))]
+        return types.Update(update_id=self._update_id, message=types.Message(
+            message_id=self._update_id, date=datetime.now(), text=text, entities=entities,
+            chat=types.Chat(id=telegram_id, type='private'),
+            from_user=types.User(id=telegram_id, is_bot=False, first_name='Bench'),
+        ))
+
+    def feed(self, text, user_index=0):
+        bot_module, _, loop = self.bot()
+        update = self.message_update(text, user_index)
+        loop.run_until_complete(bot_module.dp.feed_update(bot_module.bot, update))
+
+    def press(self, data, user_index=0):
+        bot_module, types, loop = self.bot()
+        telegram_id = 100_000 + user_index
+        self._update_id = getattr(self, '_update_id', 0) + 1
+        user = types.User(id=telegram_id, is_bot=False, first_name='Bench')
+        update = types.Update(update_id=self._update_id, callback_query=types.CallbackQuery(
+            id=str(self._update_id), chat_instance='bench', data=data, from_user=user,
+            message=types.Message(
+                message_id=1, date=datetime.now(), text='…', chat=types.Chat(id=telegram_id, type='private'),
+            ),
+        ))
+        loop.run_until_complete(bot_module.dp.feed_update(bot_module.bot, update))
+
+    def run_bot_today(self):
+        return self.measure(lambda i: self.feed('/today', i % len(self.users)))
+
+    def run_bot_cards(self):
+        return self.measure(lambda i: self.feed('/cards', i % len(self.users)))
+
+    def run_bot_cards_next(self):
+        # Кнопка «Дальше ▶» с первой страницы /cards
+        bot_module, _, loop = self.bot()
+        buttons = []
+        for user in self.users:
+            _, keyboard = loop.run_until_complete(bot_module.cards_page(user.id))
+            buttons.append(keyboard.inline_keyboard[0][-1].callback_data)
+        return self.measure(lambda i: self.press(buttons[i % len(buttons)], i % len(self.users)))
+
+    def run_bot_progress(self):
+        return self.measure(lambda i: self.feed('/progress', i % len(self.users)))
+
+    def run_bot_test(self):
+        return self.measure(lambda i: self.feed('/test', i % len(self.users)))
+
+    def run_bot_review(self):
+        return self.measure(lambda i: self.feed('/review', i % len(self.users)))
+
+    def run_bot_review_answer(self):
+        buttons = list(self.bot()[0].REVIEW_BUTTONS)
+        return self.measure(
+            lambda i: self.feed(buttons[i % len(buttons)], i % len(self.users)),
+            setup=lambda i: self.feed('/review', i % len(self.users)),
+        )
+
+    def run_bot_concurrent(self):
+        """
+        Все чаты (по одному на пользователя) присылают команду одновременно,
+        как пачка апдейтов вебхука. Меряем задержку каждого апдейта и время
+        всей пачки — и ту же пачку, обработанную строго по очереди.
+        С --api-latency-ms видно, как перекрываются ожидания сети и базы.
+        """
+        bot_module, _, loop = self.bot()
+        commands = ('/today', '/cards', '/progress', '/test')
+        chats = range(len(self.users))
+        latencies = []
+        batches = []
+        sequential = []
+        queries = []
+
+        async def one(update):
+            started = time.perf_counter()
+            await bot_module.dp.feed_update(bot_module.bot, update)
+            latencies.append((time.perf_counter() - started) * 1000)
+
+        def batch(i):
+            return [self.message_update(commands[(i + chat) % len(commands)], chat) for chat in chats]
+
+        async def together(updates):
+            await asyncio.gather(*(one(update) for update in updates))
+
+        async def one_by_one(updates):
+            for update in updates:
+                await bot_module.dp.feed_update(bot_module.bot, update)
+
+        for i in range(self.options['iterations']):
+            before = self.counter.count
+            started = time.perf_counter()
+            loop.run_until_complete(together(batch(i)))
+            batches.append((time.perf_counter() - started) * 1000)
+            queries.append(self.counter.count - before)
+
+            started = time.perf_counter()
+            loop.run_until_complete(one_by_one(batch(i)))
+            sequential.append((time.perf_counter() - started) * 1000)
+
+        return {
+            'chats': len(chats),
+            'iterations': len(batches),
+            'api_latency_ms': self.options['api_latency_ms'],
+            # p50/p90/p99 — задержка одного апдейта внутри пачки
+            'p50_ms': round(percentile(latencies, 50), 3),
+            'p90_ms': round(percentile(latencies, 90), 3),
+            'p99_ms': round(percentile(latencies, 99), 3),
+            'max_ms': round(max(latencies), 3),
+            'batch_p50_ms': round(percentile(batches, 50), 3),
+            'batch_max_ms': round(max(batches), 3),
+            'sequential_batch_p50_ms': round(percentile(sequential, 50), 3),
+            'speedup': round(median(sequential) / median(batches), 2),
+            'queries_median': median(queries),
+        }
+
+    # --- Отчёт ---
+
+    def meta(self, seeded_in):
+        try:
+            commit = subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, timeout=5
+            ).stdout.strip() or None
+        except (OSError, subprocess.SubprocessError):
+            commit = None
+        return {
+            'commit': commit,
+            'created_at': timezone.now().isoformat(),
+            'users': self.options['users'],
+            'cards_per_user': self.options['cards'],
+            'iterations': self.options['iterations'],
+            'import_size': self.options['import_size'],
+            'seed': self.options['seed'],
+            'seed_seconds': round(seeded_in, 3),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'database': connection.vendor,
+            'cache': caches['default'].__class__.__name__,
+        }
+
+    def compare(self, path, results):
+        with open(path, encoding='utf-8') as f:
+            previous = json.load(f)['scenarios']
+        for name, current in results.items():
+            before = previous.get(name)
+            if not before:
+                continue
+            change = (current['p50_ms'] - before['p50_ms']) / before['p50_ms'] * 100 if before['p50_ms'] else 0
+            self.stderr.write(
+                f"{name:20} p50 {before['p50_ms']:9.2f} → {current['p50_ms']:9.2f} мс ({change:+.1f}%)  "
+                f"запросов {before['queries_median']} → {current['queries_median']}"
+            )
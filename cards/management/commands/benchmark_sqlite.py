@@ -0,0 +1,144 @@
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections, transaction
+
+
+class Command(BaseCommand):
+    help = (
+        "Конкурентная запись в SQLite: несколько писателей и читателей на одном "
+        "временном файле под каждым профилем из SQLITE_PROFILES. Показывает "
+        "пропускную способность и число ошибок «database is locked»."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', nargs='+', default=list(settings.SQLITE_PROFILES))
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--seconds', type=float, default=5.0, help="Длительность замера на профиль")
+        parser.add_argument('--output', help="Куда записать JSON (по умолчанию — stdout)")
+
+    def handle(self, *args, **options):
+        unknown = set(options['profiles']) - set(settings.SQLITE_PROFILES)
+        if unknown:
+            raise CommandError(f"Неизвестные профили: {', '.join(sorted(unknown))}")
+
+        # Ожидание блокировки здесь — часть замера, а не медленные запросы
+        logging.getLogger('cards.sql').setLevel(logging.ERROR)
+
+        directory = tempfile.mkdtemp(prefix='sqlite-bench-')
+        try:
+            results = {
+                profile: self.run_profile(profile, os.path.join(directory, f'{profile}.sqlite3'), options)
+                for profile in options['profiles']
+            }
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+        for profile, result in results.items():
+            self.stderr.write(
+                f"{profile:12} записей/с {result['writes_per_second']:8.1f}  "
+                f"чтений/с {result['reads_per_second']:8.1f}  "
+                f"ошибок блокировки {result['lock_errors']}"
+            )
+
+        text = json.dumps({
+            'writers': options['writers'],
+            'readers': options['readers'],
+            'seconds': options['seconds'],
+            'profiles': results,
+        }, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(text + '\n')
+        else:
+            self.stdout.write(text)
+
+    def run_profile(self, profile, path, options):
+        alias = f'benchmark_{profile}'
+        # Отдельный алиас на временный файл: у каждого потока своё соединение,
+        # как у процессов сайта и бота
+        databases = connections.configure_settings({
+            DEFAULT_DB_ALIAS: settings.DATABASES[DEFAULT_DB_ALIAS],
+            alias: {
+                'ENGINE': 'django.db.backends.sqlite3',
+                'NAME': path,
+                **settings.SQLITE_PROFILES[profile],
+            },
+        })
+        connections.settings[alias] = databases[alias]
+
+        with connections[alias].cursor() as cursor:
+            cursor.execute("CREATE TABLE counters (id INTEGER PRIMARY KEY, value INTEGER NOT NULL)")
+            cursor.execute(
+                "CREATE TABLE log (id INTEGER PRIMARY KEY, worker INTEGER NOT NULL, value INTEGER NOT NULL)"
+            )
+            cursor.execute("CREATE INDEX log_worker_idx ON log (worker)")
+            for worker in range(options['writers']):
+                cursor.execute("INSERT INTO counters (id, value) VALUES (%s, 0)", [worker])
+        connections[alias].close()
+
+        stats = {'writes': 0, 'reads': 0, 'lock_errors': 0}
+        lock = threading.Lock()
+        stop = threading.Event()
+
+        def add(name):
+            with lock:
+                stats[name] += 1
+
+        def writer(worker):
+            # Как apply_reviews: прочитать, пересчитать, записать — в одной транзакции
+            try:
+                while not stop.is_set():
+                    try:
+                        with transaction.atomic(using=alias):
+                            with connections[alias].cursor() as cursor:
+                                cursor.execute("SELECT value FROM counters WHERE id = %s", [worker])
+                                value = cursor.fetchone()[0] + 1
+                                cursor.execute("UPDATE counters SET value = %s WHERE id = %s", [value, worker])
+                                cursor.execute("INSERT INTO log (worker, value) VALUES (%s, %s)", [worker, value])
+                        add('writes')
+                    except OperationalError:
+                        add('lock_errors')
+            finally:
+                connections[alias].close()
+
+        def reader(worker):
+            try:
+                while not stop.is_set():
+                    try:
+                        with connections[alias].cursor() as cursor:
+                            cursor.execute("SELECT value FROM counters WHERE id = %s", [worker % options['writers']])
+                            cursor.execute("SELECT COUNT(*) FROM log WHERE worker = %s", [worker % options['writers']])
+                            cursor.fetchone()
+                        add('reads')
+                    except OperationalError:
+                        add('lock_errors')
+            finally:
+                connections[alias].close()
+
+        threads = [threading.Thread(target=writer, args=(i,)) for i in range(options['writers'])]
+        threads += [threading.Thread(target=reader, args=(i,)) for i in range(options['readers'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        time.sleep(options['seconds'])
+        stop.set()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        return {
+            'writes': stats['writes'],
+            'reads': stats['reads'],
+            'lock_errors': stats['lock_errors'],
+            'writes_per_second': round(stats['writes'] / elapsed, 1),
+            'reads_per_second': round(stats['reads'] / elapsed, 1),
+        }
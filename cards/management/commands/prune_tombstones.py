@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from cards.sync import prune_tombstones
+
+
+class Command(BaseCommand):
+    help = (
+        "Удаляет надгробия удалённых карточек старше SYNC_TOMBSTONE_DAYS. "
+        "Клиенты с курсором старше этого срока получат 410 и синхронизируются заново"
+    )
+
+    def handle(self, *args, **options):
+        deleted = prune_tombstones()
+        self.stdout.write(self.style.SUCCESS(
+            f"Удалено надгробий старше {settings.SYNC_TOMBSTONE_DAYS} дн.: {deleted}"
+        ))
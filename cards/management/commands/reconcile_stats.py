@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from cards.models import UserStats
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает счётчики карточек (total_cards, learned_cards) в UserStats"
+
+    def handle(self, *args, **options):
+        fixed = UserStats.objects.reconcile_counters()
+        self.stdout.write(self.style.SUCCESS(f"Исправлено записей статистики: {fixed}"))
@@ -0,0 +1,173 @@
+# cards/metrics.py
+
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from django.conf import settings
+
+logger = logging.getLogger('cards.sql')
+
+# Границы корзин гистограмм
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERIES_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+
+class Histogram:
+    """
+    Гистограмма в духе Prometheus: счётчики по корзинам, сумма и количество
+    для каждого набора меток. Значения живут в памяти процесса.
+    """
+
+    def __init__(self, name, help_text, buckets, labels=('kind', 'route')):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.labels = labels
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                # [счётчики корзин..., сумма, количество]
+                series = self._series[label_values] = [0] * len(self.buckets) + [0, 0]
+            index = bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {key: list(values) for key, values in self._series.items()}
+        for label_values, values in sorted(series.items()):
+            labels = _labels(zip(self.labels, label_values))
+            cumulative = 0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {values[-1]}')
+            lines.append(f'{self.name}_sum{{{labels}}} {values[-2]}')
+            lines.append(f'{self.name}_count{{{labels}}} {values[-1]}')
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=('kind', 'route')):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = dict(self._values)
+        for label_values, value in sorted(values.items()):
+            lines.append(f'{self.name}{{{_labels(zip(self.labels, label_values))}}} {value}')
+        return lines
+
+
+def _labels(pairs):
+    return ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in pairs
+    )
+
+
+REQUEST_SECONDS = Histogram(
+    'linguatrack_request_duration_seconds', "Время обработки запроса сайта или апдейта бота", SECONDS_BUCKETS
+)
+SQL_QUERIES = Histogram(
+    'linguatrack_request_sql_queries', "SQL-запросов на один запрос или апдейт", QUERIES_BUCKETS
+)
+SQL_SECONDS = Histogram(
+    'linguatrack_request_sql_duration_seconds', "Суммарное время SQL на один запрос или апдейт", SECONDS_BUCKETS
+)
+SLOW_QUERIES = Counter(
+    'linguatrack_slow_queries_total', "SQL-запросы дольше SLOW_QUERY_MS"
+)
+WEBHOOK_REJECTED = Counter(
+    'linguatrack_webhook_rejected_total', "Апдейты, отклонённые вебхуком бота из-за переполнения", labels=('reason',)
+)
+REVIEW_LOG_DROPPED = Counter(
+    'linguatrack_review_log_dropped_total', "Записи журнала повторений, отброшенные после ошибок записи",
+    labels=('reason',)
+)
+
+
+class Recorder:
+    """Счётчики SQL одного запроса сайта или одного апдейта бота."""
+
+    def __init__(self, kind, route):
+        self.kind = kind
+        self.route = route
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.started = time.perf_counter()
+
+    def finish(self):
+        REQUEST_SECONDS.observe(time.perf_counter() - self.started, self.kind, self.route)
+        SQL_QUERIES.observe(self.queries, self.kind, self.route)
+        SQL_SECONDS.observe(self.sql_seconds, self.kind, self.route)
+
+
+# Текущий запрос или апдейт. ContextVar, а не thread-local: sync_to_async
+# копирует контекст в поток ORM, и запросы бота попадают в свой апдейт
+current_recorder = ContextVar('current_recorder', default=None)
+
+
+def record_sql(execute, sql, params, many, context):
+    """
+    Обёртка выполнения SQL (connection.execute_wrappers) на всех соединениях.
+    """
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        recorder = current_recorder.get()
+        if recorder is not None:
+            recorder.queries += 1
+            recorder.sql_seconds += elapsed
+        if elapsed * 1000 >= settings.SLOW_QUERY_MS:
+            kind, route = (recorder.kind, recorder.route) if recorder else ('other', '')
+            SLOW_QUERIES.inc(kind, route)
+            logger.warning("Медленный запрос (%.0f мс, %s %s): %s", elapsed * 1000, kind, route, sql)
+
+
+def install_sql_wrapper(sender, connection, **kwargs):
+    """Обработчик connection_created: подключает record_sql к новому соединению."""
+    if record_sql not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_sql)
+
+
+def render():
+    """Все метрики процесса в текстовом формате Prometheus."""
+    from .cache import card_cache
+
+    lines = []
+    for metric in (
+        REQUEST_SECONDS, SQL_QUERIES, SQL_SECONDS, SLOW_QUERIES, WEBHOOK_REJECTED, REVIEW_LOG_DROPPED
+    ):
+        lines.extend(metric.render())
+
+    lines.append("# HELP linguatrack_cache_requests_total Обращения к кэшу карточек")
+    lines.append("# TYPE linguatrack_cache_requests_total counter")
+    for name, counts in card_cache.stats().items():
+        lines.append(f'linguatrack_cache_requests_total{{name="{name}",result="hit"}} {counts["hits"]}')
+        lines.append(f'linguatrack_cache_requests_total{{name="{name}",result="miss"}} {counts["misses"]}')
+    return '\n'.join(lines) + '\n'
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
@@ -0,0 +1,30 @@
+# cards/middleware.py
+
+from .metrics import Recorder, current_recorder
+
+
+class MetricsMiddleware:
+    """
+    Время ответа, число и время SQL-запросов для каждого view.
+    Стоит первым в MIDDLEWARE, чтобы учесть и запросы сессий/авторизации.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = Recorder('web', '')
+        token = current_recorder.set(recorder)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_recorder.reset(token)
+        recorder.route = recorder.route or 'unmatched'
+        recorder.finish()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # Имя маршрута известно только после разбора URL — до запросов самого view
+        recorder = current_recorder.get()
+        if recorder is not None:
+            recorder.route = request.resolver_match.view_name
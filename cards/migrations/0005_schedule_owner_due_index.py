@@ -0,0 +1,41 @@
+# Generated by Django 5.2.5 on 2026-10-18 10:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_schedule_owner(apps, schema_editor):
+    Schedule = apps.get_model('cards', 'Schedule')
+    Card = apps.get_model('cards', 'Card')
+    Schedule.objects.update(
+        owner=models.Subquery(
+            Card.objects.filter(pk=models.OuterRef('card_id')).values('owner_id')[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0004_alter_schedule_interval'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='schedule',
+            name='owner',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Владелец'),
+        ),
+        migrations.RunPython(fill_schedule_owner, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='schedule',
+            name='owner',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Владелец'),
+        ),
+        migrations.AddIndex(
+            model_name='schedule',
+            index=models.Index(fields=['owner', 'next_review'], name='schedule_owner_due_idx'),
+        ),
+    ]
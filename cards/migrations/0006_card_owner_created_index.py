@@ -0,0 +1,19 @@
+# Generated by Django 5.2.5 on 2026-10-18 02:47
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0005_schedule_owner_due_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='card',
+            index=models.Index(fields=['owner', 'created_at', 'id'], name='card_owner_created_idx'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.5 on 2026-10-18 02:51
+
+import zoneinfo
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def next_reminder_slot(reminder_time, tz_name, after):
+    # Копия cards.models.next_reminder_slot на момент миграции
+    tz = zoneinfo.ZoneInfo(tz_name or 'Europe/Moscow')
+    local_now = after.astimezone(tz)
+    slot = datetime.combine(local_now.date(), reminder_time, tzinfo=tz)
+    if slot <= local_now:
+        slot = datetime.combine(local_now.date() + timedelta(days=1), reminder_time, tzinfo=tz)
+    return slot.astimezone(dt_timezone.utc)
+
+
+def fill_next_reminder(apps, schema_editor):
+    UserStats = apps.get_model('cards', 'UserStats')
+    now = timezone.now()
+    stats = list(UserStats.objects.filter(telegram_id__isnull=False))
+    for item in stats:
+        item.next_reminder_at = next_reminder_slot(item.reminder_time, item.timezone, now)
+    UserStats.objects.bulk_update(stats, ['next_reminder_at'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0006_card_owner_created_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userstats',
+            name='next_reminder_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True, verbose_name='Следующее напоминание'),
+        ),
+        migrations.AddField(
+            model_name='userstats',
+            name='timezone',
+            field=models.CharField(default='Europe/Moscow', max_length=64, verbose_name='Часовой пояс'),
+        ),
+        migrations.RunPython(fill_next_reminder, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.5 on 2026-10-18 02:54
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def dedupe_telegram_ids(apps, schema_editor):
+    """
+    Перед уникальным индексом: пустые строки превращаем в NULL, а у
+    повторяющихся telegram_id оставляем привязку только у последней записи.
+    """
+    UserStats = apps.get_model('cards', 'UserStats')
+    UserStats.objects.filter(telegram_id='').update(telegram_id=None)
+
+    duplicates = (
+        UserStats.objects.filter(telegram_id__isnull=False)
+        .values('telegram_id')
+        .annotate(n=Count('id'), keep=Max('id'))
+        .filter(n__gt=1)
+    )
+    for row in duplicates:
+        (UserStats.objects
+         .filter(telegram_id=row['telegram_id'])
+         .exclude(id=row['keep'])
+         .update(telegram_id=None, next_reminder_at=None))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0007_userstats_next_reminder_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_telegram_ids, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='userstats',
+            name='telegram_id',
+            field=models.CharField(blank=True, max_length=50, null=True, unique=True, verbose_name='Telegram ID'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.5 on 2026-10-18 02:56
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0008_userstats_telegram_id_unique'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReviewLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rating', models.CharField(max_length=10, verbose_name='Оценка')),
+                ('reviewed_at', models.DateTimeField(verbose_name='Время ответа')),
+                ('previous_interval', models.IntegerField(verbose_name='Интервал до ответа (дни)')),
+                ('interval', models.IntegerField(verbose_name='Новый интервал (дни)')),
+                ('ease_factor', models.FloatField(verbose_name='Фактор лёгкости')),
+                ('latency_ms', models.IntegerField(blank=True, null=True, verbose_name='Время на ответ (мс)')),
+                ('source', models.CharField(choices=[('web', 'Сайт'), ('bot', 'Telegram-бот'), ('api', 'API')], default='web', max_length=10, verbose_name='Источник')),
+                ('card', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='cards.card', verbose_name='Карточка')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Запись журнала повторений',
+                'verbose_name_plural': 'Журнал повторений',
+                'indexes': [models.Index(fields=['user', 'reviewed_at'], name='reviewlog_user_time_idx')],
+            },
+        ),
+    ]
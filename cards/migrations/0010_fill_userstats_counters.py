@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:12
+
+from django.db import migrations
+from django.db.models import Count, Q
+
+
+def fill_counters(apps, schema_editor):
+    """
+    До этой миграции total_cards и learned_cards не заполнялись —
+    считаем их один раз по текущим карточкам.
+    """
+    Card = apps.get_model('cards', 'Card')
+    UserStats = apps.get_model('cards', 'UserStats')
+
+    counts = (
+        Card.objects.order_by().values('owner_id')
+        .annotate(total=Count('id'), learned=Count('id', filter=Q(schedule__repetitions__gte=3)))
+    )
+    for row in counts:
+        UserStats.objects.filter(user_id=row['owner_id']).update(
+            total_cards=row['total'], learned_cards=row['learned']
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0009_reviewlog'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-18 03:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0010_fill_userstats_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userstats',
+            name='last_seen',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Последняя активность в боте'),
+        ),
+        migrations.AddField(
+            model_name='userstats',
+            name='message_count',
+            field=models.IntegerField(default=0, verbose_name='Сообщений боту'),
+        ),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:30
+
+from django.db import migrations
+
+# Полнотекстовый индекс карточек: внешняя FTS5-таблица над cards_card.
+# unicode61 с remove_diacritics 2 — поиск без учёта регистра и диакритики
+# латиницы (cafe найдёт café). Кириллическую «ё» токенизатор не сводит к «е» —
+# триггеры пишут в индекс текст с заменой ё → е, cards.search делает то же
+# с запросом. Поэтому индекс заполняется через INSERT ... SELECT, а не
+# 'rebuild': тот взял бы текст из cards_card как есть.
+COLUMNS = ('word', 'translation', 'example', 'note')
+
+
+def folded(prefix):
+    return ', '.join(f"replace(replace({prefix}{name}, 'ё', 'е'), 'Ё', 'Е')" for name in COLUMNS)
+
+
+CREATE_SQL = (
+    """
+    CREATE VIRTUAL TABLE cards_card_fts USING fts5(
+        word, translation, example, note,
+        content='cards_card', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER cards_card_fts_insert AFTER INSERT ON cards_card BEGIN
+        INSERT INTO cards_card_fts (rowid, word, translation, example, note)
+        VALUES (new.id, {folded('new.')});
+    END
+    """,
+    f"""
+    CREATE TRIGGER cards_card_fts_delete AFTER DELETE ON cards_card BEGIN
+        INSERT INTO cards_card_fts (cards_card_fts, rowid, word, translation, example, note)
+        VALUES ('delete', old.id, {folded('old.')});
+    END
+    """,
+    f"""
+    CREATE TRIGGER cards_card_fts_update AFTER UPDATE OF word, translation, example, note ON cards_card BEGIN
+        INSERT INTO cards_card_fts (cards_card_fts, rowid, word, translation, example, note)
+        VALUES ('delete', old.id, {folded('old.')});
+        INSERT INTO cards_card_fts (rowid, word, translation, example, note)
+        VALUES (new.id, {folded('new.')});
+    END
+    """,
+    # Уже существующие карточки
+    f"INSERT INTO cards_card_fts (rowid, word, translation, example, note) SELECT id, {folded('')} FROM cards_card",
+)
+
+DROP_SQL = (
+    "DROP TRIGGER IF EXISTS cards_card_fts_insert",
+    "DROP TRIGGER IF EXISTS cards_card_fts_delete",
+    "DROP TRIGGER IF EXISTS cards_card_fts_update",
+    "DROP TABLE IF EXISTS cards_card_fts",
+)
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        # FTS5 есть только в SQLite; на другой базе cards.search ищет подстрокой
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for sql in statements:
+            schema_editor.execute(sql)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0012_sync_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(CREATE_SQL), run(DROP_SQL)),
+    ]
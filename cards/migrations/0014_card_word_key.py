@@ -0,0 +1,89 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:20
+
+import unicodedata
+
+from django.db import migrations, models
+from django.db.models import Count, F, Q
+
+
+def normalize_word(word):
+    # Копия cards.models.normalize_word на момент миграции
+    return unicodedata.normalize('NFKC', ' '.join((word or '').split())).casefold()
+
+
+def merge_duplicates(apps, schema_editor):
+    """
+    Заполняет word_key и сливает карточки с одинаковым ключом у одного
+    владельца. Остаётся карточка с наибольшим прогрессом (потом — самая
+    старая); пустые пример и примечание она берёт у дубликатов, история
+    повторений переходит к ней, дубликаты удаляются с надгробиями.
+    """
+    Card = apps.get_model('cards', 'Card')
+    CardTombstone = apps.get_model('cards', 'CardTombstone')
+    ReviewLog = apps.get_model('cards', 'ReviewLog')
+    UserStats = apps.get_model('cards', 'UserStats')
+
+    batch = []
+    for card in Card.objects.only('id', 'word').iterator(chunk_size=2000):
+        card.word_key = normalize_word(card.word)
+        batch.append(card)
+        if len(batch) >= 2000:
+            Card.objects.bulk_update(batch, ['word_key'])
+            batch = []
+    if batch:
+        Card.objects.bulk_update(batch, ['word_key'])
+
+    groups = (
+        Card.objects.order_by().values('owner_id', 'word_key')
+        .annotate(count=Count('id')).filter(count__gt=1)
+    )
+    owners = set()
+    for group in groups:
+        cards = list(
+            Card.objects.filter(owner_id=group['owner_id'], word_key=group['word_key'])
+            .order_by(F('schedule__repetitions').desc(nulls_last=True), 'created_at', 'id')
+        )
+        keeper, duplicates = cards[0], cards[1:]
+        for duplicate in duplicates:
+            keeper.example = keeper.example or duplicate.example
+            keeper.note = keeper.note or duplicate.note
+        keeper.save(update_fields=['example', 'note', 'updated_at'])
+
+        ids = [card.id for card in duplicates]
+        ReviewLog.objects.filter(card_id__in=ids).update(card_id=keeper.id)
+        CardTombstone.objects.bulk_create(
+            [CardTombstone(owner_id=group['owner_id'], card_id=card_id) for card_id in ids]
+        )
+        Card.objects.filter(id__in=ids).delete()
+        owners.add(group['owner_id'])
+
+    # Счётчики затронутых пользователей — заново, как в 0010
+    counts = (
+        Card.objects.filter(owner_id__in=owners).order_by().values('owner_id')
+        .annotate(total=Count('id'), learned=Count('id', filter=Q(schedule__repetitions__gte=3)))
+    )
+    for row in counts:
+        UserStats.objects.filter(user_id=row['owner_id']).update(
+            total_cards=row['total'], learned_cards=row['learned']
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0013_card_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='card',
+            name='word_key',
+            field=models.CharField(default='', editable=False, max_length=200, verbose_name='Ключ слова'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='card',
+            constraint=models.UniqueConstraint(fields=('owner', 'word_key'), name='card_owner_word_key_uniq'),
+        ),
+    ]
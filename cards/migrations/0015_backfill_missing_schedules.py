@@ -0,0 +1,36 @@
+# Generated by Django 5.2.5 on 2026-10-18 15:10
+
+from django.db import migrations
+from django.utils import timezone
+
+
+def create_missing_schedules(apps, schema_editor):
+    """
+    Старый импорт создавал карточки без расписания, и такие карточки
+    никогда не попадали в очередь повторения. Создаём им расписание
+    по умолчанию — к повторению сразу.
+    """
+    Card = apps.get_model('cards', 'Card')
+    Schedule = apps.get_model('cards', 'Schedule')
+
+    now = timezone.now()
+    orphans = Card.objects.filter(schedule__isnull=True).values_list('id', 'owner_id')
+    batch = []
+    for card_id, owner_id in orphans.iterator(chunk_size=2000):
+        batch.append(Schedule(card_id=card_id, owner_id=owner_id, next_review=now))
+        if len(batch) >= 2000:
+            Schedule.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        Schedule.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0014_card_word_key'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_missing_schedules, migrations.RunPython.noop),
+    ]
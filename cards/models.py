@@ -1,9 +1,15 @@
 # cards/models.py
 
-from django.db import models
+import unicodedata
+import zoneinfo
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.db import models, transaction
+from django.db.models.functions import Coalesce, Greatest
 from django.contrib.auth.models import User
 from django.utils import timezone
-from datetime import timedelta
+
+from .cache import card_cache
 
 # Уровни сложности карточки
 LEVEL_CHOICES = [
@@ -12,6 +18,129 @@ LEVEL_CHOICES = [
     ('advanced', 'Продвинутый'),
 ]
 
+# Карточка считается выученной после стольких повторений
+LEARNED_REPETITIONS = 3
+
+# Поля, которые upsert обновляет у уже существующей карточки.
+# Слово (в написании пользователя) и расписание не трогаем
+UPSERT_FIELDS = ('translation', 'example', 'note', 'level', 'updated_at')
+
+
+def normalize_word(word):
+    """
+    Ключ слова для поиска дубликатов: Unicode NFKC, пробелы по краям
+    убраны, внутри схлопнуты, регистр сведён casefold().
+    «Café», « café » и «CAFÉ» дают один ключ.
+    """
+    return unicodedata.normalize('NFKC', ' '.join((word or '').split())).casefold()
+
+
+class CardQuerySet(models.QuerySet):
+    def due(self, user, now=None):
+        """
+        Карточки пользователя, которые пора повторить (самые просроченные — первыми).
+        Расписание подтягивается тем же запросом.
+        """
+        now = now or timezone.now()
+        return self.filter(
+            schedule__owner=user,
+            schedule__next_review__lte=now
+        ).select_related('schedule').order_by('schedule__next_review')
+
+    def next_due(self, user, limit=1, now=None):
+        """
+        Следующие `limit` карточек на повторение — один запрос по индексу (owner, next_review).
+        """
+        return [s.card for s in Schedule.objects.due(user, now)[:limit]]
+
+    async def anext_due(self, user, limit=1, now=None):
+        """
+        Асинхронный вариант next_due для бота.
+        """
+        return [s.card async for s in Schedule.objects.due(user, now)[:limit]]
+
+    def bulk_create(self, objs, *args, **kwargs):
+        # save() не вызывается — ключ слова заполняем здесь
+        objs = list(objs)
+        for card in objs:
+            card.word_key = normalize_word(card.word)
+        return super().bulk_create(objs, *args, **kwargs)
+
+    bulk_create.alters_data = True
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        if 'word' in fields and 'word_key' not in fields:
+            objs = list(objs)
+            for card in objs:
+                card.word_key = normalize_word(card.word)
+            fields = [*fields, 'word_key']
+        return super().bulk_update(objs, fields, *args, **kwargs)
+
+    bulk_update.alters_data = True
+
+    def upsert(self, owner_id, cards, schedules=None):
+        """
+        Пакетная вставка-или-обновление карточек владельца по (owner, word_key):
+        один INSERT ... ON CONFLICT DO UPDATE на порцию. У существующих карточек
+        обновляются UPSERT_FIELDS, новым создаётся расписание (`schedules` —
+        поля расписания в том же порядке). Слова внутри `cards` не должны
+        повторяться. Возвращает (карточки с id, сколько из них новых).
+        """
+        schedules = schedules or [{}] * len(cards)
+        for card in cards:
+            card.owner_id = owner_id
+            card.word_key = normalize_word(card.word)
+
+        with transaction.atomic():
+            existing = set(
+                self.filter(owner_id=owner_id, word_key__in=[card.word_key for card in cards])
+                .values_list('word_key', flat=True)
+            )
+            cards = self.bulk_create(
+                cards, batch_size=500,
+                update_conflicts=True, unique_fields=['owner', 'word_key'], update_fields=UPSERT_FIELDS,
+            )
+            fresh = [
+                (card, schedule) for card, schedule in zip(cards, schedules)
+                if card.word_key not in existing
+            ]
+            Schedule.objects.bulk_create(
+                [Schedule(card=card, owner_id=owner_id, **schedule) for card, schedule in fresh],
+                batch_size=500
+            )
+            # bulk_create не вызывает save(), поэтому счётчики и кэш двигаем сами
+            learned = sum(1 for _, schedule in fresh if schedule.get('repetitions', 0) >= LEARNED_REPETITIONS)
+            UserStats.objects.bump_counters(owner_id, total=len(fresh), learned=learned)
+            card_cache.bump_on_commit(owner_id)
+        return cards, len(fresh)
+
+    def delete(self):
+        """
+        Удаление с поправкой счётчиков UserStats: до DELETE один GROUP BY
+        по владельцам, затем по одному UPDATE ... F() на владельца.
+        Для синхронизации остаются надгробия (CardTombstone) удалённых id.
+        """
+        with transaction.atomic():
+            counts = list(
+                self.order_by().values('owner_id').annotate(
+                    total=models.Count('id'),
+                    learned=models.Count('id', filter=models.Q(schedule__repetitions__gte=LEARNED_REPETITIONS)),
+                )
+            )
+            tombstones = [
+                CardTombstone(owner_id=owner_id, card_id=card_id)
+                for card_id, owner_id in self.order_by().values_list('id', 'owner_id')
+            ]
+            result = super().delete()
+            CardTombstone.objects.bulk_create(tombstones, batch_size=1000)
+            for row in counts:
+                UserStats.objects.bump_counters(row['owner_id'], total=-row['total'], learned=-row['learned'])
+                card_cache.bump_on_commit(row['owner_id'])
+        return result
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
 
 class Card(models.Model):
     word = models.CharField("Слово", max_length=200)
@@ -20,22 +149,194 @@ class Card(models.Model):
     note = models.TextField("Примечание", blank=True, null=True)
     level = models.CharField("Уровень", max_length=20, choices=LEVEL_CHOICES, default='beginner')
     owner = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name="Владелец")
+    # normalize_word(word): дубликаты запрещены на уровне схемы
+    word_key = models.CharField("Ключ слова", max_length=200, editable=False)
     created_at = models.DateTimeField("Дата создания", auto_now_add=True)
+    # Для синхронизации; bulk_update обязан выставлять его сам
+    updated_at = models.DateTimeField("Дата изменения", auto_now=True)
+
+    objects = CardQuerySet.as_manager()
 
     def __str__(self):
         return f"{self.word} → {self.translation}"
 
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        self.word_key = normalize_word(self.word)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'word' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'word_key'}
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if adding:
+                UserStats.objects.bump_counters(self.owner_id, total=1)
+            card_cache.bump_on_commit(self.owner_id)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            learned = Schedule.objects.filter(card_id=self.pk, repetitions__gte=LEARNED_REPETITIONS).exists()
+            card_id = self.pk
+            result = super().delete(*args, **kwargs)
+            CardTombstone.objects.create(owner_id=self.owner_id, card_id=card_id)
+            UserStats.objects.bump_counters(self.owner_id, total=-1, learned=-int(learned))
+            card_cache.bump_on_commit(self.owner_id)
+        return result
+
     class Meta:
         verbose_name = "Карточка"
         verbose_name_plural = "Карточки"
+        indexes = [
+            models.Index(fields=['owner', 'created_at', 'id'], name='card_owner_created_idx'),
+            models.Index(fields=['owner', 'updated_at', 'id'], name='card_owner_updated_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'word_key'], name='card_owner_word_key_uniq'),
+        ]
+
+
+class CardTombstone(models.Model):
+    """
+    След удалённой карточки: клиенты синхронизации узнают из него,
+    что карточку нужно убрать у себя.
+    """
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name="Владелец", related_name='+')
+    card_id = models.BigIntegerField("ID карточки")
+    deleted_at = models.DateTimeField("Дата удаления", default=timezone.now)
+
+    def __str__(self):
+        return f"{self.card_id} (удалена {self.deleted_at})"
+
+    class Meta:
+        verbose_name = "Удалённая карточка"
+        verbose_name_plural = "Удалённые карточки"
+        indexes = [
+            models.Index(fields=['owner', 'deleted_at', 'id'], name='tombstone_owner_deleted_idx'),
+            # Для очистки старых надгробий (cards.sync.prune_tombstones)
+            models.Index(fields=['deleted_at'], name='tombstone_deleted_idx'),
+        ]
+
+
+# Оценки ответа при повторении
+DIFFICULTIES = ('hard', 'good', 'easy')
+
+
+def sm2_step(interval, ease_factor, difficulty):
+    """
+    Один шаг SM-2: новые (интервал, фактор лёгкости) после оценки.
+    """
+    if difficulty == 'hard':
+        interval = max(1, int(interval * 1.2))
+    elif difficulty == 'good':
+        interval = int(interval * 2.5)
+    elif difficulty == 'easy':
+        interval = int(interval * 3.5)
+    else:
+        interval = 1
+
+    if difficulty == 'hard':
+        ease_factor = max(1.3, ease_factor - 0.2)
+    elif difficulty == 'good':
+        ease_factor = max(1.3, ease_factor + 0.1)
+    elif difficulty == 'easy':
+        ease_factor = max(1.3, ease_factor + 0.3)
+
+    return interval, ease_factor
+
+
+class ScheduleQuerySet(models.QuerySet):
+    def due(self, user, now=None):
+        """
+        Очередь повторения пользователя: расписания с наступившим сроком
+        вместе с карточкой, от самых просроченных к свежим.
+        """
+        now = now or timezone.now()
+        return self.filter(
+            owner=user,
+            next_review__lte=now
+        ).select_related('card').order_by('next_review')
+
+    def apply_reviews(self, user_id, ratings, source='web'):
+        """
+        Применяет пачку оценок [(card_id, difficulty, reviewed_at[, latency_ms]), ...]
+        одной транзакцией: одна выборка расписаний, пересчёт в памяти в порядке
+        reviewed_at, bulk_update и атомарное обновление статистики через F().
+        Записи ReviewLog уходят в буферизованный писатель после коммита.
+
+        Возвращает (число применённых оценок, card_id, которых у пользователя нет).
+        """
+        from .reviewlog import review_log
+
+        ratings = sorted(ratings, key=lambda rating: rating[2])
+        with transaction.atomic():
+            schedules = {
+                schedule.card_id: schedule
+                for schedule in self.filter(owner_id=user_id, card_id__in={r[0] for r in ratings})
+            }
+
+            applied = 0
+            learned = 0
+            missing = []
+            touched = {}
+            last_reviewed = None
+            logs = []
+            for card_id, difficulty, reviewed_at, *rest in ratings:
+                schedule = schedules.get(card_id)
+                if schedule is None:
+                    missing.append(card_id)
+                    continue
+                previous_interval = schedule.interval
+                was_learned = schedule.repetitions >= LEARNED_REPETITIONS
+                schedule.apply_review(difficulty, reviewed_at)
+                if not was_learned and schedule.repetitions >= LEARNED_REPETITIONS:
+                    learned += 1
+                touched[card_id] = schedule
+                applied += 1
+                last_reviewed = reviewed_at
+                logs.append(ReviewLog(
+                    user_id=user_id,
+                    card_id=card_id,
+                    rating=difficulty,
+                    reviewed_at=reviewed_at,
+                    previous_interval=previous_interval,
+                    interval=schedule.interval,
+                    ease_factor=schedule.ease_factor,
+                    latency_ms=rest[0] if rest else None,
+                    source=source,
+                ))
+
+            if applied:
+                # bulk_update не трогает auto_now — updated_at ставим сами
+                updated_at = timezone.now()
+                for schedule in touched.values():
+                    schedule.updated_at = updated_at
+                self.bulk_update(
+                    touched.values(),
+                    ['interval', 'ease_factor', 'repetitions', 'next_review', 'updated_at'],
+                    batch_size=500
+                )
+                UserStats.objects.filter(user_id=user_id).update(
+                    review_streak=models.F('review_streak') + applied,
+                    learned_cards=models.F('learned_cards') + learned,
+                    # Офлайн-пакет может прийти позже свежих оценок — время назад не двигаем
+                    last_reviewed=Greatest(Coalesce('last_reviewed', last_reviewed), last_reviewed)
+                )
+                # Журнал не пишем на горячем пути: откат транзакции — и записей нет
+                transaction.on_commit(lambda: review_log.extend(logs))
+                card_cache.bump_on_commit(user_id)
+        return applied, missing
 
 
 class Schedule(models.Model):
     card = models.OneToOneField(Card, on_delete=models.CASCADE, verbose_name="Карточка")
+    # Дублирует card.owner, чтобы очередь повторения читалась по индексу (owner, next_review)
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name="Владелец", related_name='+')
     next_review = models.DateTimeField("Следующее повторение", default=timezone.now)
     ease_factor = models.FloatField("Фактор лёгкости", default=2.5)
     interval = models.IntegerField("Интервал (дни)", default=1)
     repetitions = models.IntegerField("Число повторений", default=0)
+    updated_at = models.DateTimeField("Дата изменения", auto_now=True)
+
+    objects = ScheduleQuerySet.as_manager()
 
     def __str__(self):
         return f"{self.card.word} → {self.next_review}"
@@ -43,46 +344,161 @@ class Schedule(models.Model):
     class Meta:
         verbose_name = "Расписание"
         verbose_name_plural = "Расписание повторений"
+        indexes = [
+            models.Index(fields=['owner', 'next_review'], name='schedule_owner_due_idx'),
+            models.Index(fields=['owner', 'updated_at', 'id'], name='schedule_owner_updated_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.owner_id is None:
+            self.owner_id = self.card.owner_id
+        super().save(*args, **kwargs)
+        card_cache.bump_on_commit(self.owner_id)
 
-    def update_schedule(self, difficulty):
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        card_cache.bump_on_commit(self.owner_id)
+        return result
+
+    def apply_review(self, difficulty, reviewed_at=None):
         """
-        Обновляет расписание по SM-2 и сохраняет в БД.
+        Пересчитывает расписание по SM-2 без сохранения в БД.
         """
-        if difficulty == 'hard':
-            self.interval = max(1, int(self.interval * 1.2))
-        elif difficulty == 'good':
-            self.interval = int(self.interval * 2.5)
-        elif difficulty == 'easy':
-            self.interval = int(self.interval * 3.5)
-        else:
-            self.interval = 1
+        self.interval, self.ease_factor = sm2_step(self.interval, self.ease_factor, difficulty)
+        self.repetitions += 1
+        self.next_review = (reviewed_at or timezone.now()) + timedelta(days=self.interval)
 
-        if difficulty == 'hard':
-            self.ease_factor = max(1.3, self.ease_factor - 0.2)
-        elif difficulty == 'good':
-            self.ease_factor = max(1.3, self.ease_factor + 0.1)
-        elif difficulty == 'easy':
-            self.ease_factor = max(1.3, self.ease_factor + 0.3)
 
-        self.repetitions += 1
-        self.next_review = timezone.now() + timedelta(days=self.interval)
+# Откуда пришла оценка
+REVIEW_SOURCES = [
+    ('web', 'Сайт'),
+    ('bot', 'Telegram-бот'),
+    ('api', 'API'),
+]
+
+
+class ReviewLog(models.Model):
+    """
+    Журнал повторений: одна запись на ответ, только добавление.
+    Пишется пачками через cards.reviewlog.review_log.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name="Пользователь")
+    # При удалении карточки история остаётся — для статистики удержания
+    card = models.ForeignKey(Card, on_delete=models.SET_NULL, null=True, verbose_name="Карточка")
+    rating = models.CharField("Оценка", max_length=10)
+    reviewed_at = models.DateTimeField("Время ответа")
+    previous_interval = models.IntegerField("Интервал до ответа (дни)")
+    interval = models.IntegerField("Новый интервал (дни)")
+    ease_factor = models.FloatField("Фактор лёгкости")
+    latency_ms = models.IntegerField("Время на ответ (мс)", blank=True, null=True)
+    source = models.CharField("Источник", max_length=10, choices=REVIEW_SOURCES, default='web')
+
+    def __str__(self):
+        return f"{self.card_id}: {self.rating} ({self.reviewed_at})"
+
+    class Meta:
+        verbose_name = "Запись журнала повторений"
+        verbose_name_plural = "Журнал повторений"
+        indexes = [
+            models.Index(fields=['user', 'reviewed_at'], name='reviewlog_user_time_idx'),
+        ]
+
+
+# Часовой пояс напоминаний по умолчанию. Не settings.TIME_ZONE: значение
+# записано в миграции 0007, и от настройки сервера оно не должно зависеть
+DEFAULT_TIMEZONE = 'Europe/Moscow'
+
 
-        # ✅ Сохраняем изменения
-        self.save()
+def next_reminder_slot(reminder_time, tz_name, after):
+    """
+    Ближайший момент после `after`, когда в часовом поясе пользователя
+    наступает reminder_time. Возвращается в UTC.
+    """
+    tz = zoneinfo.ZoneInfo(tz_name or DEFAULT_TIMEZONE)
+    local_now = after.astimezone(tz)
+    slot = datetime.combine(local_now.date(), reminder_time, tzinfo=tz)
+    if slot <= local_now:
+        slot = datetime.combine(local_now.date() + timedelta(days=1), reminder_time, tzinfo=tz)
+    return slot.astimezone(dt_timezone.utc)
+
+
+class UserStatsQuerySet(models.QuerySet):
+    def by_telegram(self, telegram_id):
+        """
+        Статистика вместе с пользователем по Telegram ID — один запрос по
+        уникальному индексу. ID из Telegram приходит числом, в базе — строка.
+        """
+        return self.select_related('user').filter(telegram_id=str(telegram_id))
+
+    async def aresolve_telegram(self, telegram_id):
+        return await self.by_telegram(telegram_id).aget()
+
+    def bump_counters(self, user_id, total=0, learned=0):
+        """
+        Сдвигает счётчики карточек пользователя одним UPDATE через F() —
+        без чтения строки и без гонок между процессами.
+        """
+        if not total and not learned:
+            return 0
+        return self.filter(user_id=user_id).update(
+            total_cards=models.F('total_cards') + total,
+            learned_cards=models.F('learned_cards') + learned,
+        )
+
+    def reconcile_counters(self):
+        """
+        Пересчитывает total_cards и learned_cards всех пользователей заново:
+        один GROUP BY по карточкам и bulk_update только расходящихся строк.
+        Возвращает число исправленных строк.
+        """
+        with transaction.atomic():
+            actual = {
+                row['owner_id']: (row['total'], row['learned'])
+                for row in Card.objects.order_by().values('owner_id').annotate(
+                    total=models.Count('id'),
+                    learned=models.Count('id', filter=models.Q(schedule__repetitions__gte=LEARNED_REPETITIONS)),
+                )
+            }
+            stale = []
+            for stats in self.only('id', 'user_id', 'total_cards', 'learned_cards'):
+                total, learned = actual.get(stats.user_id, (0, 0))
+                if (stats.total_cards, stats.learned_cards) != (total, learned):
+                    stats.total_cards, stats.learned_cards = total, learned
+                    stale.append(stats)
+            self.bulk_update(stale, ['total_cards', 'learned_cards'], batch_size=1000)
+        return len(stale)
 
 
 class UserStats(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, verbose_name="Пользователь")
-    telegram_id = models.CharField("Telegram ID", max_length=50, blank=True, null=True)
+    telegram_id = models.CharField("Telegram ID", max_length=50, blank=True, null=True, unique=True)
+    # Счётчики ведутся инкрементально (см. bump_counters); сверка — manage.py reconcile_stats
     total_cards = models.IntegerField("Всего карточек", default=0)
     learned_cards = models.IntegerField("Выучено карточек", default=0)
     review_streak = models.IntegerField("Серия повторений", default=0)
     last_reviewed = models.DateTimeField("Последнее повторение", blank=True, null=True)
     reminder_time = models.TimeField("Время напоминания", default="09:00")
+    timezone = models.CharField("Часовой пояс", max_length=64, default=DEFAULT_TIMEZONE)
+    # Следующее напоминание (UTC); пусто — бот не привязан или напоминания выключены
+    next_reminder_at = models.DateTimeField("Следующее напоминание", blank=True, null=True, db_index=True)
+    # Активность в боте; пишется пачками (bot_activity.ActivityTracker)
+    last_seen = models.DateTimeField("Последняя активность в боте", blank=True, null=True)
+    message_count = models.IntegerField("Сообщений боту", default=0)
+
+    objects = UserStatsQuerySet.as_manager()
 
     def __str__(self):
         return f"Статистика {self.user.username}"
 
+    def schedule_next_reminder(self, after=None):
+        """
+        Переставляет next_reminder_at на ближайший слот после `after` (без сохранения).
+        """
+        reminder_time = self.reminder_time
+        if isinstance(reminder_time, str):
+            reminder_time = time.fromisoformat(reminder_time)
+        self.next_reminder_at = next_reminder_slot(reminder_time, self.timezone, after or timezone.now())
+
     class Meta:
         verbose_name = "Статистика пользователя"
         verbose_name_plural = "Статистика пользователей"
\ No newline at end of file
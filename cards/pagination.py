@@ -0,0 +1,80 @@
+# cards/pagination.py
+
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+
+# Размер страницы по умолчанию для сайта и бота
+PAGE_SIZE = 50
+
+
+def encode_cursor(card):
+    """
+    Курсор — позиция последней показанной карточки: (created_at, id) в base64.
+    """
+    raw = f"{card.created_at.isoformat()}|{card.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Разбирает курсор обратно в (created_at, id). Для битого курсора — None.
+    """
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, card_id = base64.urlsafe_b64decode(padded).decode().split('|')
+        return datetime.fromisoformat(created_at), int(card_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def keyset_page(queryset, cursor=None, size=PAGE_SIZE):
+    """
+    Страница карточек после курсора в порядке (created_at, id).
+    Без OFFSET: каждая страница — один запрос по индексу (owner, created_at, id).
+    Возвращает (карточки, курсор следующей страницы или None).
+    """
+    queryset = queryset.order_by('created_at', 'id')
+    position = decode_cursor(cursor)
+    if position:
+        created_at, card_id = position
+        queryset = queryset.filter(
+            Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=card_id)
+        )
+
+    # Берём на одну запись больше, чтобы узнать, есть ли следующая страница
+    items = list(queryset[:size + 1])
+    if len(items) > size:
+        items = items[:size]
+        return items, encode_cursor(items[-1])
+    return items, None
+
+
+def keyset_slice(queryset, fields, position=None, size=PAGE_SIZE, backward=False):
+    """
+    Окно keyset-пагинации по паре полей `fields` (например, ('created_at', 'id'))
+    в обе стороны: вперёд — после position, назад (backward) — до него.
+    Один запрос с LIMIT size + 1 по индексу, без OFFSET.
+    Возвращает (элементы в прямом порядке, есть ли ещё в сторону движения).
+    """
+    first, second = fields
+    op = 'lt' if backward else 'gt'
+    if backward:
+        queryset = queryset.order_by(f'-{first}', f'-{second}')
+    else:
+        queryset = queryset.order_by(first, second)
+    if position:
+        value, key = position
+        queryset = queryset.filter(
+            Q(**{f'{first}__{op}': value}) | Q(**{first: value, f'{second}__{op}': key})
+        )
+
+    items = list(queryset[:size + 1])
+    has_more = len(items) > size
+    items = items[:size]
+    if backward:
+        items.reverse()
+    return items, has_more
@@ -0,0 +1,64 @@
+# cards/reminders.py
+
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import Schedule, UserStats
+
+# Сколько напоминаний разбираем за один проход
+BATCH_SIZE = 1000
+
+# Напоминание, опоздавшее сильнее (бот был выключен), не шлём — только переносим
+GRACE = timedelta(minutes=30)
+
+
+def claim_due_reminders(now=None, limit=None):
+    """
+    Забирает порцию наступивших напоминаний и сразу переносит их на следующий
+    слот — до отправки, поэтому повторный или параллельный тик их уже не увидит.
+
+    Возвращает (recipients, claimed): список (telegram_id, число карточек на
+    повторении) и сколько строк забрал именно этот вызов. Опоздавшие сильнее
+    GRACE забираются, но в recipients не попадают.
+
+    Строка переносится условным UPDATE по прежнему next_reminder_at: если
+    параллельный процесс успел раньше, обновится 0 строк, и напоминание
+    здесь не отправляется. Запросов на порцию: выборка по индексу
+    next_reminder_at, один GROUP BY по расписанию и по UPDATE на строку.
+    """
+    now = now or timezone.now()
+    limit = limit or BATCH_SIZE
+    with transaction.atomic():
+        stats = list(
+            UserStats.objects
+            .filter(next_reminder_at__lte=now, telegram_id__isnull=False)
+            .only('id', 'user_id', 'telegram_id', 'reminder_time', 'timezone', 'next_reminder_at')
+            .order_by('next_reminder_at')[:limit]
+        )
+        if not stats:
+            return [], 0
+
+        due_counts = dict(
+            Schedule.objects
+            .filter(owner_id__in=[s.user_id for s in stats], next_review__lte=now)
+            .values('owner_id')
+            .annotate(n=Count('id'))
+            .values_list('owner_id', 'n')
+        )
+
+        recipients = []
+        claimed = 0
+        for item in stats:
+            previous = item.next_reminder_at
+            item.schedule_next_reminder(after=now)
+            if not UserStats.objects.filter(id=item.id, next_reminder_at=previous).update(
+                next_reminder_at=item.next_reminder_at
+            ):
+                continue
+            claimed += 1
+            if now - previous <= GRACE:
+                recipients.append((item.telegram_id, due_counts.get(item.user_id, 0)))
+    return recipients, claimed
@@ -0,0 +1,134 @@
+# cards/reviewlog.py
+
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection
+
+from .metrics import REVIEW_LOG_DROPPED
+
+logger = logging.getLogger(__name__)
+
+
+class ReviewLogBuffer:
+    """
+    Буфер записей ReviewLog: вместо INSERT на каждый ответ записи копятся
+    в памяти и уходят одним bulk_create, когда набралось batch_size штук
+    или прошло flush_interval секунд. При остановке процесса буфер
+    сбрасывается (atexit; бот дополнительно вызывает flush() сам).
+
+    Если запись не удалась, записи возвращаются в буфер, но не больше
+    max_entries штук; после max_attempts неудач подряд накопленное
+    отбрасывается. Отброшенное считается в dropped и в метрике
+    linguatrack_review_log_dropped_total.
+    """
+
+    def __init__(self, batch_size=200, flush_interval=5.0, max_entries=10_000, max_attempts=5):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_entries = max_entries
+        self.max_attempts = max_attempts
+        self.dropped = 0
+        self._failures = 0
+        self._entries = []
+        self._lock = threading.Lock()
+        # Отдельная блокировка записи: flush из таймера и из запроса не пересекаются
+        self._flush_lock = threading.Lock()
+        self._oldest = None
+        self._timer = None
+
+    def extend(self, entries):
+        if not entries:
+            return
+        with self._lock:
+            if not self._entries:
+                self._oldest = time.monotonic()
+            self._entries.extend(entries)
+            full = len(self._entries) >= self.batch_size
+            stale = time.monotonic() - self._oldest >= self.flush_interval
+        self._ensure_timer()
+        if full or stale:
+            self.flush()
+
+    def flush(self):
+        """
+        Записывает всё накопленное. Возвращает число записанных строк.
+        """
+        from .models import Card, ReviewLog
+
+        with self._flush_lock:
+            with self._lock:
+                entries, self._entries = self._entries, []
+                self._oldest = None
+            if not entries:
+                return 0
+            try:
+                # Карточку могли удалить, пока запись ждала в буфере —
+                # поступаем как SET_NULL, иначе упадёт внешний ключ
+                alive = set(
+                    Card.objects.filter(id__in={e.card_id for e in entries})
+                    .values_list('id', flat=True)
+                )
+                for entry in entries:
+                    if entry.card_id not in alive:
+                        entry.card_id = None
+                ReviewLog.objects.bulk_create(entries, batch_size=self.batch_size)
+            except Exception:
+                # Журнал не должен ронять ответ пользователю — вернём записи в буфер
+                self._requeue(entries)
+                return 0
+            self._failures = 0
+            return len(entries)
+
+    def _requeue(self, entries):
+        with self._lock:
+            self._failures += 1
+            attempt = self._failures
+            if attempt >= self.max_attempts:
+                # База не принимает записи слишком долго — дальше копить бессмысленно
+                self._failures = 0
+                dropped, reason = entries + self._entries, 'attempts'
+                self._entries = []
+                self._oldest = None
+            else:
+                self._entries[:0] = entries
+                overflow = max(0, len(self._entries) - self.max_entries)
+                # Лишнее отбрасываем с начала: свежие ответы ценнее старых
+                dropped, reason = self._entries[:overflow], 'overflow'
+                del self._entries[:overflow]
+                self._oldest = self._oldest or time.monotonic()
+            self.dropped += len(dropped)
+
+        logger.exception("Не удалось записать журнал повторений (попытка %d из %d)", attempt, self.max_attempts)
+        if dropped:
+            REVIEW_LOG_DROPPED.inc(reason, amount=len(dropped))
+            logger.error("Журнал повторений: отброшено записей — %d (%s)", len(dropped), reason)
+
+    def _ensure_timer(self):
+        if self._timer is not None and self._timer.is_alive():
+            return
+        self._timer = threading.Thread(target=self._run_timer, name='review-log-flush', daemon=True)
+        self._timer.start()
+
+    def _run_timer(self):
+        # Порог по времени срабатывает и без новых ответов
+        while True:
+            time.sleep(self.flush_interval)
+            with self._lock:
+                due = self._entries and time.monotonic() - self._oldest >= self.flush_interval
+            if due:
+                self.flush()
+                # У потока таймера своё соединение с БД — не держим его открытым
+                connection.close()
+
+
+review_log = ReviewLogBuffer(
+    batch_size=settings.REVIEW_LOG_BATCH_SIZE,
+    flush_interval=settings.REVIEW_LOG_FLUSH_SECONDS,
+    max_entries=settings.REVIEW_LOG_MAX_ENTRIES,
+    max_attempts=settings.REVIEW_LOG_MAX_ATTEMPTS,
+)
+atexit.register(review_log.flush)
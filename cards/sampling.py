@@ -0,0 +1,100 @@
+# cards/sampling.py
+
+import random
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+from django.utils import timezone
+
+from .cache import card_cache
+from .models import Card, Schedule
+
+# Из скольких самых просроченных карточек выбираем «загаданную»
+DUE_WINDOW = 20
+
+
+class CardSampler:
+    """
+    Случайные карточки пользователя без загрузки всей колоды.
+
+    Для каждого пользователя хранится компактный массив id его карточек
+    (8 байт на карточку); выбор k случайных — O(k), из базы читаются только
+    показанные строки. Массив перечитывается, когда сменилась версия данных
+    пользователя в card_cache (с общим кэшем это видно и изменения с сайта),
+    после invalidate() и по истечении ttl секунд.
+
+    Память ограничена max_bytes — суммой размеров массивов: сверх неё
+    вытесняются давно не использованные пользователи (LRU). Массив
+    последнего запрошенного пользователя остаётся, даже если он один больше
+    предела.
+    """
+
+    def __init__(self, ttl=300, max_bytes=64 * 1024 * 1024):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        # user_id -> (array id, версия, expires_at)
+        self._ids = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def size_bytes(self):
+        """Сколько байт занимают массивы id всех пользователей."""
+        return self._bytes
+
+    def _pop(self, user_id):
+        entry = self._ids.pop(user_id, None)
+        if entry is not None:
+            self._bytes -= entry[0].itemsize * len(entry[0])
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._pop(user_id)
+
+    def card_ids(self, user_id):
+        version = card_cache.version(user_id)
+        with self._lock:
+            entry = self._ids.get(user_id)
+            if entry is not None and entry[1] == version and entry[2] > time.monotonic():
+                self._ids.move_to_end(user_id)
+                return entry[0]
+
+        ids = array('q', Card.objects.filter(owner_id=user_id).order_by().values_list('id', flat=True))
+        with self._lock:
+            self._pop(user_id)
+            self._ids[user_id] = (ids, version, time.monotonic() + self.ttl)
+            self._bytes += ids.itemsize * len(ids)
+            while self._bytes > self.max_bytes and len(self._ids) > 1:
+                self._pop(next(iter(self._ids)))
+        return ids
+
+    def sample(self, user_id, k, prefer_due=False, now=None):
+        """
+        До k разных карточек (только id, word, translation) в случайном порядке.
+        С prefer_due первая карточка по возможности берётся из самых
+        просроченных — её удобно загадывать.
+        """
+        for _ in range(2):
+            ids = self.card_ids(user_id)
+            picked = [ids[i] for i in random.sample(range(len(ids)), min(k, len(ids)))]
+
+            if prefer_due and picked:
+                due = list(
+                    Schedule.objects.filter(owner_id=user_id, next_review__lte=now or timezone.now())
+                    .order_by('next_review').values_list('card_id', flat=True)[:DUE_WINDOW]
+                )
+                if due:
+                    first = random.choice(due)
+                    picked = [first] + [card_id for card_id in picked if card_id != first][:k - 1]
+
+            cards = Card.objects.filter(id__in=picked).only('id', 'word', 'translation').in_bulk()
+            if len(cards) == len(picked):
+                return [cards[card_id] for card_id in picked]
+            # Часть карточек уже удалена — массив устарел, перечитываем
+            self.invalidate(user_id)
+        return [cards[card_id] for card_id in picked if card_id in cards]
+
+
+sampler = CardSampler()
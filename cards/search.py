@@ -0,0 +1,141 @@
+# cards/search.py
+
+import re
+
+from django.db import connection, connections
+from django.db.models import Q
+
+from .models import Card
+
+# Сколько результатов отдаём по умолчанию и максимум
+SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+
+# Больше слов в запросе не берём — остальные только замедлят поиск
+MAX_TERMS = 8
+
+# Веса колонок для bm25: совпадение в слове важнее, чем в примере
+WEIGHTS = (10.0, 5.0, 1.0, 1.0)
+
+TERM_RE = re.compile(r'\w+')
+
+
+def fts_query(text):
+    """
+    Текст пользователя → выражение MATCH для FTS5: каждое слово в кавычках
+    (спецсимволы FTS не сработают) и с * — поиск по началу слова.
+    Слова объединяются через AND. Пустая строка, если слов нет.
+    """
+    # Индекс хранит «ё» как «е» (см. миграцию 0013)
+    text = (text or '').replace('ё', 'е').replace('Ё', 'Е')
+    terms = TERM_RE.findall(text)[:MAX_TERMS]
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def search_ids(owner_id, text, limit=SEARCH_LIMIT, level=None):
+    """
+    id карточек пользователя, подходящих под запрос, от лучших к худшим.
+    Индекс cards_card_fts (миграция 0013) обновляется триггерами на cards_card.
+    `level` — необязательный фильтр по уровню.
+    """
+    query = fts_query(text)
+    if not query:
+        return []
+
+    if connection.vendor != 'sqlite':
+        # FTS5 только в SQLite; на другой базе — простой поиск подстроки
+        lookup = Q(level=level) if level else Q()
+        for term in TERM_RE.findall(text)[:MAX_TERMS]:
+            lookup &= (Q(word__icontains=term) | Q(translation__icontains=term)
+                       | Q(example__icontains=term) | Q(note__icontains=term))
+        return list(
+            Card.objects.filter(lookup, owner_id=owner_id).order_by('word').values_list('id', flat=True)[:limit]
+        )
+
+    sql = (
+        "SELECT c.id FROM cards_card_fts f "
+        "JOIN cards_card c ON c.id = f.rowid "
+        "WHERE cards_card_fts MATCH %s AND c.owner_id = %s "
+    )
+    params = [query, owner_id]
+    if level:
+        sql += "AND c.level = %s "
+        params.append(level)
+    sql += "ORDER BY bm25(cards_card_fts, %s, %s, %s, %s) LIMIT %s"
+    params += [*WEIGHTS, limit]
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def search(owner_id, text, limit=SEARCH_LIMIT, level=None, fields=None):
+    """
+    Карточки пользователя по запросу в порядке релевантности.
+    `fields` — необязательный список полей для only().
+    """
+    ids = search_ids(owner_id, text, limit, level)
+    if not ids:
+        return []
+    queryset = Card.objects.all()
+    if fields:
+        queryset = queryset.only(*fields)
+    cards = queryset.in_bulk(ids)
+    return [cards[card_id] for card_id in ids if card_id in cards]
+
+
+# Триггеры, которые держат cards_card_fts в согласии с cards_card (см. миграцию 0013)
+def _folded(prefix):
+    return ', '.join(
+        f"replace(replace({prefix}{name}, 'ё', 'е'), 'Ё', 'Е')" for name in ('word', 'translation', 'example', 'note')
+    )
+
+
+TRIGGERS = {
+    'cards_card_fts_insert': f"""
+        CREATE TRIGGER IF NOT EXISTS cards_card_fts_insert AFTER INSERT ON cards_card BEGIN
+            INSERT INTO cards_card_fts (rowid, word, translation, example, note)
+            VALUES (new.id, {_folded('new.')});
+        END
+    """,
+    'cards_card_fts_delete': f"""
+        CREATE TRIGGER IF NOT EXISTS cards_card_fts_delete AFTER DELETE ON cards_card BEGIN
+            INSERT INTO cards_card_fts (cards_card_fts, rowid, word, translation, example, note)
+            VALUES ('delete', old.id, {_folded('old.')});
+        END
+    """,
+    'cards_card_fts_update': f"""
+        CREATE TRIGGER IF NOT EXISTS cards_card_fts_update
+        AFTER UPDATE OF word, translation, example, note ON cards_card BEGIN
+            INSERT INTO cards_card_fts (cards_card_fts, rowid, word, translation, example, note)
+            VALUES ('delete', old.id, {_folded('old.')});
+            INSERT INTO cards_card_fts (rowid, word, translation, example, note)
+            VALUES (new.id, {_folded('new.')});
+        END
+    """,
+}
+
+
+def restore_index(sender, using='default', **kwargs):
+    """
+    Обработчик post_migrate. Многие изменения схемы SQLite делает через
+    пересоздание таблицы, и триггеры cards_card пропадают вместе со старой
+    таблицей. Если так случилось — создаём их заново и перезаполняем индекс.
+    """
+    db = connections[using]
+    if db.vendor != 'sqlite':
+        return
+    with db.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger') AND name LIKE %s", ['cards_card_fts%']
+        )
+        names = {row[0] for row in cursor.fetchall()}
+        if 'cards_card_fts' not in names or TRIGGERS.keys() <= names:
+            return
+        for sql in TRIGGERS.values():
+            cursor.execute(sql)
+        cursor.execute("INSERT INTO cards_card_fts (cards_card_fts) VALUES ('delete-all')")
+        cursor.execute(
+            f"INSERT INTO cards_card_fts (rowid, word, translation, example, note) "
+            f"SELECT id, {_folded('')} FROM cards_card"
+        )
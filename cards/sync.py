@@ -0,0 +1,142 @@
+# cards/sync.py
+
+import base64
+import json
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Card, CardTombstone, Schedule
+
+# Размер страницы синхронизации по умолчанию и максимальный
+SYNC_PAGE_SIZE = 500
+MAX_SYNC_PAGE_SIZE = 2000
+
+# Изменения моложе этого не отдаём: updated_at ставится до COMMIT, и
+# транзакция, начатая раньше, может закоммититься позже соседней —
+# без отступа клиент перескочил бы её курсором
+SYNC_LAG = timedelta(seconds=5)
+
+CARD_FIELDS = ('id', 'word', 'translation', 'example', 'note', 'level', 'created_at', 'updated_at')
+SCHEDULE_FIELDS = ('card_id', 'interval', 'ease_factor', 'repetitions', 'next_review', 'updated_at')
+
+# Поток изменений: (модель, поле времени, поля ответа)
+STREAMS = {
+    'cards': (Card, 'updated_at', CARD_FIELDS),
+    'schedules': (Schedule, 'updated_at', SCHEDULE_FIELDS),
+    'deleted': (CardTombstone, 'deleted_at', ('card_id', 'deleted_at')),
+}
+
+
+class CursorExpired(ValueError):
+    """Курсор старше срока хранения надгробий: часть удалений уже забыта."""
+
+
+def oldest_cursor(now=None):
+    """
+    Самая ранняя позиция курсора, для которой надгробия ещё хранятся.
+    Всё, что удалено раньше, prune_tombstones() может стереть.
+    """
+    return (now or timezone.now()) - timedelta(days=settings.SYNC_TOMBSTONE_DAYS)
+
+
+def prune_tombstones(now=None):
+    """
+    Удаляет надгробия старше срока хранения (SYNC_TOMBSTONE_DAYS).
+    Возвращает число удалённых строк.
+    """
+    deleted, _ = CardTombstone.objects.filter(deleted_at__lt=oldest_cursor(now)).delete()
+    return deleted
+
+
+def encode_cursor(positions):
+    """
+    Курсор синхронизации — позиции (время, id) во всех трёх потоках, в base64.
+    """
+    raw = json.dumps({
+        name: [moment.isoformat(), row_id] if moment else None
+        for name, (moment, row_id) in positions.items()
+    }, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Разбирает курсор в {поток: (время, id)}. Для битого курсора — ValueError.
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded).decode())
+        positions = {}
+        for name in STREAMS:
+            value = data.get(name)
+            if value is None:
+                positions[name] = (None, 0)
+            else:
+                moment, row_id = value
+                positions[name] = (datetime.fromisoformat(moment), int(row_id))
+        return positions
+    except (ValueError, TypeError, AttributeError, UnicodeDecodeError):
+        raise ValueError("некорректный курсор")
+
+
+def _stream_page(name, user, position, upper, size):
+    """
+    Одна страница потока после позиции и не позже upper — один запрос
+    по индексу (owner, время, id). Возвращает (строки, новая позиция, есть ли ещё).
+    """
+    model, time_field, fields = STREAMS[name]
+    queryset = model.objects.filter(owner=user, **{f'{time_field}__lte': upper})
+    moment, row_id = position
+    if moment is not None:
+        queryset = queryset.filter(
+            Q(**{f'{time_field}__gt': moment}) | Q(**{time_field: moment, 'id__gt': row_id})
+        )
+    rows = list(queryset.order_by(time_field, 'id').values('id', *fields)[:size + 1])
+    has_more = len(rows) > size
+    rows = rows[:size]
+    if rows:
+        position = (rows[-1][time_field], rows[-1]['id'])
+    if not has_more and (position[0] is None or position[0] < upper):
+        # Поток прочитан до конца — курсор двигается к upper, даже если
+        # изменений не было: иначе у давно не удалявшего ничего клиента
+        # курсор «состарится» и потребует полной синхронизации
+        position = (upper, 0)
+    for row in rows:
+        if 'id' not in fields:
+            del row['id']
+    return rows, position, has_more
+
+
+def changes(user, cursor=None, size=SYNC_PAGE_SIZE, now=None):
+    """
+    Изменения карточек пользователя после курсора: изменённые карточки,
+    изменённые расписания и id удалённых карточек. Без курсора — всё
+    текущее состояние (удаления до первой синхронизации не нужны).
+
+    Клиент повторяет запрос с next_cursor, пока has_more истинно, и
+    сохраняет последний курсор до следующей синхронизации. Курсор старше
+    SYNC_TOMBSTONE_DAYS — CursorExpired: клиент начинает заново без курсора.
+    """
+    now = now or timezone.now()
+    upper = now - SYNC_LAG
+    if cursor:
+        positions = decode_cursor(cursor)
+        if positions['deleted'][0] is None or positions['deleted'][0] < oldest_cursor(now):
+            raise CursorExpired("курсор устарел — нужна полная синхронизация")
+    else:
+        positions = {name: (None, 0) for name in STREAMS}
+        positions['deleted'] = (upper, 0)
+
+    result = {}
+    has_more = False
+    for name in STREAMS:
+        rows, positions[name], more = _stream_page(name, user, positions[name], upper, size)
+        result[name] = rows
+        has_more = has_more or more
+
+    result['has_more'] = has_more
+    result['next_cursor'] = encode_cursor(positions)
+    return result
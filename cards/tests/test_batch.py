@@ -0,0 +1,99 @@
+import json
+
+from django.test import TestCase
+from django.urls import reverse
+
+from cards.models import Card, CardTombstone, Schedule, UserStats
+
+from .test_models import make_card, make_user
+
+
+class CardBatchTests(TestCase):
+    url = reverse('cards:card_batch')
+
+    def setUp(self):
+        self.user = make_user('learner')
+        self.cat = make_card(self.user, 'cat', repetitions=4)
+        self.dog = make_card(self.user, 'dog')
+        self.client.force_login(self.user)
+
+    def post(self, payload):
+        body = payload if isinstance(payload, (bytes, str)) else json.dumps(payload)
+        return self.client.post(self.url, body, content_type='application/json')
+
+    def stats(self):
+        stats = UserStats.objects.get(user=self.user)
+        return stats.total_cards, stats.learned_cards
+
+    def test_validation(self):
+        cases = [
+            b'not json',
+            [],
+            {'create': {'word': 'owl'}},
+            {'create': [{'word': 'owl'}]},
+            {'update': [{'translation': 'кот'}]},
+            {'update': [{'id': self.cat.id, 'word': ''}]},
+            {'update': [{'id': self.cat.id}]},
+            {'delete': ['cat']},
+        ]
+        for payload in cases:
+            with self.subTest(payload=payload):
+                self.assertEqual(self.post(payload).status_code, 400)
+
+        response = self.post({'create': [{'word': 'owl', 'translation': 'сова'}, {'word': 'fox'}]})
+        self.assertEqual(response.json()['errors'], [{'op': 'create', 'index': 1, 'error': 'нужны слово и перевод'}])
+        # Одна плохая операция — не пишется ничего
+        self.assertFalse(Card.objects.filter(word='owl').exists())
+
+    def test_duplicate_create_rolls_back_everything(self):
+        eel = make_card(self.user, 'eel')
+        response = self.post({
+            'create': [{'word': 'owl', 'translation': 'сова'}, {'word': ' CAT ', 'translation': 'кошка'}],
+            'update': [{'id': self.dog.id, 'translation': 'пёс'}],
+            'delete': [eel.id],
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('уже есть', response.json()['errors'][0]['error'])
+        self.assertFalse(Card.objects.filter(word='owl').exists())
+        self.assertTrue(Card.objects.filter(id=eel.id).exists())
+        self.assertEqual(Card.objects.get(id=self.dog.id).translation, 'dog (перевод)')
+        self.assertFalse(CardTombstone.objects.exists())
+        self.assertEqual(self.stats(), (3, 0))
+
+    def test_duplicate_within_batch(self):
+        response = self.post({'create': [{'word': 'owl', 'translation': 'сова'}, {'word': 'OWL', 'translation': 'сыч'}]})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Card.objects.filter(word_key='owl').exists())
+
+    def test_delete_leaves_tombstones(self):
+        response = self.post({'delete': [self.cat.id, self.dog.id, 999_999]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['deleted'], 2)
+        self.assertEqual(response.json()['missing'], [999_999])
+        self.assertEqual(
+            sorted(CardTombstone.objects.filter(owner=self.user).values_list('card_id', flat=True)),
+            [self.cat.id, self.dog.id]
+        )
+        self.assertFalse(Schedule.objects.filter(owner=self.user).exists())
+
+    def test_counter_deltas(self):
+        # Счётчики, которые ведёт save(): learned выставим вручную, как после повторений
+        UserStats.objects.filter(user=self.user).update(learned_cards=1)
+        foreign = make_card(make_user('other'), 'fox')
+        response = self.post({
+            'create': [
+                {'word': 'owl', 'translation': 'сова'},
+                {'word': 'bee', 'translation': 'пчела', 'repetitions': 5},
+            ],
+            'update': [{'id': self.dog.id, 'level': 'advanced'}, {'id': foreign.id, 'translation': 'лиса'}],
+            'delete': [self.cat.id],
+        })
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual((len(body['created']), body['updated'], body['deleted']), (2, 1, 1))
+        self.assertEqual(body['missing'], [foreign.id])
+        # +2 новых (одна выученная), −1 удалённая выученная
+        self.assertEqual(self.stats(), (3, 1))
+        self.assertEqual(UserStats.objects.get(user=self.user).total_cards,
+                         Card.objects.filter(owner=self.user).count())
+        self.assertEqual(Card.objects.get(id=foreign.id).translation, 'fox (перевод)')
@@ -0,0 +1,67 @@
+import os
+from io import StringIO
+
+from django.test import TransactionTestCase
+
+from cards.management.commands import benchmark
+
+# SQL-запросов на одну итерацию сценария (медиана). Рост — почти всегда
+# N+1 или потерянный кэш; если запросов стало больше намеренно — поправьте здесь
+QUERY_BUDGET = {
+    'card_list': 4,
+    'card_list_cached': 2,
+    'review': 3,
+    'review_answer': 6,
+    'import_cards': 7,
+    'export_cards': 3,
+    'bot_today': 2,
+    'bot_cards': 1,
+    'bot_cards_next': 1,
+    'bot_progress': 1,
+    'bot_test': 3,
+    'bot_review': 1,
+    'bot_review_answer': 4,
+}
+
+
+class BenchmarkTests(TransactionTestCase):
+    """
+    Все сценарии manage.py benchmark на маленьком наборе данных: сценарии
+    не ломаются, а число SQL-запросов не растёт. Время не проверяем — оно
+    зависит от машины; для него есть сам отчёт и --compare.
+    """
+
+    def run_benchmark(self, *args):
+        os.environ.setdefault('TELEGRAM_BOT_TOKEN', '123456:BENCHMARK')
+        command = benchmark.Command(stdout=StringIO(), stderr=StringIO())
+        parser = command.create_parser('manage.py', 'benchmark')
+        options = vars(parser.parse_args(['--users', '3', '--cards', '60', '--iterations', '4',
+                                          '--import-size', '20', *args]))
+        results, _ = command.run(options)
+        return results
+
+    def test_scenarios_within_query_budget(self):
+        results = self.run_benchmark()
+        self.assertEqual(list(results), benchmark.SCENARIOS)
+        for name, budget in QUERY_BUDGET.items():
+            with self.subTest(name):
+                result = results[name]
+                self.assertEqual(result['iterations'], 4)
+                self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+                self.assertLessEqual(result['queries_median'], budget)
+
+        concurrent = results['bot_concurrent']
+        self.assertEqual(concurrent['chats'], 3)
+        self.assertGreater(concurrent['speedup'], 0)
+
+    def test_concurrent_chats_overlap_api_latency(self):
+        results = self.run_benchmark('--only', 'bot_concurrent', '--api-latency-ms', '30')
+        concurrent = results['bot_concurrent']
+        # Три чата ждут «сеть» одновременно, а не по очереди
+        self.assertGreater(concurrent['sequential_batch_p50_ms'], concurrent['batch_p50_ms'])
+
+    def test_percentile(self):
+        values = [5, 1, 4, 2, 3]
+        self.assertEqual(benchmark.percentile(values, 50), 3)
+        self.assertEqual(benchmark.percentile(values, 99), 5)
+        self.assertEqual(benchmark.percentile(values, 0), 1)
@@ -0,0 +1,101 @@
+import asyncio
+import os
+from datetime import datetime
+
+from aiogram import types
+from aiogram.client.session.base import BaseSession
+from asgiref.sync import async_to_sync
+from django.test import TransactionTestCase
+
+from cards.models import Card, CardTombstone, Schedule, UserStats
+
+from .test_models import make_card, make_user
+
+os.environ.setdefault('TELEGRAM_BOT_TOKEN', '123456:TEST')
+import bot  # noqa: E402
+
+TELEGRAM_ID = 555
+
+
+class RecordingSession(BaseSession):
+    """Вместо Telegram API: запоминает тексты ответов бота."""
+
+    def __init__(self):
+        super().__init__()
+        self.sent = []
+
+    async def make_request(self, bot, method, timeout=None):
+        self.sent.append(getattr(method, 'text', None))
+        chat = types.Chat(id=getattr(method, 'chat_id', 1) or 1, type='private')
+        return types.Message(message_id=1, date=datetime.now(), chat=chat, text=getattr(method, 'text', None))
+
+    async def stream_content(self, *args, **kwargs):
+        yield b''
+
+    async def close(self):
+        pass
+
+
+class BotWordLookupTests(TransactionTestCase):
+    """
+    Слово из чата ищется по word_key, как и при добавлении: «  ICE cream »
+    находит карточку «Ice cream». Апдейты идут через настоящий Dispatcher.
+    TransactionTestCase: ORM бота работает в другом потоке.
+    """
+
+    def setUp(self):
+        self.user = make_user('learner')
+        UserStats.objects.filter(user=self.user).update(telegram_id=str(TELEGRAM_ID))
+        self.card = make_card(self.user, 'Ice cream')
+        make_card(self.user, 'cake')
+
+        self.session = RecordingSession()
+        self.original_session = bot.bot.session
+        bot.bot.session = self.session
+        bot.identities.clear()
+        self.update_id = 0
+
+    def tearDown(self):
+        bot.bot.session = self.original_session
+        bot.identities.clear()
+
+    def send(self, text):
+        self.update_id += 1
+        entities = None
+        if text.startswith('/'):
+            entities = [types.MessageEntity(type='bot_command', offset=0, length=len(text.split()[0]))]
+        update = types.Update(update_id=self.update_id, message=types.Message(
+            message_id=self.update_id, date=datetime.now(), text=text, entities=entities,
+            chat=types.Chat(id=TELEGRAM_ID, type='private'),
+            from_user=types.User(id=TELEGRAM_ID, is_bot=False, first_name='Test'),
+        ))
+        async_to_sync(bot.dp.feed_update)(bot.bot, update)
+        return self.session.sent[-1]
+
+    def test_find_card_by_normalized_word(self):
+        card, similar = asyncio.run(bot.find_card(self.user.id, '  ICE   cream '))
+        self.assertEqual((card.id, similar), (self.card.id, []))
+
+        card, similar = asyncio.run(bot.find_card(self.user.id, 'ice'))
+        self.assertIsNone(card)
+        self.assertEqual([found.id for found in similar], [self.card.id])
+
+    def test_delete_by_normalized_word(self):
+        self.send('/delete')
+        reply = self.send('  ICE   cream ')
+        self.assertIn('Удалено', reply)
+        self.assertFalse(Card.objects.filter(id=self.card.id).exists())
+        self.assertFalse(Schedule.objects.filter(card_id=self.card.id).exists())
+        self.assertTrue(CardTombstone.objects.filter(card_id=self.card.id).exists())
+        self.assertEqual(UserStats.objects.get(user=self.user).total_cards, 1)
+
+    def test_delete_needs_whole_word(self):
+        self.send('/delete')
+        reply = self.send('ice')
+        self.assertIn('Похожие', reply)
+        self.assertTrue(Card.objects.filter(id=self.card.id).exists())
+
+    def test_edit_finds_normalized_word(self):
+        self.send('/edit')
+        reply = self.send('ICE CREAM')
+        self.assertIn('Ice cream', reply)
@@ -0,0 +1,80 @@
+import os
+from datetime import timedelta
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.db import connection
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from bot_activity import ActivityTracker
+from cards.models import UserStats
+
+from .test_models import make_user
+
+os.environ.setdefault('TELEGRAM_BOT_TOKEN', '123456:TEST')
+import bot  # noqa: E402
+
+
+class ActivityTrackerTests(TransactionTestCase):
+    """TransactionTestCase: запись идёт через sync_to_async в другом потоке."""
+
+    def setUp(self):
+        self.now = timezone.now()
+        for telegram_id in ('1', '2', '3'):
+            UserStats.objects.filter(user=make_user(f'user{telegram_id}')).update(telegram_id=telegram_id)
+        self.tracker = ActivityTracker()
+
+    def flush(self):
+        return async_to_sync(self.tracker.flush)()
+
+    def stats(self):
+        return {
+            stats.telegram_id: (stats.last_seen, stats.message_count)
+            for stats in UserStats.objects.filter(telegram_id__isnull=False)
+        }
+
+    def test_flush_in_one_bulk_update(self):
+        self.tracker.touch(1, self.now)
+        self.tracker.touch(1, self.now + timedelta(seconds=5))
+        # Более раннее событие не откатывает last_seen; нажатие кнопки — не сообщение
+        self.tracker.touch(1, self.now + timedelta(seconds=1), is_message=False)
+        self.tracker.touch(2, self.now)
+        self.tracker.touch(999, self.now)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.flush(), 2)
+        statements = [query['sql'].split()[0] for query in queries]
+        self.assertEqual(statements.count('SELECT'), 1)
+        self.assertEqual(statements.count('UPDATE'), 1)
+
+        stats = self.stats()
+        self.assertEqual(stats['1'], (self.now + timedelta(seconds=5), 2))
+        self.assertEqual(stats['2'], (self.now, 1))
+        self.assertEqual(stats['3'], (None, 0))
+
+        # Буфер пуст — повторный flush не ходит в базу; счётчик прибавляется, а не перезаписывается
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.flush(), 0)
+        self.assertEqual(len(queries), 0)
+        self.tracker.touch(2, self.now)
+        self.flush()
+        self.assertEqual(self.stats()['2'], (self.now, 2))
+
+    def test_failed_write_keeps_marks(self):
+        self.tracker.touch(1, self.now)
+        with mock.patch.object(ActivityTracker, '_write', side_effect=RuntimeError('db down')):
+            self.assertEqual(self.flush(), 0)
+        self.tracker.touch(1, self.now + timedelta(seconds=1))
+        self.assertEqual(self.flush(), 1)
+        self.assertEqual(self.stats()['1'], (self.now + timedelta(seconds=1), 2))
+
+    def test_drained_on_shutdown(self):
+        self.tracker.touch(3, self.now)
+        with mock.patch.object(bot, 'activity', self.tracker), \
+                mock.patch.object(bot, 'run_updates', mock.AsyncMock()), \
+                mock.patch.object(bot, 'AsyncIOScheduler'), \
+                mock.patch.object(bot, 'METRICS_PORT', None):
+            async_to_sync(bot.main)()
+        self.assertEqual(self.stats()['3'], (self.now, 1))
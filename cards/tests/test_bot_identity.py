@@ -0,0 +1,88 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TransactionTestCase
+
+from bot_identity import Identity, IdentityCache
+from cards.models import UserStats
+
+from .test_models import make_user
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000.0
+
+    def __call__(self):
+        return self.now
+
+
+class IdentityCacheTests(TransactionTestCase):
+    """
+    Кэш Telegram ID → пользователь. TransactionTestCase: асинхронный ORM
+    ходит в базу из другого потока.
+    """
+
+    def setUp(self):
+        self.user = make_user('learner')
+        self.stats = UserStats.objects.get(user=self.user)
+        UserStats.objects.filter(id=self.stats.id).update(telegram_id='42')
+        self.clock = FakeClock()
+        patcher = mock.patch('bot_identity.time.monotonic', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.identities = IdentityCache(ttl=60, max_entries=2)
+        self.lookups = mock.patch.object(
+            UserStats.objects, 'aresolve_telegram', wraps=UserStats.objects.aresolve_telegram
+        ).start()
+        self.addCleanup(mock.patch.stopall)
+
+    async def test_hit_without_query(self):
+        expected = Identity(self.user.id, self.stats.id)
+        self.assertEqual(await self.identities.resolve(42), expected)
+        self.assertEqual(await self.identities.resolve(42), expected)
+        self.assertEqual(self.lookups.call_count, 1)
+
+        # После TTL — снова в базу
+        self.clock.now += 61
+        self.assertEqual(await self.identities.resolve(42), expected)
+        self.assertEqual(self.lookups.call_count, 2)
+
+    async def test_miss_is_not_cached(self):
+        with self.assertRaises(UserStats.DoesNotExist):
+            await self.identities.resolve(7)
+        # Привязали чат (/start) — следующий запрос находит пользователя
+        await UserStats.objects.filter(id=self.stats.id).aupdate(telegram_id='7')
+        self.assertEqual(await self.identities.resolve(7), Identity(self.user.id, self.stats.id))
+
+    async def test_invalidate(self):
+        await self.identities.resolve(42)
+        other = await UserStats.objects.acreate(user=await self._user('other'))
+        await UserStats.objects.filter(id=self.stats.id).aupdate(telegram_id=None)
+        await UserStats.objects.filter(id=other.id).aupdate(telegram_id='42')
+
+        # До инвалидации — старая привязка из кэша
+        self.assertEqual((await self.identities.resolve(42)).stats_id, self.stats.id)
+        self.identities.invalidate(42)
+        self.assertEqual((await self.identities.resolve(42)).stats_id, other.id)
+
+    async def test_lru_bound(self):
+        for telegram_id in ('1', '2'):
+            await self._link(telegram_id)
+        await self.identities.resolve(42)
+        await self.identities.resolve(1)
+        await self.identities.resolve(42)
+        await self.identities.resolve(2)
+        # Вытеснен давно не использованный 1, а не 42
+        calls = self.lookups.call_count
+        await self.identities.resolve(42)
+        self.assertEqual(self.lookups.call_count, calls)
+        await self.identities.resolve(1)
+        self.assertEqual(self.lookups.call_count, calls + 1)
+
+    async def _user(self, username):
+        return await User.objects.acreate(username=username)
+
+    async def _link(self, telegram_id):
+        user = await self._user(f'user{telegram_id}')
+        return await UserStats.objects.acreate(user=user, telegram_id=telegram_id)
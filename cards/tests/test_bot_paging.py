@@ -0,0 +1,141 @@
+import os
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from aiogram import types
+from asgiref.sync import async_to_sync
+from django.test import SimpleTestCase, TransactionTestCase
+from django.utils import timezone
+
+from bot_paging import decode_position, encode_position, page_keyboard, parse_page_data
+from cards.cache import card_cache
+from cards.models import Card, UserStats
+
+from .test_bot import RecordingSession
+from .test_models import make_card, make_user
+
+os.environ.setdefault('TELEGRAM_BOT_TOKEN', '123456:TEST')
+import bot  # noqa: E402
+
+TELEGRAM_ID = 555
+
+
+class PositionTests(SimpleTestCase):
+    def test_round_trip(self):
+        moment = datetime(2026, 10, 18, 12, 30, 5, 123456, tzinfo=dt_timezone.utc)
+        self.assertEqual(decode_position(encode_position(moment, 987654321)), (moment, 987654321))
+
+    def test_fits_callback_data(self):
+        far = datetime(9999, 12, 31, tzinfo=dt_timezone.utc)
+        keyboard = page_keyboard('cards', (far, 2 ** 63 - 1), (far, 2 ** 63 - 1), True, True)
+        for button in keyboard.inline_keyboard[0]:
+            self.assertLessEqual(len(button.callback_data.encode()), 64)
+
+    def test_tampered_data_is_first_page(self):
+        for data in ('', 'n', 'n:', 'n:abc', 'n:1.2.3', 'p:!!.1', 'n:zz.', 'n:.5'):
+            with self.subTest(data=data):
+                self.assertEqual(parse_page_data(data), (None, False))
+
+    def test_keyboard_buttons(self):
+        position = (timezone.now(), 1)
+        self.assertIsNone(page_keyboard('cards', position, position, False, False))
+        keyboard = page_keyboard('cards', position, position, False, True)
+        self.assertEqual([button.callback_data[:8] for button in keyboard.inline_keyboard[0]], ['cards:n:'])
+
+
+class PagingSession(RecordingSession):
+    """Кроме текстов запоминает и сами вызовы API — нужны кнопки."""
+
+    def __init__(self):
+        super().__init__()
+        self.methods = []
+
+    async def make_request(self, bot, method, timeout=None):
+        self.methods.append(method)
+        return await super().make_request(bot, method, timeout)
+
+
+class CardsPagingTests(TransactionTestCase):
+    """/cards и кнопки ◀ ▶ через настоящий Dispatcher."""
+
+    def setUp(self):
+        card_cache.cache.clear()
+        self.user = make_user('learner')
+        UserStats.objects.filter(user=self.user).update(telegram_id=str(TELEGRAM_ID))
+        start = timezone.now() - timedelta(days=1)
+        for i in range(23):
+            card = make_card(self.user, f'word{i:02}')
+            Card.objects.filter(id=card.id).update(created_at=start + timedelta(minutes=i))
+
+        self.session = PagingSession()
+        self.original_session = bot.bot.session
+        bot.bot.session = self.session
+        bot.identities.clear()
+        self.update_id = 0
+
+    def tearDown(self):
+        bot.bot.session = self.original_session
+        bot.identities.clear()
+        card_cache.cache.clear()
+
+    def feed(self, **event):
+        self.update_id += 1
+        async_to_sync(bot.dp.feed_update)(bot.bot, types.Update(update_id=self.update_id, **event))
+        method = next(method for method in reversed(self.session.methods) if getattr(method, 'text', None))
+        words = [line.split('<b>')[1].split('</b>')[0] for line in method.text.splitlines() if '<b>' in line]
+        buttons = {}
+        if method.reply_markup:
+            buttons = {button.text: button.callback_data for button in method.reply_markup.inline_keyboard[0]}
+        return words, buttons
+
+    def command(self, text):
+        return self.feed(message=types.Message(
+            message_id=self.update_id + 1, date=datetime.now(), text=text,
+            entities=[types.MessageEntity(type='bot_command', offset=0, length=len(text))],
+            chat=types.Chat(id=TELEGRAM_ID, type='private'),
+            from_user=types.User(id=TELEGRAM_ID, is_bot=False, first_name='Test'),
+        ))
+
+    def press(self, data):
+        return self.feed(callback_query=types.CallbackQuery(
+            id=str(self.update_id + 1), chat_instance='1', data=data,
+            from_user=types.User(id=TELEGRAM_ID, is_bot=False, first_name='Test'),
+            message=types.Message(
+                message_id=1, date=datetime.now(), text='…', chat=types.Chat(id=TELEGRAM_ID, type='private'),
+            ),
+        ))
+
+    def test_next_and_last_page(self):
+        words, buttons = self.command('/cards')
+        self.assertEqual(words, [f'word{i:02}' for i in range(10)])
+        self.assertEqual(list(buttons), ['Дальше ▶'])
+
+        words, buttons = self.press(buttons['Дальше ▶'])
+        self.assertEqual(words, [f'word{i:02}' for i in range(10, 20)])
+        self.assertEqual(list(buttons), ['◀ Назад', 'Дальше ▶'])
+        back = buttons['◀ Назад']
+
+        # Последняя страница — без «Дальше»
+        words, buttons = self.press(buttons['Дальше ▶'])
+        self.assertEqual(words, ['word20', 'word21', 'word22'])
+        self.assertEqual(list(buttons), ['◀ Назад'])
+
+        words, buttons = self.press(back)
+        self.assertEqual(words, [f'word{i:02}' for i in range(10)])
+        self.assertEqual(list(buttons), ['Дальше ▶'])
+
+    def test_tampered_cursor_shows_first_page(self):
+        for data in ('cards:n:garbage', 'cards:n:zz.!!', 'cards:'):
+            with self.subTest(data=data):
+                words, buttons = self.press(data)
+                self.assertEqual(words, [f'word{i:02}' for i in range(10)])
+                self.assertEqual(list(buttons), ['Дальше ▶'])
+
+    def test_expired_cursor_shows_first_page(self):
+        _, buttons = self.command('/cards')
+        _, buttons = self.press(buttons['Дальше ▶'])
+        stale = buttons['Дальше ▶']
+        # Пока сообщение висело, хвост списка удалили
+        Card.objects.filter(owner=self.user, word__gte='word20').delete()
+        words, buttons = self.press(stale)
+        self.assertEqual(words, [f'word{i:02}' for i in range(10)])
+        self.assertEqual(list(buttons), ['Дальше ▶'])
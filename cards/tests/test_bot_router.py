@@ -0,0 +1,104 @@
+from datetime import datetime
+
+from aiogram import Bot, Dispatcher, types
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.fsm.storage.base import StorageKey
+from django.test import SimpleTestCase
+
+from bot_router import CommandTable
+from bot_storage import TTLMemoryStorage
+
+from .test_bot import RecordingSession
+
+CHAT_ID = 42
+
+
+class Form(StatesGroup):
+    name = State()
+    choice = State()
+
+
+class CommandTableTests(SimpleTestCase):
+    """Диспетчеризация через настоящий Dispatcher; ответы бота не нужны."""
+
+    def setUp(self):
+        self.calls = []
+        self.table = table = CommandTable()
+        self.dispatcher = Dispatcher(storage=TTLMemoryStorage())
+        self.dispatcher.include_router(table.router)
+        self.session = RecordingSession()
+        self.bot = Bot('123456:TEST', session=self.session)
+        self.update_id = 0
+
+        @table.command('start')
+        async def start(message):
+            self.calls.append(('start', message.text))
+
+        @table.command('form')
+        async def form(message, state):
+            await state.set_state(Form.name)
+            self.calls.append(('form', message.text))
+
+        @table.state(Form.name)
+        async def form_name(message, state):
+            await state.set_state(Form.choice)
+            self.calls.append(('name', message.text))
+
+        @table.state(Form.choice, when=lambda text: text in ('да', 'нет'))
+        async def form_choice(message):
+            self.calls.append(('choice', message.text))
+
+        @table.callback('page')
+        async def page(callback, data):
+            self.calls.append(('page', data))
+
+    async def send(self, text):
+        self.update_id += 1
+        await self.dispatcher.feed_update(self.bot, types.Update(update_id=self.update_id, message=types.Message(
+            message_id=self.update_id, date=datetime.now(), text=text,
+            chat=types.Chat(id=CHAT_ID, type='private'),
+            from_user=types.User(id=CHAT_ID, is_bot=False, first_name='Test'),
+        )))
+
+    async def press(self, data):
+        self.update_id += 1
+        await self.dispatcher.feed_update(self.bot, types.Update(update_id=self.update_id, callback_query=types.CallbackQuery(
+            id=str(self.update_id), chat_instance='1', data=data,
+            from_user=types.User(id=CHAT_ID, is_bot=False, first_name='Test'),
+        )))
+
+    async def state(self):
+        key = StorageKey(bot_id=self.bot.id, chat_id=CHAT_ID, user_id=CHAT_ID)
+        return await self.dispatcher.storage.get_state(key)
+
+    async def test_commands(self):
+        await self.send('/start')
+        await self.send('/start@linguabot deep-link')
+        await self.send('/unknown')
+        await self.send('просто текст')
+        self.assertEqual(self.calls, [('start', '/start'), ('start', '/start@linguabot deep-link')])
+
+    async def test_states_and_conditions(self):
+        await self.send('/form')
+        await self.send('Аня')
+        self.assertEqual(await self.state(), Form.choice.state)
+        # Условие не выполнено — без ответа, состояние прежнее
+        await self.send('может быть')
+        await self.send('да')
+        self.assertEqual(self.calls, [('form', '/form'), ('name', 'Аня'), ('choice', 'да')])
+
+    async def test_command_inside_dialog(self):
+        await self.send('/form')
+        await self.send('/start')
+        self.assertEqual(self.calls, [('form', '/form'), ('start', '/start')])
+        # Диалог не сброшен: следующий текст — ответ на него
+        await self.send('Аня')
+        self.assertEqual(self.calls[-1], ('name', 'Аня'))
+
+    async def test_callbacks(self):
+        await self.press('page:abc:1')
+        self.assertEqual(self.calls, [('page', 'abc:1')])
+        # Кнопка старой версии бота — только ответ на callback
+        await self.press('legacy:1')
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(len(self.session.sent), 1)
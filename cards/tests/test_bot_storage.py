@@ -0,0 +1,159 @@
+import os
+import tempfile
+from unittest import mock, skipUnless
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import StorageKey
+from django.test import SimpleTestCase
+
+import bot_storage
+
+try:
+    import redis  # noqa: F401
+except ImportError:
+    redis = None
+
+KEY = StorageKey(bot_id=1, chat_id=42, user_id=42)
+OTHER = StorageKey(bot_id=1, chat_id=43, user_id=43)
+TTL = 60
+
+
+class FakeClock:
+    """Подменяет time.time / time.monotonic: время двигается только вручную."""
+
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+class StorageContract:
+    """Общие проверки для всех хранилищ: состояние, данные и истечение TTL."""
+
+    def setUp(self):
+        self.clock = FakeClock()
+        for name in ('time', 'monotonic'):
+            patcher = mock.patch(f'bot_storage.time.{name}', self.clock)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.storage = self.make_storage()
+
+    async def test_state(self):
+        self.assertIsNone(await self.storage.get_state(KEY))
+        await self.storage.set_state(KEY, State('waiting', 'Add'))
+        self.assertEqual(await self.storage.get_state(KEY), 'Add:waiting')
+        self.assertIsNone(await self.storage.get_state(OTHER))
+        await self.storage.set_state(KEY, None)
+        self.assertIsNone(await self.storage.get_state(KEY))
+        await self.storage.close()
+
+    async def test_data(self):
+        self.assertEqual(await self.storage.get_data(KEY), {})
+        await self.storage.set_data(KEY, {'word': 'ёж', 'step': 2})
+        self.assertEqual(await self.storage.get_data(KEY), {'word': 'ёж', 'step': 2})
+        await self.storage.set_state(KEY, 'Add:translation')
+        # Состояние и данные хранятся независимо
+        self.assertEqual(await self.storage.get_data(KEY), {'word': 'ёж', 'step': 2})
+        self.assertEqual(await self.storage.get_state(KEY), 'Add:translation')
+        await self.storage.set_data(KEY, {})
+        self.assertEqual(await self.storage.get_data(KEY), {})
+        await self.storage.close()
+
+    async def test_expiry(self):
+        await self.storage.set_state(KEY, 'Add:word')
+        await self.storage.set_data(KEY, {'word': 'cat'})
+        self.clock.now += TTL - 1
+        self.assertEqual(await self.storage.get_state(KEY), 'Add:word')
+        self.clock.now += TTL + 1
+        self.assertIsNone(await self.storage.get_state(KEY))
+        self.assertEqual(await self.storage.get_data(KEY), {})
+        await self.storage.close()
+
+
+class TTLMemoryStorageTests(StorageContract, SimpleTestCase):
+    def make_storage(self):
+        return bot_storage.build_storage('memory', ttl=TTL)
+
+    async def test_lru_limit(self):
+        storage = bot_storage.TTLMemoryStorage(ttl=TTL, max_entries=1)
+        await storage.set_state(KEY, 'Add:word')
+        await storage.set_state(OTHER, 'Add:word')
+        self.assertIsNone(await storage.get_state(KEY))
+        self.assertEqual(await storage.get_state(OTHER), 'Add:word')
+
+
+class SQLiteStorageTests(StorageContract, SimpleTestCase):
+    def make_storage(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'fsm.sqlite3')
+        return bot_storage.build_storage(f'sqlite:///{self.path}', ttl=TTL)
+
+    async def test_survives_restart(self):
+        await self.storage.set_state(KEY, 'Add:word')
+        await self.storage.set_data(KEY, {'word': 'cat'})
+        await self.storage.close()
+
+        storage = bot_storage.build_storage(f'sqlite:///{self.path}', ttl=TTL)
+        self.assertEqual(await storage.get_state(KEY), 'Add:word')
+        self.assertEqual(await storage.get_data(KEY), {'word': 'cat'})
+        await storage.close()
+
+    async def test_purge_expired(self):
+        await self.storage.set_state(KEY, 'Add:word')
+        self.clock.now += TTL / 2
+        await self.storage.set_state(OTHER, 'Add:word')
+        self.clock.now += TTL / 2
+        self.assertEqual(await self.storage.purge_expired(), 1)
+        self.assertEqual(await self.storage.get_state(OTHER), 'Add:word')
+        await self.storage.close()
+
+
+class FakeRedis:
+    """
+    Замена клиента redis.asyncio в памяти: только то, чем пользуется
+    RedisStorage, — get, set с ex, delete и aclose. TTL — по FakeClock.
+    """
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.values = {}
+        self.closed = False
+
+    async def get(self, key):
+        value, expires_at = self.values.get(key, (None, None))
+        if expires_at is not None and expires_at <= self.clock():
+            del self.values[key]
+            return None
+        return value
+
+    async def set(self, key, value, ex=None):
+        expires_at = self.clock() + ex if ex else None
+        self.values[key] = (value.encode() if isinstance(value, str) else value, expires_at)
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.values.pop(key, None)
+
+    async def aclose(self, close_connection_pool=True):
+        self.closed = True
+
+
+@skipUnless(redis, "не установлен пакет redis из requirements.txt")
+class RedisStorageTests(StorageContract, SimpleTestCase):
+    def make_storage(self):
+        self.client = FakeRedis(self.clock)
+        # Пул соединений создаётся без подключения, сам клиент подменяем
+        with mock.patch('aiogram.fsm.storage.redis.Redis', return_value=self.client):
+            return bot_storage.build_storage('redis://localhost:6379/0', ttl=TTL)
+
+    async def test_close_releases_client(self):
+        await self.storage.close()
+        self.assertTrue(self.client.closed)
+
+
+class BuildStorageTests(SimpleTestCase):
+    def test_unknown_url(self):
+        with self.assertRaises(ValueError):
+            bot_storage.build_storage('mongodb://localhost')
@@ -0,0 +1,133 @@
+import asyncio
+
+from aiogram import Bot, Dispatcher
+from aiohttp.test_utils import TestClient, TestServer
+from django.test import SimpleTestCase
+
+import bot_webhook
+from bot_storage import TTLMemoryStorage
+from cards.metrics import WEBHOOK_REJECTED
+
+PATH = '/webhook'
+SECRET = 's3cret'
+
+
+def message(update_id, chat_id, text):
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id, 'date': 0, 'text': text,
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': {'id': chat_id, 'is_bot': False, 'first_name': 'Test'},
+        },
+    }
+
+
+class ClosingStorage(TTLMemoryStorage):
+    closed = False
+
+    async def close(self):
+        self.closed = True
+        await super().close()
+
+
+class WebhookTests(SimpleTestCase):
+    """
+    Вебхук поверх настоящего Dispatcher: обработчик пишет порядок
+    сообщений, «медленные» тексты задерживаются. Сеть Telegram не нужна —
+    обработчик ничего не отправляет.
+    """
+
+    def setUp(self):
+        self.storage = ClosingStorage()
+        self.dispatcher = Dispatcher(storage=self.storage)
+        self.bot = Bot('123456:TEST')
+        self.started = []
+        self.finished = []
+        self.delays = {}
+
+        @self.dispatcher.message()
+        async def record(message):
+            self.started.append(message.text)
+            await asyncio.sleep(self.delays.get(message.text, 0))
+            self.finished.append(message.text)
+
+        self.dispatcher.startup.register(lambda: self.started.append('startup'))
+
+    async def serve(self, pool, start_workers=True):
+        if start_workers:
+            pool.start()
+        client = TestClient(TestServer(bot_webhook.build_app(pool, PATH, SECRET)))
+        await client.start_server()
+        return client
+
+    async def post(self, client, payload, secret=SECRET):
+        headers = {'X-Telegram-Bot-Api-Secret-Token': secret} if secret else {}
+        return await client.post(PATH, json=payload, headers=headers)
+
+    async def test_per_chat_order(self):
+        pool = bot_webhook.UpdatePool(self.dispatcher, self.bot, workers=4)
+        client = await self.serve(pool)
+        self.delays = {'a1': 0.05, 'a2': 0.01}
+        for update_id, (chat_id, text) in enumerate([(1, 'a1'), (1, 'a2'), (2, 'b1'), (1, 'a3')], start=1):
+            response = await self.post(client, message(update_id, chat_id, text))
+            self.assertEqual(response.status, 200)
+        await pool.drain(timeout=5)
+        await client.close()
+
+        chat_a = [text for text in self.finished if text.startswith('a')]
+        self.assertEqual(chat_a, ['a1', 'a2', 'a3'])
+        # Второй чат не ждёт медленный первый
+        self.assertLess(self.finished.index('b1'), self.finished.index('a1'))
+        self.assertEqual(self.started[0], 'startup')
+
+    async def test_backpressure(self):
+        # Обработчики не запущены — апдейты копятся в очередях
+        pool = bot_webhook.UpdatePool(self.dispatcher, self.bot, workers=1, max_pending=3, max_per_chat=2)
+        client = await self.serve(pool, start_workers=False)
+        chat_full = WEBHOOK_REJECTED._values.get((bot_webhook.CHAT_FULL,), 0)
+        full = WEBHOOK_REJECTED._values.get((bot_webhook.FULL,), 0)
+
+        self.assertEqual((await self.post(client, message(1, 1, 'a1'))).status, 200)
+        self.assertEqual((await self.post(client, message(2, 1, 'a2'))).status, 200)
+        response = await self.post(client, message(3, 1, 'a3'))
+        self.assertEqual((response.status, response.headers['Retry-After']), (429, '1'))
+
+        self.assertEqual((await self.post(client, message(4, 2, 'b1'))).status, 200)
+        response = await self.post(client, message(5, 3, 'c1'))
+        self.assertEqual((response.status, response.headers['Retry-After']), (503, '5'))
+
+        self.assertEqual(WEBHOOK_REJECTED._values[(bot_webhook.CHAT_FULL,)] - chat_full, 1)
+        self.assertEqual(WEBHOOK_REJECTED._values[(bot_webhook.FULL,)] - full, 1)
+
+        # Места освободились — принимаем снова, принятое не потеряно
+        pool.start()
+        await pool.drain(timeout=5)
+        self.assertEqual(sorted(self.finished), ['a1', 'a2', 'b1'])
+        # После drain новые апдейты не принимаются
+        self.assertEqual((await self.post(client, message(6, 3, 'c1'))).status, 503)
+        await client.close()
+
+    async def test_rejects_bad_requests(self):
+        pool = bot_webhook.UpdatePool(self.dispatcher, self.bot, workers=1)
+        client = await self.serve(pool)
+        self.assertEqual((await self.post(client, message(1, 1, 'a1'), secret=None)).status, 401)
+        self.assertEqual((await self.post(client, message(1, 1, 'a1'), secret='wrong')).status, 401)
+        headers = {'X-Telegram-Bot-Api-Secret-Token': SECRET}
+        self.assertEqual((await client.post(PATH, data=b'not json', headers=headers)).status, 400)
+        self.assertEqual((await self.post(client, {'update_id': 'x'})).status, 400)
+        self.assertEqual(pool.pending, 0)
+        await pool.drain(timeout=5)
+        await client.close()
+
+    async def test_cleanup_closes_storage(self):
+        pool = bot_webhook.UpdatePool(self.dispatcher, self.bot, workers=1)
+        client = await self.serve(pool)
+        self.assertEqual(self.started, ['startup'])
+        self.assertFalse(self.storage.closed)
+        await pool.drain(timeout=5)
+        await client.close()
+        self.assertTrue(self.storage.closed)
+
+    def tearDown(self):
+        asyncio.run(self.bot.session.close())
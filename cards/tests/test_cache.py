@@ -0,0 +1,89 @@
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from cards.cache import card_cache
+from cards.models import Card, Schedule
+from cards.reviewlog import review_log
+
+from .test_models import make_card, make_user
+
+
+class CardCacheInvalidationTests(TestCase):
+    """
+    Дашборд, список и поиск card_list читаются из card_cache; запись
+    карточки сдвигает версию пользователя в on_commit, и следующий запрос
+    видит свежие данные.
+    """
+
+    def setUp(self):
+        card_cache.cache.clear()
+        self.addCleanup(card_cache.cache.clear)
+        self.user = make_user('learner')
+        self.card = make_card(self.user, 'cat')
+        self.client.force_login(self.user)
+
+    def page(self, **params):
+        response = self.client.get(reverse('cards:card_list'), params)
+        words = [card.word for card in response.context['cards']]
+        return response.context['total_cards'], response.context['due_count'], words
+
+    def test_write_invalidates_after_commit(self):
+        self.assertEqual(self.page(), (1, 1, ['cat']))
+        self.assertEqual(self.page(q='dog'), (1, 1, []))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            make_card(self.user, 'dog')
+        self.assertEqual(self.page()[0], 2)
+        self.assertEqual(sorted(self.page()[2]), ['cat', 'dog'])
+        self.assertEqual(self.page(q='dog')[2], ['dog'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Schedule.objects.apply_reviews(self.user.id, [(self.card.id, 'good', timezone.now())])
+        # Журнал оценок буферизуется на весь процесс — сбрасываем в эту транзакцию
+        review_log.flush()
+        self.assertEqual(self.page()[:2], (2, 1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Card.objects.get(word='dog').delete()
+        self.assertEqual(self.page(), (1, 0, ['cat']))
+        self.assertEqual(self.page(q='dog')[2], [])
+
+    def test_stale_until_commit(self):
+        self.assertEqual(self.page(), (1, 1, ['cat']))
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            make_card(self.user, 'dog')
+        # Транзакция ещё «не закоммичена» — версия та же, отдаётся кэш
+        self.assertEqual(self.page(), (1, 1, ['cat']))
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.page()[0], 2)
+
+    def test_versions_are_per_user(self):
+        other = make_user('other')
+        make_card(other, 'owl')
+        mine, theirs = card_cache.version(self.user.id), card_cache.version(other.id)
+
+        calls = []
+        card_cache.get_or_compute(other.id, 'dashboard', lambda: calls.append(1) or 'owl')
+        with self.captureOnCommitCallbacks(execute=True):
+            make_card(self.user, 'dog')
+
+        self.assertGreater(card_cache.version(self.user.id), mine)
+        self.assertEqual(card_cache.version(other.id), theirs)
+        # Запись другого пользователя не выбивает чужой кэш
+        self.assertEqual(card_cache.get_or_compute(other.id, 'dashboard', lambda: calls.append(1) or 'new'), 'owl')
+        self.assertEqual(len(calls), 1)
+
+
+class CacheKeyTests(TestCase):
+    def test_parts_are_hashed(self):
+        key = card_cache.key(1, 'search', 'beginner', 'мороженое ' * 100)
+        self.assertLessEqual(len(key), 250)
+        self.assertTrue(key.isascii() and ' ' not in key, key)
+        self.assertTrue(key.startswith(f'cards:1:{card_cache.version(1)}:search:'))
+
+    def test_parts_stay_distinct(self):
+        self.assertNotEqual(card_cache.key(1, 'cards', 'a:b', ''), card_cache.key(1, 'cards', 'a', 'b'))
+        self.assertNotEqual(card_cache.key(1, 'cards', ''), card_cache.key(1, 'cards'))
@@ -0,0 +1,132 @@
+import gzip
+import io
+import json
+from datetime import timedelta
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from cards.exporters import export_stream
+from cards.importers import ImportFormatError, import_cards, iter_json_array
+from cards.models import Card, Schedule, UserStats
+
+from .test_models import make_card, make_user
+
+
+class ImportExportRoundTripTests(TestCase):
+    def setUp(self):
+        self.source = make_user('source')
+        now = timezone.now().replace(microsecond=0)
+        cat = make_card(self.source, 'cat', now + timedelta(days=6), interval=6, repetitions=4, ease_factor=2.7)
+        cat.example = 'The cat sleeps, "quietly".'
+        cat.note = 'многострочное\nпримечание'
+        cat.level = 'advanced'
+        cat.save()
+        make_card(self.source, 'ёжик', now - timedelta(days=1))
+
+    def export(self, fmt, compress=False):
+        data = b''.join(export_stream(self.source, fmt, with_schedule=True, compress=compress))
+        name = f'backup.{fmt}' + ('.gz' if compress else '')
+        return SimpleUploadedFile(name, data)
+
+    def snapshot(self, user):
+        rows = Card.objects.filter(owner=user).values_list(
+            'word', 'translation', 'example', 'note', 'level',
+            'schedule__next_review', 'schedule__interval', 'schedule__repetitions', 'schedule__ease_factor',
+        )
+        # Пустые пример и примечание импорт сохраняет как '', а не NULL
+        return sorted((word, translation, example or '', note or '', *rest)
+                      for word, translation, example, note, *rest in rows)
+
+    def test_round_trip(self):
+        for fmt, compress in (('json', False), ('ndjson', False), ('csv', False), ('json', True)):
+            with self.subTest(fmt=fmt, compress=compress):
+                target = make_user(f'target-{fmt}-{compress}')
+                result = import_cards(target, self.export(fmt, compress), fmt)
+                self.assertEqual((result.inserted, result.updated, result.invalid), (2, 0, 0), result.errors)
+                self.assertEqual(self.snapshot(target), self.snapshot(self.source))
+                stats = UserStats.objects.get(user=target)
+                self.assertEqual((stats.total_cards, stats.learned_cards), (2, 1))
+
+    def test_reimport_updates_in_place(self):
+        before = self.snapshot(self.source)
+        result = import_cards(self.source, self.export('json'), 'json')
+        self.assertEqual((result.inserted, result.updated), (0, 2))
+        self.assertEqual(self.snapshot(self.source), before)
+        self.assertEqual(UserStats.objects.get(user=self.source).total_cards, 2)
+
+    def test_invalid_records_reported(self):
+        records = [
+            {'word': 'dog', 'translation': 'собака'},
+            {'word': 'DOG', 'translation': 'пёс'},
+            {'word': '', 'translation': 'пусто'},
+            {'word': 'owl', 'translation': 'сова', 'level': 'expert'},
+        ]
+        upload = SimpleUploadedFile('cards.json.gz', gzip.compress(json.dumps(records).encode()))
+        result = import_cards(self.source, upload, 'json')
+        self.assertEqual((result.inserted, result.skipped, result.invalid), (1, 1, 2))
+        self.assertTrue(result.errors[0].startswith('#3:'))
+        self.assertTrue(Schedule.objects.filter(card__owner=self.source, card__word='dog').exists())
+
+
+class JsonArrayParserTests(TestCase):
+    def parse(self, text):
+        return list(iter_json_array(io.StringIO(text)))
+
+    def test_valid(self):
+        self.assertEqual(self.parse(' [ {"a": 1} , {"b": "]"} ]\n\n'), [{'a': 1}, {'b': ']'}])
+        self.assertEqual(self.parse('[]'), [])
+
+    def test_chunk_boundaries(self):
+        text = json.dumps([{'word': f'w{i}', 'translation': 'т' * i} for i in range(50)])
+        with mock.patch('cards.importers.CHUNK_SIZE', 7):
+            self.assertEqual(len(self.parse(text)), 50)
+
+    def test_malformed(self):
+        cases = {
+            'missing comma': '[{"a": 1} {"b": 2}]',
+            'doubled comma': '[{"a": 1},, {"b": 2}]',
+            'leading comma': '[, {"a": 1}]',
+            'trailing comma': '[{"a": 1},]',
+            'trailing garbage': '[{"a": 1}] {"b": 2}',
+            'second array': '[{"a": 1}][]',
+            'not an array': '{"a": 1}',
+            'unterminated': '[{"a": 1}',
+            'broken item': '[{"a": }]',
+        }
+        for name, text in cases.items():
+            with self.subTest(name), mock.patch('cards.importers.CHUNK_SIZE', 4):
+                with self.assertRaises(ImportFormatError):
+                    self.parse(text)
+
+
+class PartialImportTests(TestCase):
+    def setUp(self):
+        self.user = make_user('learner')
+        self.client.force_login(self.user)
+
+    def broken_file(self, good):
+        records = ',\n'.join(json.dumps({'word': f'w{i}', 'translation': 'т'}) for i in range(good))
+        return SimpleUploadedFile('cards.json', f'[{records}\n{{"word": "x"}} oops]'.encode())
+
+    def test_reports_where_parsing_stopped(self):
+        result = import_cards(self.user, self.broken_file(12), 'json', batch_size=5)
+        self.assertEqual(result.inserted, 12)
+        self.assertEqual(result.stopped_after, 12)
+        self.assertIn('запятая', result.stopped_error)
+        self.assertEqual(Card.objects.filter(owner=self.user).count(), 12)
+
+    def test_view_shows_partial_counts(self):
+        response = self.client.post(reverse('cards:import_cards'), {'file': self.broken_file(3)})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'ошибка после записи #3')
+        self.assertContains(response, 'Успешно импортировано: 3')
+
+    def test_broken_from_start_is_an_error(self):
+        upload = SimpleUploadedFile('cards.json', b'{"word": "x"}')
+        response = self.client.post(reverse('cards:import_cards'), {'file': upload})
+        self.assertContains(response, 'Ожидается JSON-массив')
+        self.assertFalse(Card.objects.exists())
@@ -0,0 +1,102 @@
+from datetime import time, timedelta
+
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TransactionTestCase
+from django.utils import timezone
+
+
+class MigrationTestCase(TransactionTestCase):
+    """Откатывает схему к migrate_from, готовит данные и применяет migrate_to."""
+
+    migrate_from = None
+    migrate_to = None
+
+    def setUp(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate([self.migrate_from])
+        self.old_apps = executor.loader.project_state([self.migrate_from]).apps
+
+    def migrate(self):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate([self.migrate_to])
+        return executor.loader.project_state([self.migrate_to]).apps
+
+    def tearDown(self):
+        # Остальные тесты ждут схему последней миграции
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+
+class FillNextReminderTests(MigrationTestCase):
+    migrate_from = ('cards', '0006_card_owner_created_index')
+    migrate_to = ('cards', '0007_userstats_next_reminder_at')
+
+    def test_linked_users_get_next_reminder(self):
+        User = self.old_apps.get_model('auth', 'User')
+        UserStats = self.old_apps.get_model('cards', 'UserStats')
+        linked = User.objects.create(username='linked')
+        UserStats.objects.create(user=linked, telegram_id='42', reminder_time=time(9, 0))
+        unlinked = User.objects.create(username='unlinked')
+        UserStats.objects.create(user=unlinked, reminder_time=time(9, 0))
+
+        apps = self.migrate()
+        UserStats = apps.get_model('cards', 'UserStats')
+        reminder = UserStats.objects.get(user_id=linked.id).next_reminder_at
+        self.assertGreater(reminder, timezone.now())
+        self.assertLessEqual(reminder, timezone.now() + timedelta(days=1))
+        # 9:00 по Москве — 6:00 UTC
+        self.assertEqual((reminder.hour, reminder.minute), (6, 0))
+        self.assertIsNone(UserStats.objects.get(user_id=unlinked.id).next_reminder_at)
+
+
+class DedupeTelegramIdsTests(MigrationTestCase):
+    migrate_from = ('cards', '0007_userstats_next_reminder_at')
+    migrate_to = ('cards', '0008_userstats_telegram_id_unique')
+
+    def test_one_row_per_telegram_id(self):
+        User = self.old_apps.get_model('auth', 'User')
+        UserStats = self.old_apps.get_model('cards', 'UserStats')
+        reminder = timezone.now() + timedelta(hours=1)
+        stale, latest, single, blank, other = [
+            UserStats.objects.create(
+                user=User.objects.create(username=name), telegram_id=telegram_id, next_reminder_at=reminder
+            )
+            for name, telegram_id in [('stale', '42'), ('latest', '42'), ('single', '7'), ('blank', ''), ('other', '')]
+        ]
+
+        apps = self.migrate()
+        UserStats = apps.get_model('cards', 'UserStats')
+        linked = dict(UserStats.objects.filter(telegram_id__isnull=False).values_list('telegram_id', 'id'))
+        # Привязка остаётся у последней записи, пустые строки — NULL
+        self.assertEqual(linked, {'42': latest.id, '7': single.id})
+        stale = UserStats.objects.get(id=stale.id)
+        self.assertEqual((stale.telegram_id, stale.next_reminder_at), (None, None))
+        self.assertEqual(UserStats.objects.filter(id__in=[blank.id, other.id], telegram_id=None).count(), 2)
+
+
+class BackfillMissingSchedulesTests(MigrationTestCase):
+    migrate_from = ('cards', '0014_card_word_key')
+    migrate_to = ('cards', '0015_backfill_missing_schedules')
+
+    def test_cards_without_schedule_become_due(self):
+        User = self.old_apps.get_model('auth', 'User')
+        Card = self.old_apps.get_model('cards', 'Card')
+        Schedule = self.old_apps.get_model('cards', 'Schedule')
+        user = User.objects.create(username='legacy')
+        orphan = Card.objects.create(owner=user, word='cat', word_key='cat', translation='кот')
+        scheduled = Card.objects.create(owner=user, word='dog', word_key='dog', translation='собака')
+        later = timezone.now() + timedelta(days=10)
+        Schedule.objects.create(card=scheduled, owner=user, next_review=later, repetitions=4)
+
+        apps = self.migrate()
+        Schedule = apps.get_model('cards', 'Schedule')
+        schedule = Schedule.objects.get(card_id=orphan.id)
+        self.assertEqual(schedule.owner_id, user.id)
+        self.assertLessEqual(schedule.next_review, timezone.now())
+        self.assertEqual(schedule.repetitions, 0)
+        # Существующее расписание не трогаем
+        self.assertEqual(Schedule.objects.get(card_id=scheduled.id).repetitions, 4)
+        self.assertEqual(Schedule.objects.count(), 2)
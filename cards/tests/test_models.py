@@ -0,0 +1,206 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from cards.models import LEARNED_REPETITIONS, Card, ReviewLog, Schedule, UserStats
+from cards.reviewlog import review_log
+
+
+def make_user(username):
+    user = User.objects.create_user(username)
+    UserStats.objects.create(user=user)
+    return user
+
+
+def make_card(user, word, next_review=None, **schedule):
+    card = Card.objects.create(owner=user, word=word, translation=f'{word} (перевод)')
+    Schedule.objects.create(card=card, next_review=next_review or timezone.now(), **schedule)
+    return card
+
+
+class DueTests(TestCase):
+    def test_due_cards_oldest_first(self):
+        now = timezone.now()
+        user = make_user('learner')
+        fresh = make_card(user, 'fresh', now - timedelta(hours=1))
+        overdue = make_card(user, 'overdue', now - timedelta(days=3))
+        make_card(user, 'future', now + timedelta(days=1))
+        make_card(make_user('other'), 'foreign', now - timedelta(days=5))
+
+        due = list(Schedule.objects.due(user, now))
+        self.assertEqual([schedule.card_id for schedule in due], [overdue.id, fresh.id])
+
+        with self.assertNumQueries(0):
+            # Карточка приходит тем же запросом
+            self.assertEqual(due[0].card.word, 'overdue')
+
+    def test_due_moves_with_now(self):
+        now = timezone.now()
+        user = make_user('learner')
+        card = make_card(user, 'later', now + timedelta(days=1))
+        self.assertFalse(Schedule.objects.due(user, now).exists())
+        self.assertEqual(
+            list(Schedule.objects.due(user, now + timedelta(days=2)).values_list('card_id', flat=True)), [card.id]
+        )
+
+
+class ApplyReviewsTests(TestCase):
+    def setUp(self):
+        self.user = make_user('learner')
+        self.now = timezone.now()
+
+    def stats(self):
+        return UserStats.objects.get(user=self.user)
+
+    def test_counters(self):
+        almost = make_card(self.user, 'almost', repetitions=2)
+        new = make_card(self.user, 'new')
+        with self.captureOnCommitCallbacks(execute=True):
+            applied, missing = Schedule.objects.apply_reviews(self.user.id, [
+                (almost.id, 'good', self.now),
+                (new.id, 'hard', self.now, 1500),
+                (999_999, 'easy', self.now),
+            ], source='api')
+
+        self.assertEqual((applied, missing), (2, [999_999]))
+        stats = self.stats()
+        self.assertEqual(stats.total_cards, 2)
+        # Третье повторение делает карточку выученной
+        self.assertEqual(stats.learned_cards, 1)
+        self.assertEqual(stats.review_streak, 2)
+        self.assertEqual(stats.last_reviewed, self.now)
+
+        review_log.flush()
+        logs = {log.card_id: log for log in ReviewLog.objects.all()}
+        self.assertEqual(set(logs), {almost.id, new.id})
+        self.assertEqual(logs[new.id].latency_ms, 1500)
+        self.assertEqual(logs[almost.id].source, 'api')
+
+    def test_applied_in_reviewed_at_order(self):
+        card = make_card(self.user, 'cat', interval=4)
+        earlier = self.now - timedelta(minutes=5)
+        Schedule.objects.apply_reviews(self.user.id, [
+            (card.id, 'easy', self.now),
+            (card.id, 'hard', earlier),
+        ])
+        schedule = Schedule.objects.get(card=card)
+        # hard (4 → 4), затем easy (4 → 14), а не наоборот
+        self.assertEqual((schedule.interval, schedule.repetitions), (14, 2))
+        self.assertEqual(schedule.next_review, self.now + timedelta(days=14))
+
+    def test_late_offline_batch_keeps_last_reviewed(self):
+        card = make_card(self.user, 'cat')
+        Schedule.objects.apply_reviews(self.user.id, [(card.id, 'good', self.now)])
+        # Офлайн-клиент досылает оценки недельной давности
+        week_ago = self.now - timedelta(days=7)
+        Schedule.objects.apply_reviews(self.user.id, [(card.id, 'hard', week_ago)], source='api')
+        stats = self.stats()
+        self.assertEqual(stats.last_reviewed, self.now)
+        self.assertEqual(stats.review_streak, 2)
+
+    def test_first_review_sets_last_reviewed(self):
+        card = make_card(self.user, 'cat')
+        week_ago = self.now - timedelta(days=7)
+        Schedule.objects.apply_reviews(self.user.id, [(card.id, 'good', week_ago)])
+        self.assertEqual(self.stats().last_reviewed, week_ago)
+
+    def test_foreign_cards_untouched(self):
+        foreign = make_card(make_user('other'), 'dog', interval=4)
+        applied, missing = Schedule.objects.apply_reviews(self.user.id, [(foreign.id, 'good', self.now)])
+        self.assertEqual((applied, missing), (0, [foreign.id]))
+        self.assertEqual(Schedule.objects.get(card=foreign).interval, 4)
+        self.assertEqual(self.stats().review_streak, 0)
+
+
+class UpsertTests(TestCase):
+    def test_upsert_by_normalized_word(self):
+        user = make_user('learner')
+        make_card(user, 'Ice cream', repetitions=1)
+        cards, inserted = Card.objects.upsert(user.id, [
+            Card(word='  ice   CREAM ', translation='пломбир'),
+            Card(word='cake', translation='торт'),
+        ], [{}, {'repetitions': 3}])
+
+        self.assertEqual(inserted, 1)
+        self.assertEqual(Card.objects.filter(owner=user).count(), 2)
+        self.assertEqual(Card.objects.get(owner=user, word_key='ice cream').translation, 'пломбир')
+        # Расписание существующей карточки не сбрасывается
+        self.assertEqual(Schedule.objects.get(card__word_key='ice cream').repetitions, 1)
+        stats = UserStats.objects.get(user=user)
+        self.assertEqual((stats.total_cards, stats.learned_cards), (2, 1))
+
+
+class StatsCountersTests(TestCase):
+    """
+    total_cards и learned_cards ведутся инкрементально; reconcile_counters
+    и manage.py reconcile_stats чинят разошедшиеся.
+    """
+
+    def setUp(self):
+        self.user = make_user('learner')
+        self.other = make_user('other')
+
+    def counters(self, user):
+        stats = UserStats.objects.get(user=user)
+        return stats.total_cards, stats.learned_cards
+
+    def learn(self, card, times=LEARNED_REPETITIONS):
+        now = timezone.now()
+        Schedule.objects.apply_reviews(
+            card.owner_id, [(card.id, 'good', now + timedelta(seconds=i)) for i in range(times)]
+        )
+
+    def test_bumps_follow_create_review_delete(self):
+        cat = make_card(self.user, 'cat')
+        dog = make_card(self.user, 'dog')
+        Card.objects.upsert(self.user.id, [Card(word='owl', translation='сова'), Card(word='cat', translation='кошка')])
+        make_card(self.other, 'fox')
+        self.assertEqual(self.counters(self.user), (3, 0))
+
+        self.learn(cat)
+        self.learn(dog, times=LEARNED_REPETITIONS - 1)
+        self.assertEqual(self.counters(self.user), (3, 1))
+        # Выученная карточка уже не добавляет learned при следующих повторениях
+        self.learn(cat, times=1)
+        self.assertEqual(self.counters(self.user), (3, 1))
+
+        cat.delete()
+        self.assertEqual(self.counters(self.user), (2, 0))
+        self.learn(dog, times=1)
+        Card.objects.filter(owner=self.user).delete()
+        self.assertEqual(self.counters(self.user), (0, 0))
+        self.assertEqual(self.counters(self.other), (1, 0))
+
+        # Инкременты сошлись с пересчётом
+        self.assertEqual(UserStats.objects.reconcile_counters(), 0)
+
+    def test_reconcile_repairs_drift(self):
+        make_card(self.user, 'cat', repetitions=LEARNED_REPETITIONS)
+        make_card(self.user, 'dog')
+        make_card(self.other, 'fox')
+        UserStats.objects.filter(user=self.user).update(total_cards=10, learned_cards=0)
+
+        self.assertEqual(UserStats.objects.reconcile_counters(), 1)
+        self.assertEqual(self.counters(self.user), (2, 1))
+        self.assertEqual(self.counters(self.other), (1, 0))
+
+    def test_reconcile_user_without_cards(self):
+        UserStats.objects.filter(user=self.user).update(total_cards=3, learned_cards=2)
+        self.assertEqual(UserStats.objects.reconcile_counters(), 1)
+        self.assertEqual(self.counters(self.user), (0, 0))
+
+    def test_command(self):
+        make_card(self.user, 'cat')
+        UserStats.objects.filter(user=self.user).update(total_cards=0)
+        out = StringIO()
+        call_command('reconcile_stats', stdout=out)
+        self.assertIn('Исправлено записей статистики: 1', out.getvalue())
+        self.assertEqual(self.counters(self.user), (1, 0))
+
+        out = StringIO()
+        call_command('reconcile_stats', stdout=out)
+        self.assertIn('Исправлено записей статистики: 0', out.getvalue())
@@ -0,0 +1,69 @@
+import base64
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+from cards.models import Card
+from cards.pagination import decode_cursor, encode_cursor, keyset_page
+
+from .test_models import make_user
+
+
+class KeysetPageTests(TestCase):
+    def setUp(self):
+        self.user = make_user('learner')
+        self.moment = timezone.now()
+        # Семь карточек с одинаковым created_at и две позже
+        for i in range(7):
+            Card.objects.create(owner=self.user, word=f'same{i}', translation='-')
+        for i in range(2):
+            Card.objects.create(owner=self.user, word=f'later{i}', translation='-')
+        cards = Card.objects.filter(owner=self.user)
+        cards.filter(word__startswith='same').update(created_at=self.moment)
+        cards.filter(word__startswith='later').update(created_at=self.moment + timedelta(seconds=1))
+        self.cards = cards
+
+    def walk(self, size):
+        pages, cursor = [], None
+        while True:
+            page, cursor = keyset_page(self.cards, cursor, size=size)
+            pages.append([card.id for card in page])
+            if cursor is None:
+                return pages
+
+    def test_ties_on_created_at(self):
+        pages = self.walk(size=3)
+        ids = [card_id for page in pages for card_id in page]
+        # Ни пропусков, ни повторов, хотя страница рвётся внутри одинаковых created_at
+        expected = list(self.cards.order_by('created_at', 'id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+        self.assertEqual([len(page) for page in pages], [3, 3, 3])
+
+    def test_last_page_has_no_cursor(self):
+        page, cursor = keyset_page(self.cards, size=9)
+        self.assertEqual((len(page), cursor), (9, None))
+        page, cursor = keyset_page(self.cards, size=8)
+        self.assertIsNotNone(cursor)
+        page, cursor = keyset_page(self.cards, cursor, size=8)
+        self.assertEqual((len(page), cursor), (1, None))
+
+    def test_cursor_round_trip(self):
+        card = self.cards.order_by('id').first()
+        self.assertEqual(decode_cursor(encode_cursor(card)), (card.created_at, card.id))
+
+    def test_malformed_cursor_is_rejected(self):
+        garbage = [
+            'not a cursor',
+            base64.urlsafe_b64encode(b'no separator').decode(),
+            base64.urlsafe_b64encode(b'2026-01-01T00:00:00|abc').decode(),
+            base64.urlsafe_b64encode(b'yesterday|5').decode(),
+            base64.urlsafe_b64encode(b'\xff\xfe|1').decode(),
+        ]
+        first_page, _ = keyset_page(self.cards, size=3)
+        for cursor in garbage:
+            with self.subTest(cursor=cursor):
+                self.assertIsNone(decode_cursor(cursor))
+                # Битый курсор — первая страница, а не ошибка
+                page, _ = keyset_page(self.cards, cursor, size=3)
+                self.assertEqual(page, first_page)
@@ -0,0 +1,112 @@
+import os
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.utils import timezone
+
+from cards import reminders
+from cards.models import UserStats, next_reminder_slot
+
+from .test_bot import RecordingSession
+from .test_models import make_card, make_user
+
+os.environ.setdefault('TELEGRAM_BOT_TOKEN', '123456:TEST')
+import bot  # noqa: E402
+
+NOW = datetime(2026, 3, 10, 6, 0, tzinfo=dt_timezone.utc)
+
+
+def link(username, telegram_id, next_reminder_at, tz='Europe/Moscow'):
+    user = make_user(username)
+    UserStats.objects.filter(user=user).update(
+        telegram_id=str(telegram_id), reminder_time=time(9, 0), timezone=tz, next_reminder_at=next_reminder_at
+    )
+    return user
+
+
+class NextReminderSlotTests(SimpleTestCase):
+    def test_today_or_tomorrow(self):
+        # 8:00 по Москве — слот сегодня в 9:00 (6:00 UTC)
+        after = datetime(2026, 3, 10, 5, 0, tzinfo=dt_timezone.utc)
+        self.assertEqual(next_reminder_slot(time(9, 0), 'Europe/Moscow', after), after.replace(hour=6))
+        # Ровно в слот — уже следующий день
+        slot = next_reminder_slot(time(9, 0), 'Europe/Moscow', after.replace(hour=6))
+        self.assertEqual(slot, datetime(2026, 3, 11, 6, 0, tzinfo=dt_timezone.utc))
+
+    def test_dst_switch(self):
+        # В ночь на 29 марта Берлин переходит с UTC+1 на UTC+2
+        after = datetime(2026, 3, 28, 8, 0, tzinfo=dt_timezone.utc)
+        slot = next_reminder_slot(time(9, 0), 'Europe/Berlin', after)
+        self.assertEqual(slot, datetime(2026, 3, 29, 7, 0, tzinfo=dt_timezone.utc))
+        # Осенью обратно: 25 октября 9:00 — снова UTC+1
+        after = datetime(2026, 10, 24, 8, 0, tzinfo=dt_timezone.utc)
+        slot = next_reminder_slot(time(9, 0), 'Europe/Berlin', after)
+        self.assertEqual(slot, datetime(2026, 10, 25, 8, 0, tzinfo=dt_timezone.utc))
+
+    def test_default_timezone(self):
+        after = datetime(2026, 3, 10, 5, 0, tzinfo=dt_timezone.utc)
+        self.assertEqual(next_reminder_slot(time(9, 0), '', after), after.replace(hour=6))
+
+
+class ClaimDueRemindersTests(TestCase):
+    def test_claims_due_rows(self):
+        due = link('due', 1, NOW - timedelta(minutes=1))
+        make_card(due, 'cat', NOW - timedelta(days=1))
+        make_card(due, 'dog', NOW + timedelta(days=1))
+        link('late', 2, NOW - timedelta(hours=2))
+        link('future', 3, NOW + timedelta(minutes=1))
+        make_user('unlinked')
+
+        recipients, claimed = reminders.claim_due_reminders(now=NOW)
+        self.assertEqual(recipients, [('1', 1)])
+        # Опоздавшее напоминание не шлём, но переносим
+        self.assertEqual(claimed, 2)
+        moved = dict(UserStats.objects.filter(telegram_id__in=['1', '2']).values_list('telegram_id', 'next_reminder_at'))
+        self.assertEqual(set(moved.values()), {datetime(2026, 3, 11, 6, 0, tzinfo=dt_timezone.utc)})
+
+        # Повторный тик ничего не находит
+        self.assertEqual(reminders.claim_due_reminders(now=NOW), ([], 0))
+
+    def test_skips_rows_claimed_concurrently(self):
+        link('first', 1, NOW - timedelta(minutes=2))
+        link('second', 2, NOW - timedelta(minutes=1))
+        original = UserStats.schedule_next_reminder
+
+        def race(item, after=None):
+            # Параллельный процесс успевает перенести строку между выборкой и UPDATE
+            if item.telegram_id == '1':
+                UserStats.objects.filter(id=item.id).update(next_reminder_at=NOW + timedelta(hours=1))
+            original(item, after)
+
+        with mock.patch.object(UserStats, 'schedule_next_reminder', autospec=True, side_effect=race):
+            recipients, claimed = reminders.claim_due_reminders(now=NOW)
+
+        self.assertEqual((recipients, claimed), ([('2', 0)], 1))
+        # Чужой перенос не перезаписан
+        self.assertEqual(UserStats.objects.get(telegram_id='1').next_reminder_at, NOW + timedelta(hours=1))
+
+
+class SendLocalRemindersTests(TransactionTestCase):
+    def setUp(self):
+        self.session = RecordingSession()
+        self.original_session = bot.bot.session
+        bot.bot.session = self.session
+
+    def tearDown(self):
+        bot.bot.session = self.original_session
+
+    def test_late_rows_do_not_stop_the_loop(self):
+        now = timezone.now()
+        # Первая порция — только опоздавшие: получателей нет, но строки забраны
+        link('late1', 1, now - timedelta(hours=3))
+        link('late2', 2, now - timedelta(hours=2))
+        link('due', 3, now - timedelta(minutes=1))
+
+        with mock.patch.object(reminders, 'BATCH_SIZE', 2):
+            async_to_sync(bot.send_local_reminders)()
+
+        self.assertEqual(len(self.session.sent), 1)
+        self.assertIn('Напоминание', self.session.sent[0])
+        self.assertFalse(UserStats.objects.filter(next_reminder_at__lte=now).exists())
@@ -0,0 +1,68 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import DatabaseError
+from django.test import TestCase
+from django.utils import timezone
+
+from cards.metrics import REVIEW_LOG_DROPPED
+from cards.models import Card, ReviewLog
+from cards.reviewlog import ReviewLogBuffer
+
+
+class ReviewLogBufferTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('learner')
+        self.card = Card.objects.create(owner=self.user, word='cat', translation='кот')
+        self.buffer = ReviewLogBuffer(batch_size=100, flush_interval=3600, max_entries=5, max_attempts=3)
+
+    def entries(self, count):
+        return [
+            ReviewLog(user=self.user, card_id=self.card.id, rating='good', reviewed_at=timezone.now(),
+                      previous_interval=1, interval=2, ease_factor=2.5)
+            for _ in range(count)
+        ]
+
+    def failing(self):
+        return mock.patch.object(ReviewLog.objects, 'bulk_create', side_effect=DatabaseError("disk I/O error"))
+
+    def test_flush_writes_and_nulls_deleted_cards(self):
+        entries = self.entries(2)
+        entries[1].card_id = self.card.id + 1000
+        self.buffer.extend(entries)
+        self.assertEqual(self.buffer.flush(), 2)
+        self.assertEqual(ReviewLog.objects.filter(card__isnull=True).count(), 1)
+
+    def test_failure_is_logged_and_requeued(self):
+        self.buffer.extend(self.entries(2))
+        with self.failing(), self.assertLogs('cards.reviewlog', 'ERROR') as logs:
+            self.assertEqual(self.buffer.flush(), 0)
+        self.assertIn('попытка 1 из 3', logs.output[0])
+        self.assertIn('disk I/O error', logs.output[0])
+        self.assertEqual(self.buffer.dropped, 0)
+        # База ожила — записи не потерялись, счётчик неудач сброшен
+        self.assertEqual(self.buffer.flush(), 2)
+        self.assertEqual(self.buffer._failures, 0)
+
+    def test_requeue_is_capped(self):
+        before = REVIEW_LOG_DROPPED._values.get(('overflow',), 0)
+        self.buffer.extend(self.entries(4))
+        with self.failing(), self.assertLogs('cards.reviewlog', 'ERROR'):
+            self.buffer.flush()
+            self.buffer.extend(self.entries(3))
+            self.buffer.flush()
+        self.assertEqual(len(self.buffer._entries), 5)
+        self.assertEqual(self.buffer.dropped, 2)
+        self.assertEqual(REVIEW_LOG_DROPPED._values[('overflow',)] - before, 2)
+
+    def test_dropped_after_max_attempts(self):
+        before = REVIEW_LOG_DROPPED._values.get(('attempts',), 0)
+        self.buffer.extend(self.entries(3))
+        with self.failing(), self.assertLogs('cards.reviewlog', 'ERROR') as logs:
+            for _ in range(3):
+                self.buffer.flush()
+        self.assertEqual(self.buffer._entries, [])
+        self.assertEqual(self.buffer.dropped, 3)
+        self.assertEqual(REVIEW_LOG_DROPPED._values[('attempts',)] - before, 3)
+        self.assertTrue(any('отброшено' in line for line in logs.output))
+        self.assertFalse(ReviewLog.objects.exists())
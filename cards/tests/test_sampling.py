@@ -0,0 +1,78 @@
+import random
+from collections import Counter
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase
+from django.utils import timezone
+
+from cards.cache import card_cache
+from cards.models import Card
+from cards.sampling import CardSampler
+
+from .test_models import make_card, make_user
+
+
+class CardSamplerTests(TestCase):
+    def setUp(self):
+        card_cache.cache.clear()
+        self.addCleanup(card_cache.cache.clear)
+        random.seed(1)
+        self.user = make_user('learner')
+        now = timezone.now()
+        self.cards = [make_card(self.user, f'word{i}', now + timedelta(days=1)) for i in range(10)]
+        self.sampler = CardSampler()
+
+    def test_uniform_rate(self):
+        counts = Counter()
+        rounds = 1000
+        for _ in range(rounds):
+            picked = self.sampler.sample(self.user.id, 3)
+            self.assertEqual(len({card.id for card in picked}), 3)
+            counts.update(card.id for card in picked)
+
+        # Каждая карточка попадает с частотой k/n = 0.3
+        self.assertEqual(set(counts), {card.id for card in self.cards})
+        for card_id, n in counts.items():
+            self.assertAlmostEqual(n / rounds, 0.3, delta=0.06)
+
+    def test_one_query_per_sample(self):
+        self.sampler.sample(self.user.id, 4)
+        with self.assertNumQueries(1):
+            self.assertEqual(len(self.sampler.sample(self.user.id, 4)), 4)
+        self.assertEqual(len(self.sampler.sample(self.user.id, 50)), 10)
+
+    def test_prefer_due_from_window(self):
+        now = timezone.now()
+        due = make_card(self.user, 'overdue', now - timedelta(days=1))
+        for _ in range(20):
+            picked = self.sampler.sample(self.user.id, 4, prefer_due=True, now=now)
+            self.assertEqual(picked[0].id, due.id)
+            self.assertEqual(len({card.id for card in picked}), 4)
+
+    def test_deleted_card_rereads_ids(self):
+        self.sampler.card_ids(self.user.id)
+        # Удаление в обход кэша: версия не сдвинулась, массив устарел
+        with mock.patch.object(card_cache, 'bump_on_commit'):
+            Card.objects.filter(id__in=[card.id for card in self.cards[:9]]).delete()
+        self.assertEqual([card.id for card in self.sampler.sample(self.user.id, 10)], [self.cards[9].id])
+
+    def test_memory_bound_in_bytes(self):
+        users = [self.user] + [make_user(f'user{i}') for i in range(2)]
+        for user in users[1:]:
+            for i in range(10):
+                make_card(user, f'word{i}')
+        # Десять id по 8 байт — в пределе помещаются два пользователя
+        sampler = CardSampler(max_bytes=160)
+        for user in users:
+            sampler.card_ids(user.id)
+            self.assertLessEqual(sampler.size_bytes, 160)
+        self.assertEqual(list(sampler._ids), [users[1].id, users[2].id])
+
+        sampler.invalidate(users[1].id)
+        self.assertEqual(sampler.size_bytes, 80)
+
+        # Один пользователь больше предела — всё равно кэшируется
+        tiny = CardSampler(max_bytes=8)
+        self.assertEqual(len(tiny.card_ids(self.user.id)), 10)
+        self.assertEqual(tiny.size_bytes, 80)
@@ -0,0 +1,43 @@
+from django.test import TestCase
+
+from cards import search
+from cards.models import Card
+
+from .test_models import make_user
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.user = make_user('learner')
+        self.ice = Card.objects.create(owner=self.user, word='ice cream', translation='мороженое')
+        self.hedgehog = Card.objects.create(owner=self.user, word='hedgehog', translation='ёжик')
+        self.cake = Card.objects.create(
+            owner=self.user, word='cake', translation='торт', example='Cake with ice on top.'
+        )
+        Card.objects.create(owner=make_user('other'), word='ice', translation='лёд')
+
+    def test_prefix_and_owner(self):
+        self.assertEqual(search.search_ids(self.user.id, 'cre'), [self.ice.id])
+        self.assertEqual(search.search_ids(self.user.id, 'мороженое ice'), [self.ice.id])
+        self.assertEqual(search.search_ids(self.user.id, 'лёд'), [])
+
+    def test_word_ranks_above_example(self):
+        self.assertEqual(search.search_ids(self.user.id, 'ice'), [self.ice.id, self.cake.id])
+
+    def test_yo_folding(self):
+        self.assertEqual(search.search_ids(self.user.id, 'ежик'), [self.hedgehog.id])
+        self.assertEqual(search.search_ids(self.user.id, 'Ёжик'), [self.hedgehog.id])
+
+    def test_index_follows_edits(self):
+        self.cake.word = 'pie'
+        self.cake.example = ''
+        self.cake.save()
+        self.assertEqual(search.search_ids(self.user.id, 'cake'), [])
+        self.assertEqual([card.word for card in search.search(self.user.id, 'pie')], ['pie'])
+        self.hedgehog.delete()
+        self.assertEqual(search.search_ids(self.user.id, 'ёжик'), [])
+
+    def test_special_characters(self):
+        self.assertEqual(search.fts_query('"ice" OR *'), '"ice"* "OR"*')
+        self.assertEqual(search.search_ids(self.user.id, '"ice" -cream'), [self.ice.id])
+        self.assertEqual(search.search_ids(self.user.id, '***'), [])
@@ -0,0 +1,114 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from cards import sync
+from cards.models import Card, CardTombstone, Schedule
+
+from .test_models import make_card, make_user
+
+
+class SyncTests(TestCase):
+    def setUp(self):
+        self.user = make_user('learner')
+        self.cards = [make_card(self.user, word) for word in ('cat', 'dog', 'owl')]
+        make_card(make_user('other'), 'fox')
+        # Колода создана давно — старше SYNC_LAG
+        hour_ago = timezone.now() - timedelta(hours=1)
+        Card.objects.update(updated_at=hour_ago)
+        Schedule.objects.update(updated_at=hour_ago)
+
+    def later(self):
+        # Изменения моложе SYNC_LAG не отдаются — смотрим «из будущего»
+        return timezone.now() + sync.SYNC_LAG + timedelta(seconds=1)
+
+    def test_initial_sync_pages(self):
+        seen = []
+        cursor = None
+        now = timezone.now()
+        for _ in range(5):
+            page = sync.changes(self.user, cursor, size=2, now=now)
+            seen += [row['word'] for row in page['cards']]
+            cursor = page['next_cursor']
+            if not page['has_more']:
+                break
+        self.assertEqual(seen, ['cat', 'dog', 'owl'])
+        self.assertEqual(page['deleted'], [])
+
+        # Ничего не менялось — пустой ответ
+        page = sync.changes(self.user, cursor, now=now)
+        self.assertEqual((page['cards'], page['schedules'], page['deleted']), ([], [], []))
+
+    def test_changes_after_cursor(self):
+        cursor = sync.changes(self.user)['next_cursor']
+        cat, dog, _ = self.cards
+
+        cat.translation = 'кошка'
+        cat.save()
+        Schedule.objects.apply_reviews(self.user.id, [(dog.id, 'good', timezone.now())])
+        Card.objects.filter(id=self.cards[2].id).delete()
+
+        page = sync.changes(self.user, cursor, now=self.later())
+        self.assertEqual([row['translation'] for row in page['cards']], ['кошка'])
+        self.assertEqual([row['card_id'] for row in page['schedules']], [dog.id])
+        self.assertEqual([row['card_id'] for row in page['deleted']], [self.cards[2].id])
+        self.assertFalse(page['has_more'])
+
+    def test_recent_changes_held_back(self):
+        cursor = sync.changes(self.user)['next_cursor']
+        make_card(self.user, 'bee')
+        page = sync.changes(self.user, cursor)
+        self.assertEqual(page['cards'], [])
+        # Курсор не перескочил свежую карточку — она придёт позже
+        page = sync.changes(self.user, page['next_cursor'], now=self.later())
+        self.assertEqual([row['word'] for row in page['cards']], ['bee'])
+
+    def test_bad_cursor(self):
+        with self.assertRaises(ValueError):
+            sync.decode_cursor('not-a-cursor')
+
+
+@override_settings(SYNC_TOMBSTONE_DAYS=30)
+class TombstoneRetentionTests(TestCase):
+    def setUp(self):
+        self.user = make_user('learner')
+        self.now = timezone.now()
+
+    def tombstone(self, card_id, days_ago):
+        return CardTombstone.objects.create(
+            owner=self.user, card_id=card_id, deleted_at=self.now - timedelta(days=days_ago)
+        )
+
+    def test_prune_keeps_recent(self):
+        self.tombstone(1, 45)
+        recent = self.tombstone(2, 10)
+        self.assertEqual(sync.prune_tombstones(self.now), 1)
+        self.assertEqual(list(CardTombstone.objects.values_list('id', flat=True)), [recent.id])
+
+    def test_command(self):
+        self.tombstone(1, 45)
+        out = StringIO()
+        call_command('prune_tombstones', stdout=out)
+        self.assertIn('30', out.getvalue())
+        self.assertFalse(CardTombstone.objects.exists())
+
+    def test_expired_cursor(self):
+        cursor = sync.changes(self.user, now=self.now - timedelta(days=31))['next_cursor']
+        with self.assertRaises(sync.CursorExpired):
+            sync.changes(self.user, cursor, now=self.now)
+
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('cards:sync_cards'), {'cursor': cursor})
+        self.assertEqual(response.status_code, 410)
+        self.assertTrue(response.json()['resync'])
+
+    def test_idle_cursor_stays_fresh(self):
+        # Клиент синхронизируется каждые 20 дней, а удалений всё нет
+        cursor = sync.changes(self.user, now=self.now - timedelta(days=40))['next_cursor']
+        cursor = sync.changes(self.user, cursor, now=self.now - timedelta(days=20))['next_cursor']
+        page = sync.changes(self.user, cursor, now=self.now)
+        self.assertEqual(page['deleted'], [])
@@ -0,0 +1,93 @@
+import shutil
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from cards import tts
+
+
+class CountingBackend(tts.SilentBackend):
+    def __init__(self):
+        self.calls = 0
+
+    def synthesize(self, text, lang):
+        self.calls += 1
+        return self.FRAME
+
+
+class TTSCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='tts-test-')
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.backend = CountingBackend()
+        self.cache = tts.TTSCache(self.directory, 10 * 1024 * 1024, self.backend)
+
+    def test_synthesizes_once_per_word(self):
+        path, key = self.cache.get('cat')
+        again, same_key = self.cache.get('cat')
+        self.assertEqual((path, key), (again, same_key))
+        self.assertEqual(self.backend.calls, 1)
+        self.assertEqual(path.read_bytes(), tts.SilentBackend.FRAME)
+        self.assertNotEqual(self.cache.key('cat', 'en'), self.cache.key('cat', 'fr'))
+
+    def test_evicts_least_recently_used(self):
+        frame = len(tts.SilentBackend.FRAME)
+        cache = tts.TTSCache(self.directory, frame * 3, self.backend)
+        for word in ('one', 'two', 'three', 'four'):
+            cache.get(word)
+        files = list(Path(self.directory).glob('*/*.mp3'))
+        self.assertLessEqual(sum(p.stat().st_size for p in files), frame * 3)
+        self.assertFalse(cache.path_for(cache.key('one', 'en')).exists())
+
+    def test_open_file_regenerates_evicted_file(self):
+        path, _ = self.cache.get('cat')
+        real_get = self.cache.get
+
+        def get_then_evict(text, lang='en'):
+            # Вытеснение между get() и открытием файла
+            result = real_get(text, lang)
+            if self.backend.calls == 1:
+                path.unlink()
+            return result
+
+        with mock.patch.object(self.cache, 'get', side_effect=get_then_evict):
+            audio, key = self.cache.open_file('cat')
+        with audio:
+            self.assertEqual(audio.read(), tts.SilentBackend.FRAME)
+        self.assertEqual(self.backend.calls, 2)
+
+
+class SayWordViewTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp(prefix='tts-view-')
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        settings = override_settings(TTS_BACKEND='cards.tts.SilentBackend', TTS_CACHE_DIR=directory)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        tts._cache = None
+        self.addCleanup(setattr, tts, '_cache', None)
+
+    def test_serves_audio_with_etag(self):
+        response = self.client.get('/say/cat/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'audio/mpeg')
+        self.assertEqual(b''.join(response.streaming_content), tts.SilentBackend.FRAME)
+        self.assertEqual(response['ETag'], f'"{tts.TTSCache.key("cat", "en")}"')
+
+    def test_if_none_match_returns_304(self):
+        etag = f'"{tts.TTSCache.key("cat", "en")}"'
+        for header in (etag, f'"other", {etag}', f'W/{etag}'):
+            with self.subTest(header=header):
+                response = self.client.get('/say/cat/', HTTP_IF_NONE_MATCH=header)
+                self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.client.get('/say/cat/', HTTP_IF_NONE_MATCH='"other"').status_code, 200)
+
+    def test_evicted_file_is_regenerated(self):
+        self.client.get('/say/cat/')
+        cache = tts.get_cache()
+        cache.path_for(cache.key('cat', 'en')).unlink()
+        response = self.client.get('/say/cat/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), tts.SilentBackend.FRAME)
@@ -0,0 +1,256 @@
+import warnings
+from datetime import timedelta
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache.backends.base import CacheKeyWarning
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from cards.cache import card_cache
+from cards.models import Card, ReviewLog, Schedule, UserStats
+from cards.reviewlog import review_log
+
+
+class ReviewAnswerTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('learner', password='secret')
+        UserStats.objects.create(user=self.user)
+        self.card = Card.objects.create(owner=self.user, word='cat', translation='кот')
+        self.schedule = Schedule.objects.create(card=self.card, interval=4)
+        self.client.force_login(self.user)
+
+    def answer(self, difficulty, card_id=None):
+        return self.client.get(reverse('cards:review_answer', args=[card_id or self.card.id, difficulty]))
+
+    def test_known_difficulty(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.answer('good')
+        self.assertRedirects(response, reverse('cards:review'), fetch_redirect_response=False)
+        self.schedule.refresh_from_db()
+        self.assertEqual((self.schedule.interval, self.schedule.repetitions), (10, 1))
+        review_log.flush()
+        self.assertEqual(ReviewLog.objects.get().rating, 'good')
+
+    def test_unknown_difficulty(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.answer('bogus')
+        self.assertEqual(response.status_code, 404)
+        self.schedule.refresh_from_db()
+        self.assertEqual((self.schedule.interval, self.schedule.repetitions), (4, 0))
+        review_log.flush()
+        self.assertFalse(ReviewLog.objects.exists())
+
+    def test_foreign_card(self):
+        other = User.objects.create_user('other')
+        card = Card.objects.create(owner=other, word='dog', translation='собака')
+        Schedule.objects.create(card=card)
+        self.assertEqual(self.answer('good', card.id).status_code, 404)
+
+
+
+class ReviewBatchTests(TestCase):
+    url = reverse('cards:review_batch')
+
+    def setUp(self):
+        self.user = User.objects.create_user('learner')
+        UserStats.objects.create(user=self.user)
+        self.card = Card.objects.create(owner=self.user, word='cat', translation='кот')
+        Schedule.objects.create(card=self.card)
+        self.client.force_login(self.user)
+
+    def post(self, body):
+        return self.client.post(self.url, body, content_type='application/json')
+
+    def test_infinite_latency(self):
+        for value in ('1e400', '-1e400'):
+            with self.subTest(value):
+                body = '{"reviews": [{"card_id": %d, "difficulty": "good", "latency_ms": %s}]}' % (self.card.id, value)
+                response = self.post(body)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json()['errors'][0]['index'], 0)
+        self.assertEqual(Schedule.objects.get(card=self.card).repetitions, 0)
+
+    def test_huge_card_id(self):
+        response = self.post('{"reviews": [{"card_id": 1e400, "difficulty": "good"}]}')
+        self.assertEqual(response.status_code, 400)
+
+    def test_latency_clamped(self):
+        body = '{"reviews": [{"card_id": %d, "difficulty": "good", "latency_ms": 1e30}]}' % self.card.id
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.post(body).json(), {'applied': 1, 'missing': []})
+        review_log.flush()
+        self.assertEqual(ReviewLog.objects.get().latency_ms, 2 ** 31 - 1)
+
+
+class MetricsAccessTests(TestCase):
+    url = reverse('cards:metrics')
+
+    def test_closed_by_default(self):
+        # Даже с localhost: за прокси так выглядит любой запрос
+        self.assertEqual(self.client.get(self.url, REMOTE_ADDR='127.0.0.1').status_code, 404)
+        self.client.force_login(User.objects.create_user('learner'))
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_staff(self):
+        self.client.force_login(User.objects.create_user('admin', is_staff=True))
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'linguatrack_request_duration_seconds', response.content)
+
+    @override_settings(METRICS_TOKEN='s3cret')
+    def test_token(self):
+        self.assertEqual(self.client.get(self.url, HTTP_AUTHORIZATION='Bearer s3cret').status_code, 200)
+        self.assertEqual(self.client.get(self.url, HTTP_AUTHORIZATION='Bearer wrong').status_code, 404)
+        self.assertEqual(self.client.get(self.url, HTTP_AUTHORIZATION='Bearer ').status_code, 404)
+
+    @override_settings(METRICS_ALLOWED_IPS=['10.0.0.5'])
+    def test_allowed_ip(self):
+        self.assertEqual(self.client.get(self.url, REMOTE_ADDR='10.0.0.5').status_code, 200)
+        self.assertEqual(self.client.get(self.url, REMOTE_ADDR='10.0.0.6').status_code, 404)
+
+
+class CardListCacheKeyTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('learner')
+        UserStats.objects.create(user=self.user)
+        Card.objects.create(owner=self.user, word='ice cream', translation='мороженое')
+        self.client.force_login(self.user)
+
+    def test_user_text_is_hashed_in_keys(self):
+        keys = []
+        original = card_cache.cache.set
+
+        def record(key, *args, **kwargs):
+            keys.append(key)
+            return original(key, *args, **kwargs)
+
+        with mock.patch.object(card_cache.cache, 'set', side_effect=record), warnings.catch_warnings():
+            warnings.simplefilter('error', CacheKeyWarning)
+            response = self.client.get(reverse('cards:card_list'), {'q': 'мороженое ' * 40})
+            self.assertContains(response, 'ice cream')
+            self.client.get(reverse('cards:card_list'), {'cursor': 'not a cursor ё'})
+
+        self.assertTrue(keys)
+        for key in keys:
+            self.assertLessEqual(len(key), 250)
+            self.assertTrue(key.isascii() and ' ' not in key, key)
+
+
+class AddCardTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('learner')
+        UserStats.objects.create(user=self.user)
+        self.client.force_login(self.user)
+
+    def add(self, **fields):
+        return self.client.post(reverse('cards:add_card'), {'translation': 'мороженое', **fields}, follow=True)
+
+    def test_existing_word_keeps_example_and_note(self):
+        self.add(word='Ice cream', example='I like ice cream', note='неисчисляемое')
+        response = self.add(word='  ICE cream ', translation='пломбир')
+
+        card = Card.objects.get(owner=self.user)
+        self.assertEqual(card.translation, 'пломбир')
+        self.assertEqual((card.example, card.note), ('I like ice cream', 'неисчисляемое'))
+        self.assertContains(response, 'уже было в колоде')
+
+    def test_new_word_without_notice(self):
+        response = self.add(word='cake')
+        self.assertNotContains(response, 'уже было в колоде')
+        self.add(word='cake', example='a piece of cake')
+        self.assertEqual(Card.objects.get(owner=self.user).example, 'a piece of cake')
+
+
+class DashboardTests(TestCase):
+    def setUp(self):
+        card_cache.cache.clear()
+        self.addCleanup(card_cache.cache.clear)
+        self.user = User.objects.create_user('learner')
+        UserStats.objects.create(user=self.user)
+        self.now = timezone.now()
+        for word, level, next_review in [
+            ('cat', 'beginner', self.now - timedelta(days=1)),
+            ('dog', 'beginner', self.now + timedelta(days=2)),
+            ('whale', 'intermediate', self.now + timedelta(hours=3)),
+            ('ostrich', 'advanced', self.now - timedelta(hours=1)),
+        ]:
+            card = Card.objects.create(owner=self.user, word=word, translation='-', level=level)
+            Schedule.objects.create(card=card, next_review=next_review)
+        other = User.objects.create_user('other')
+        Card.objects.create(owner=other, word='cat', translation='-')
+        self.client.force_login(self.user)
+
+    def dashboard(self, **params):
+        with CaptureQueriesContext(connection) as queries:
+            context = self.client.get(reverse('cards:card_list'), params).context
+        aggregates = [query for query in queries if 'COUNT(' in query['sql']]
+        self.assertEqual(len(aggregates), 1)
+        return {name: context[name] for name in (
+            'total_cards', 'beginner_count', 'intermediate_count', 'advanced_count', 'due_count', 'next_review'
+        )}
+
+    def test_counts_in_one_query(self):
+        self.assertEqual(self.dashboard(), {
+            'total_cards': 4, 'beginner_count': 2, 'intermediate_count': 1, 'advanced_count': 1,
+            'due_count': 2, 'next_review': self.now + timedelta(hours=3),
+        })
+
+    def test_level_filter(self):
+        stats = self.dashboard(level='beginner')
+        self.assertEqual(
+            (stats['total_cards'], stats['beginner_count'], stats['intermediate_count']), (2, 2, 0)
+        )
+
+
+class ReviewQueueTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('learner')
+        UserStats.objects.create(user=self.user)
+        now = timezone.now()
+        self.due = []
+        for i in range(5):
+            card = Card.objects.create(owner=self.user, word=f'due{i}', translation='-')
+            Schedule.objects.create(card=card, next_review=now - timedelta(hours=5 - i))
+            self.due.append(card.id)
+        later = Card.objects.create(owner=self.user, word='later', translation='-')
+        Schedule.objects.create(card=later, next_review=now + timedelta(days=1))
+        other = User.objects.create_user('other')
+        foreign = Card.objects.create(owner=other, word='foreign', translation='-')
+        Schedule.objects.create(card=foreign, next_review=now - timedelta(days=1))
+        self.client.force_login(self.user)
+
+    def queue(self, **params):
+        response = self.client.get(reverse('cards:review_queue'), params)
+        self.assertEqual(response.status_code, 200)
+        return [card['id'] for card in response.json()['cards']]
+
+    def test_due_cards_oldest_first(self):
+        self.assertEqual(self.queue(), self.due)
+
+    def test_excludes_client_buffer(self):
+        buffered = self.due[:2] + [self.due[3]]
+        self.assertEqual(self.queue(exclude=','.join(map(str, buffered))), [self.due[2], self.due[4]])
+
+    def test_limit(self):
+        self.assertEqual(self.queue(limit=2), self.due[:2])
+        self.assertEqual(self.queue(limit=-1), [])
+        # Больше 100 за раз не отдаём, сколько ни попроси
+        Card.objects.upsert(self.user.id, [Card(word=f'bulk{i}', translation='-') for i in range(120)])
+        self.assertEqual(len(self.queue(limit=1000)), 100)
+
+    def test_bad_params(self):
+        for params in ({'limit': 'many'}, {'exclude': '1,x'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(reverse('cards:review_queue'), params).status_code, 400)
+
+    def test_anonymous_redirected_to_login(self):
+        self.client.logout()
+        response = self.client.get(reverse('cards:review_queue'))
+        self.assertRedirects(
+            response, f"{settings.LOGIN_URL}?next={reverse('cards:review_queue')}", fetch_redirect_response=False
+        )
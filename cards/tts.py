@@ -0,0 +1,192 @@
+# cards/tts.py
+
+import hashlib
+import io
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+# --- Бэкенды синтеза ---
+
+class GTTSBackend:
+    """Google TTS — бэкенд по умолчанию (нужен доступ в интернет)."""
+
+    def synthesize(self, text, lang):
+        from gtts import gTTS
+
+        audio_io = io.BytesIO()
+        gTTS(text=text, lang=lang).write_to_fp(audio_io)
+        return audio_io.getvalue()
+
+
+class SilentBackend:
+    """
+    Офлайн-заглушка для тестов и разработки: детерминированный короткий
+    MP3 без обращения к сети.
+    """
+
+    # Один пустой MPEG-1 Layer III фрейм (128 кбит/с, 44.1 кГц)
+    FRAME = b'\xff\xfb\x90\x00' + b'\x00' * 413
+
+    def synthesize(self, text, lang):
+        return self.FRAME
+
+
+# --- Кэш на диске ---
+
+class TTSCache:
+    """
+    Кэш озвучки по содержимому: ключ — sha256 от (язык, текст), файл
+    лежит в <dir>/<ab>/<ключ>.mp3. Общий для сайта и бота.
+
+    - LRU: при чтении файл «трогается», при превышении лимита удаляются
+      самые давно использованные;
+    - single-flight: одновременные запросы одного слова ждут один синтез.
+    """
+
+    def __init__(self, directory, max_bytes, backend):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.backend = backend
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._size = None
+
+    @staticmethod
+    def key(text, lang):
+        return hashlib.sha256(f"{lang}\0{text}".encode('utf-8')).hexdigest()
+
+    def path_for(self, key):
+        return self.directory / key[:2] / f"{key}.mp3"
+
+    def get(self, text, lang='en'):
+        """
+        Возвращает (путь к mp3, ключ). Синтезирует только при промахе.
+        """
+        key = self.key(text, lang)
+        path = self.path_for(key)
+        if self._touch(path):
+            return path, key
+
+        with self._lock:
+            event = self._inflight.get(key)
+            leader = event is None
+            if leader:
+                event = self._inflight[key] = threading.Event()
+
+        if not leader:
+            event.wait()
+            if path.exists():
+                return path, key
+            # Синтез у «ведущего» не удался — пробуем сами
+            return self._synthesize(text, lang, path), key
+
+        try:
+            # Пока ждали блокировку, файл мог записать предыдущий «ведущий»
+            if self._touch(path):
+                return path, key
+            return self._synthesize(text, lang, path), key
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            event.set()
+
+    def open_file(self, text, lang='en', attempts=3):
+        """
+        Как get(), но возвращает (открытый файл, ключ). Между get() и открытием
+        файл может удалить вытеснение LRU — в этом или другом процессе; тогда
+        синтезируем заново. Открытый файл переживает удаление с диска.
+        """
+        for _ in range(attempts - 1):
+            path, key = self.get(text, lang)
+            try:
+                return open(path, 'rb'), key
+            except FileNotFoundError:
+                continue
+        path, key = self.get(text, lang)
+        return open(path, 'rb'), key
+
+    def _touch(self, path):
+        try:
+            os.utime(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _synthesize(self, text, lang, path):
+        data = self.backend.synthesize(text, lang)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Пишем во временный файл и атомарно переименовываем —
+        # второй процесс (бот/сайт) не увидит недописанный mp3
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as tmp:
+            tmp.write(data)
+        os.replace(tmp_path, path)
+
+        self._account(len(data))
+        return path
+
+    def _account(self, added):
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan_size()
+            else:
+                self._size += added
+            if self._size <= self.max_bytes:
+                return
+            self._size = self._evict()
+
+    def _scan_size(self):
+        return sum(p.stat().st_size for p in self.directory.glob('*/*.mp3'))
+
+    def _evict(self):
+        """
+        Удаляет самые старые по mtime файлы, пока кэш не станет меньше 90% лимита.
+        """
+        entries = []
+        for p in self.directory.glob('*/*.mp3'):
+            try:
+                stat = p.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, p))
+        entries.sort()
+
+        total = sum(size for _, size, _ in entries)
+        target = int(self.max_bytes * 0.9)
+        for _, size, p in entries:
+            if total <= target:
+                break
+            try:
+                p.unlink()
+                total -= size
+            except FileNotFoundError:
+                pass
+        return total
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """
+    Общий экземпляр кэша, настроенный из settings.TTS_*.
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                backend = import_string(settings.TTS_BACKEND)()
+                _cache = TTSCache(settings.TTS_CACHE_DIR, settings.TTS_CACHE_MAX_BYTES, backend)
+    return _cache
+
+
+def open_audio(text, lang='en'):
+    return get_cache().open_file(text, lang)
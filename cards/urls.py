@@ -21,11 +21,22 @@ urlpatterns = [
     # Режим повторения
     path('review/', views.review, name='review'),
     path('review/<int:card_id>/answer/<str:difficulty>/', views.review_answer, name='review_answer'),
+    path('review/queue/', views.review_queue, name='review_queue'),
+    path('api/reviews/', views.review_batch, name='review_batch'),
 
     # Экспорт и импорт
     path('export/', views.export_cards, name='export_cards'),
     path('import/', views.import_cards, name='import_cards'),
+    path('api/cards/', views.card_batch, name='card_batch'),
+    path('api/sync/', views.sync_cards, name='sync_cards'),
+    path('api/search/', views.search_cards, name='search_cards'),
 
     # Озвучка
     path('say/<str:word>/', views.say_word, name='say_word'),
+
+    # Статистика кэша (для персонала)
+    path('cache/stats/', views.cache_stats, name='cache_stats'),
+
+    # Метрики для Prometheus
+    path('metrics', views.metrics, name='metrics'),
 ]
\ No newline at end of file
@@ -1,14 +1,23 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth import login
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import UserCreationForm
-from django.http import HttpResponse
+from django.db import IntegrityError
+from django.db.models import Count, Min, Q
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.http import etag, require_POST
 from django.contrib.auth.models import User
-from .models import Card, Schedule, UserStats
+from . import batch, exporters, importers, metrics as metrics_registry, search, sync, tts
+from .cache import card_cache
+from .models import Card, Schedule, UserStats, DIFFICULTIES, REVIEW_SOURCES, normalize_word
+from .pagination import PAGE_SIZE, keyset_page
+import hmac
 import json
-from gtts import gTTS
-import io
 
 
 def home(request):
@@ -33,38 +42,54 @@ def register(request):
 @login_required
 def card_list(request):
     level = request.GET.get('level')
+    cursor = request.GET.get('cursor')
+    query = request.GET.get('q', '').strip()
     cards = Card.objects.filter(owner=request.user)
+    level_filter = Q()
+    level_key = ''
     if level in ['beginner', 'intermediate', 'advanced']:
         cards = cards.filter(level=level)
+        level_filter = Q(level=level)
+        level_key = level
 
-    # 🔁 Единая логика для карточек на повторении
+    # 📊 Все счётчики дашборда — одним запросом с условной агрегацией
     now = timezone.now()
-    due_cards = Card.objects.filter(
-        owner=request.user,
-        schedule__next_review__lte=now
-    )
-    due_count = due_cards.count()
-
-    total_cards = cards.count()
-    beginner_count = cards.filter(level='beginner').count()
-    intermediate_count = cards.filter(level='intermediate').count()
-    advanced_count = cards.filter(level='advanced').count()
 
-    # Ближайшее будущее повторение
-    next_card = Card.objects.filter(
-        owner=request.user,
-        schedule__next_review__gt=now
-    ).order_by('schedule__next_review').first()
+    def dashboard():
+        return Card.objects.filter(owner=request.user).aggregate(
+            total_cards=Count('id', filter=level_filter),
+            beginner_count=Count('id', filter=level_filter & Q(level='beginner')),
+            intermediate_count=Count('id', filter=level_filter & Q(level='intermediate')),
+            advanced_count=Count('id', filter=level_filter & Q(level='advanced')),
+            due_count=Count('id', filter=Q(schedule__next_review__lte=now)),
+            # Ближайшее будущее повторение
+            next_review=Min('schedule__next_review', filter=Q(schedule__next_review__gt=now)),
+        )
+
+    # Счётчики и страницы берутся из кэша, пока карточки пользователя не менялись
+    stats = card_cache.get_or_compute(request.user.id, 'dashboard', dashboard, level_key)
+
+    if query:
+        # Поиск — лучшие совпадения по релевантности, одной страницей
+        page = card_cache.get_or_compute(
+            request.user.id, 'search', lambda: search.search(request.user.id, query, PAGE_SIZE, level_key),
+            level_key, query
+        )
+        next_cursor = None
+    else:
+        # Список — по страницам с курсором (created_at, id), без OFFSET
+        page, next_cursor = card_cache.get_or_compute(
+            request.user.id, 'cards', lambda: keyset_page(cards, cursor), level_key, cursor or ''
+        )
 
     context = {
-        'cards': cards,
-        'due_count': due_count,
-        'total_cards': total_cards,
-        'beginner_count': beginner_count,
-        'intermediate_count': intermediate_count,
-        'advanced_count': advanced_count,
-        'next_review': next_card.schedule.next_review if next_card else None,
+        'cards': page,
+        'next_cursor': next_cursor,
+        'is_first_page': not cursor,
+        'level': level,
+        'query': query,
         'current_time': now,
+        **stats,
     }
 
     return render(request, 'cards/card_list.html', context)
@@ -80,15 +105,23 @@ def add_card(request):
         level = request.POST.get('level', 'beginner')
 
         if word and translation:
-            card = Card.objects.create(
-                owner=request.user,
+            # Слово уже есть в колоде — обновляем его, а не заводим дубликат.
+            # Пустые пример и заметка из формы не стирают сохранённые
+            existing = Card.objects.filter(
+                owner=request.user, word_key=normalize_word(word)
+            ).only('example', 'note').first()
+            if existing:
+                example = example or existing.example
+                note = note or existing.note
+            [card], inserted = Card.objects.upsert(request.user.id, [Card(
                 word=word,
                 translation=translation,
                 example=example,
                 note=note,
                 level=level
-            )
-            Schedule.objects.create(card=card)
+            )])
+            if not inserted:
+                messages.info(request, f"Слово «{card.word}» уже было в колоде — карточка обновлена.")
             return redirect('cards:card_list')
     return render(request, 'cards/card_form.html')
 
@@ -102,7 +135,12 @@ def edit_card(request, card_id):
         card.example = request.POST.get('example', '')
         card.note = request.POST.get('note', '')
         card.level = request.POST.get('level', 'beginner')
-        card.save()
+        try:
+            card.save()
+        except IntegrityError:
+            return render(request, 'cards/card_form.html', {
+                'card': card, 'error': "Такое слово уже есть в колоде."
+            })
         return redirect('cards:card_list')
     return render(request, 'cards/card_form.html', {'card': card})
 
@@ -119,65 +157,245 @@ def delete_card(request, card_id):
     return render(request, 'cards/delete_confirm.html', {'card': card})
 
 
+# Содержимое определяется словом: ETag известен без синтеза, и на
+# If-None-Match (в любой форме, со списком или W/) отвечаем 304 сразу
+@etag(lambda request, word: tts.TTSCache.key(word, 'en'))
 def say_word(request, word):
     try:
-        tts = gTTS(text=word, lang='en')
-        audio_io = io.BytesIO()
-        tts.write_to_fp(audio_io)
-        audio_io.seek(0)
-        response = HttpResponse(audio_io.read(), content_type='audio/mpeg')
-        response['Content-Disposition'] = f'inline; filename="{word}.mp3"'
-        return response
+        audio, key = tts.open_audio(word)
     except Exception as e:
         return HttpResponse("Error", status=500)
 
+    response = FileResponse(audio, content_type='audio/mpeg')
+    response['Content-Disposition'] = f'inline; filename="{word}.mp3"'
+    response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+
+# Сколько карточек сессия повторения держит в буфере на клиенте
+REVIEW_PREFETCH = 20
+
+
+def _review_payload(card):
+    return {
+        'id': card.id,
+        'word': card.word,
+        'translation': card.translation,
+        'example': card.example or '',
+        'note': card.note or '',
+        'level': card.get_level_display(),
+    }
+
 
 @login_required
 def review(request):
-    # 🔁 Точная и единая проверка
-    now = timezone.now()
-    due_cards = Card.objects.filter(
-        owner=request.user,
-        schedule__next_review__lte=now
-    ).order_by('schedule__next_review')
+    # Одна выборка по индексу (owner, next_review): сразу пачка карточек для буфера
+    due = Card.objects.next_due(request.user, limit=REVIEW_PREFETCH)
+    if not due:
+        return render(request, 'cards/review_done.html')
 
-    # 🔍 Отладка (временно — можно убрать)
-    print(f"[DEBUG] Текущее время: {now}")
-    for card in due_cards:
-        print(f"[DEBUG] На повторении: {card.word} → {card.schedule.next_review}")
+    return render(request, 'cards/review.html', {
+        'card': due[0],
+        'queue': [_review_payload(card) for card in due],
+        'prefetch': REVIEW_PREFETCH,
+    })
 
-    if not due_cards.exists():
-        return render(request, 'cards/review_done.html')
 
-    card = due_cards.first()
-    return render(request, 'cards/review.html', {'card': card})
+@login_required
+def review_queue(request):
+    """
+    Следующие due-карточки для буфера сессии повторения.
+    ?exclude=1,2,3 — карточки, которые уже у клиента или ответ по ним ещё в пути.
+    """
+    try:
+        limit = min(int(request.GET.get('limit', REVIEW_PREFETCH)), 100)
+        exclude = [int(i) for i in request.GET.get('exclude', '').split(',') if i]
+    except ValueError:
+        return JsonResponse({'error': 'limit и exclude — числа'}, status=400)
+
+    schedules = Schedule.objects.due(request.user)
+    if exclude:
+        schedules = schedules.exclude(card_id__in=exclude)
+    cards = [schedule.card for schedule in schedules[:max(limit, 0)]]
+    return JsonResponse({'cards': [_review_payload(card) for card in cards]})
 
 
 @login_required
 def review_answer(request, card_id, difficulty):
-    card = get_object_or_404(Card, id=card_id, owner=request.user)
-    schedule = card.schedule
-    schedule.update_schedule(difficulty)
-
-    user_stats = request.user.userstats
-    user_stats.last_reviewed = timezone.now()
-    user_stats.review_streak += 1
-    user_stats.save()
+    # Иначе sm2_step молча сбросит интервал до 1 дня и запишет мусор в журнал
+    if difficulty not in DIFFICULTIES:
+        raise Http404("Неизвестная оценка")
+    _, missing = Schedule.objects.apply_reviews(
+        request.user.id, [(card_id, difficulty, timezone.now())], source='web'
+    )
+    if missing:
+        raise Http404("Карточка не найдена")
 
     return redirect('cards:review')
 
 
+# Сколько оценок принимаем за один запрос
+MAX_REVIEW_BATCH = 500
+
+# Потолок latency_ms — верхняя граница IntegerField
+MAX_LATENCY_MS = 2 ** 31 - 1
+
+
 @login_required
-def export_cards(request):
-    cards = Card.objects.filter(owner=request.user).values(
-        'word', 'translation', 'example', 'note', 'level'
+@require_POST
+def review_batch(request):
+    """
+    Пакетная отправка оценок (бот, офлайн-клиенты):
+    {"source": "api", "reviews": [{"card_id": 1, "difficulty": "good",
+                                   "reviewed_at": "2025-09-01T10:00:00Z", "latency_ms": 2300}, ...]}
+    reviewed_at и latency_ms необязательны; reviewed_at по умолчанию — время запроса.
+    """
+    try:
+        body = json.loads(request.body)
+        items = body['reviews']
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': 'Ожидается JSON с полем reviews'}, status=400)
+    source = body.get('source', 'api')
+    if source not in dict(REVIEW_SOURCES):
+        return JsonResponse({'error': 'Неизвестный source'}, status=400)
+    if not isinstance(items, list) or len(items) > MAX_REVIEW_BATCH:
+        return JsonResponse({'error': f'reviews — список до {MAX_REVIEW_BATCH} оценок'}, status=400)
+
+    now = timezone.now()
+    ratings = []
+    errors = []
+    for index, item in enumerate(items):
+        try:
+            card_id = int(item['card_id'])
+            difficulty = item['difficulty']
+            if difficulty not in DIFFICULTIES:
+                raise ValueError(f"difficulty: {', '.join(DIFFICULTIES)}")
+            reviewed_at = now
+            if item.get('reviewed_at'):
+                reviewed_at = parse_datetime(item['reviewed_at'])
+                if reviewed_at is None:
+                    raise ValueError("некорректный reviewed_at")
+                if timezone.is_naive(reviewed_at):
+                    reviewed_at = timezone.make_aware(reviewed_at)
+                # Оценки «из будущего» не принимаем
+                reviewed_at = min(reviewed_at, now)
+            latency_ms = item.get('latency_ms')
+            if latency_ms is not None:
+                # 1e400 из JSON — это inf, и int() бросит OverflowError
+                latency_ms = min(max(int(latency_ms), 0), MAX_LATENCY_MS)
+        except (KeyError, TypeError, ValueError, OverflowError) as e:
+            errors.append({'index': index, 'error': str(e)})
+            continue
+        ratings.append((card_id, difficulty, reviewed_at, latency_ms))
+
+    # Все оценки проверяются до записи: пакет применяется целиком или не применяется
+    if errors:
+        return JsonResponse({'applied': 0, 'errors': errors}, status=400)
+
+    applied, missing = Schedule.objects.apply_reviews(request.user.id, ratings, source=source)
+    return JsonResponse({'applied': applied, 'missing': missing})
+
+
+@login_required
+@require_POST
+def card_batch(request):
+    """
+    Пакетное управление карточками:
+    {"create": [{"word": "cat", "translation": "кот", ...}, ...],
+     "update": [{"id": 5, "translation": "кошка"}, ...],
+     "delete": [7, 8]}
+    Пакет проверяется целиком и применяется одной транзакцией.
+    """
+    try:
+        payload = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'error': 'Ожидается JSON'}, status=400)
+
+    result = batch.apply_batch(request.user, payload)
+    if result.errors:
+        return JsonResponse({'errors': result.errors}, status=400)
+    return JsonResponse({
+        'created': result.created,
+        'updated': result.updated,
+        'deleted': result.deleted,
+        'missing': result.missing,
+    })
+
+
+@login_required
+def sync_cards(request):
+    """
+    Инкрементальная синхронизация: ?cursor=...&limit=500.
+    Отдаёт изменённые карточки, расписания и id удалённых карточек
+    после курсора; клиент запрашивает next_cursor, пока has_more.
+    """
+    try:
+        limit = min(max(int(request.GET.get('limit', sync.SYNC_PAGE_SIZE)), 1), sync.MAX_SYNC_PAGE_SIZE)
+        result = sync.changes(request.user, request.GET.get('cursor'), limit)
+    except sync.CursorExpired as e:
+        # 410: клиент сбрасывает локальные данные и синхронизируется без курсора
+        return JsonResponse({'error': str(e), 'resync': True}, status=410)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse(result)
+
+
+@login_required
+def search_cards(request):
+    """
+    Поиск по своим карточкам: ?q=...&level=...&limit=20.
+    Ищет по началу слов в слове, переводе, примере и примечании,
+    без учёта регистра и диакритики; лучшие совпадения — первыми.
+    """
+    query = request.GET.get('q', '').strip()
+    try:
+        limit = min(max(int(request.GET.get('limit', search.SEARCH_LIMIT)), 1), search.MAX_SEARCH_LIMIT)
+    except ValueError:
+        return JsonResponse({'error': 'limit должен быть числом'}, status=400)
+    level = request.GET.get('level')
+    if level not in ('beginner', 'intermediate', 'advanced'):
+        level = None
+
+    cards = search.search(
+        request.user.id, query, limit, level,
+        fields=('id', 'word', 'translation', 'example', 'note', 'level')
     )
-    data = list(cards)
-    response = HttpResponse(
-        json.dumps(data, ensure_ascii=False, indent=2),
-        content_type='application/json'
+    return JsonResponse({'results': [
+        {
+            'id': card.id,
+            'word': card.word,
+            'translation': card.translation,
+            'example': card.example,
+            'note': card.note,
+            'level': card.level,
+        }
+        for card in cards
+    ]})
+
+
+@login_required
+def export_cards(request):
+    """
+    Потоковый экспорт: ?format=json|ndjson|csv, &schedule=1 — с расписанием
+    (полный бэкап), &gzip=1 — со сжатием.
+    """
+    fmt = request.GET.get('format', 'json')
+    if fmt not in exporters.FORMATS:
+        fmt = 'json'
+    with_schedule = request.GET.get('schedule') == '1'
+    compress = request.GET.get('gzip') == '1'
+
+    content_type, extension = exporters.FORMATS[fmt]
+    filename = f"my_cards.{extension}"
+    if compress:
+        content_type = 'application/gzip'
+        filename += '.gz'
+
+    response = StreamingHttpResponse(
+        exporters.export_stream(request.user, fmt, with_schedule, compress),
+        content_type=content_type
     )
-    response['Content-Disposition'] = 'attachment; filename="my_cards.json"'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
     return response
 
 
@@ -185,22 +403,50 @@ def export_cards(request):
 def import_cards(request):
     if request.method == 'POST' and request.FILES.get('file'):
         file = request.FILES['file']
+        fmt = importers.detect_format(file.name, request.POST.get('format'))
         try:
-            data = json.loads(file.read().decode('utf-8'))
-            imported = 0
-            for item in data:
-                Card.objects.get_or_create(
-                    owner=request.user,
-                    word=item['word'],
-                    defaults={
-                        'translation': item['translation'],
-                        'example': item.get('example', ''),
-                        'note': item.get('note', ''),
-                        'level': item.get('level', 'beginner')
-                    }
-                )
-                imported += 1
-            return render(request, 'cards/import_success.html', {'imported': imported})
-        except Exception as e:
+            result = importers.import_cards(request.user, file, fmt)
+        except importers.READ_ERRORS as e:
             return render(request, 'cards/import_error.html', {'error': str(e)})
-    return render(request, 'cards/import_form.html')
\ No newline at end of file
+        return render(request, 'cards/import_success.html', {
+            'imported': result.inserted,
+            'updated': result.updated,
+            'skipped': result.skipped,
+            'invalid': result.invalid,
+            'errors': result.errors,
+            'stopped_after': result.stopped_after,
+            'stopped_error': result.stopped_error,
+        })
+    return render(request, 'cards/import_form.html')
+
+
+@staff_member_required
+def cache_stats(request):
+    """
+    Попадания и промахи кэша карточек в этом процессе — для подбора таймаутов.
+    """
+    return JsonResponse({
+        'backend': card_cache.cache.__class__.__name__,
+        'timeout': card_cache.timeout,
+        'stats': card_cache.stats(),
+    })
+
+
+def _metrics_allowed(request):
+    if request.user.is_staff:
+        return True
+    token = settings.METRICS_TOKEN
+    header = request.headers.get('Authorization', '')
+    if token and hmac.compare_digest(header.encode(), f'Bearer {token}'.encode()):
+        return True
+    return request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS
+
+
+def metrics(request):
+    """
+    Метрики процесса в формате Prometheus: персоналу, по METRICS_TOKEN
+    или с адресов METRICS_ALLOWED_IPS (см. настройки — про обратный прокси).
+    """
+    if not _metrics_allowed(request):
+        raise Http404
+    return HttpResponse(metrics_registry.render(), content_type=metrics_registry.CONTENT_TYPE)
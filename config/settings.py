@@ -48,6 +48,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'cards.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -80,10 +81,36 @@ WSGI_APPLICATION = 'config.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Профили SQLite. Сайт и бот пишут в один файл из разных процессов:
+# в production включаем WAL (читатели не блокируют писателя), ожидание
+# блокировки вместо мгновенного «database is locked» и BEGIN IMMEDIATE —
+# транзакция сразу берёт блокировку на запись и не упирается в неё на полпути.
+SQLITE_PROFILES = {
+    'default': {},
+    'production': {
+        'OPTIONS': {
+            'init_command': ';'.join([
+                'PRAGMA journal_mode=WAL',
+                'PRAGMA synchronous=NORMAL',
+                f"PRAGMA busy_timeout={int(os.getenv('DB_BUSY_TIMEOUT_MS', '5000'))}",
+                'PRAGMA mmap_size=134217728',
+                'PRAGMA cache_size=-20000',
+                'PRAGMA temp_store=MEMORY',
+            ]),
+            'transaction_mode': 'IMMEDIATE',
+        },
+        # Постоянные соединения: прагмы и кэш страниц не теряются между запросами
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '600')),
+        'CONN_HEALTH_CHECKS': True,
+    },
+}
+DB_PROFILE = os.getenv('DB_PROFILE', 'default')
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        **SQLITE_PROFILES[DB_PROFILE],
     }
 }
 
@@ -129,5 +156,51 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Озвучка: бэкенд синтеза и общий кэш mp3 для сайта и бота
+# Для тестов/офлайна: TTS_BACKEND=cards.tts.SilentBackend
+TTS_BACKEND = os.getenv('TTS_BACKEND', 'cards.tts.GTTSBackend')
+TTS_CACHE_DIR = os.getenv('TTS_CACHE_DIR', str(BASE_DIR / 'tts_cache'))
+TTS_CACHE_MAX_BYTES = int(os.getenv('TTS_CACHE_MAX_MB', '200')) * 1024 * 1024
+
+# Журнал повторений пишется пачками: по размеру или по времени
+REVIEW_LOG_BATCH_SIZE = int(os.getenv('REVIEW_LOG_BATCH_SIZE', '200'))
+REVIEW_LOG_FLUSH_SECONDS = float(os.getenv('REVIEW_LOG_FLUSH_SECONDS', '5'))
+# Если база недоступна: сколько записей держим в памяти и после скольких
+# неудачных попыток подряд отбрасываем накопленное
+REVIEW_LOG_MAX_ENTRIES = int(os.getenv('REVIEW_LOG_MAX_ENTRIES', '10000'))
+REVIEW_LOG_MAX_ATTEMPTS = int(os.getenv('REVIEW_LOG_MAX_ATTEMPTS', '5'))
+
+# Кэш списков и счётчиков: locmem:// (по умолчанию, свой в каждом процессе),
+# file:///путь/к/папке или redis://host:port/db — общий для сайта и бота
+CACHE_URL = os.getenv('CACHE_URL', 'locmem://')
+if CACHE_URL.startswith('file://'):
+    CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': CACHE_URL[len('file://'):],
+    }}
+elif CACHE_URL.startswith(('redis://', 'rediss://', 'unix://')):
+    CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': CACHE_URL,
+    }}
+else:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+# Сколько дней хранятся надгробия удалённых карточек для синхронизации.
+# Клиенту с курсором старше этого срока нужна полная синхронизация
+SYNC_TOMBSTONE_DAYS = int(os.getenv('SYNC_TOMBSTONE_DAYS', '90'))
+
+# Сколько секунд живут записи кэша (счётчик «на повторении» зависит от времени)
+CARDS_CACHE_TIMEOUT = int(os.getenv('CARDS_CACHE_TIMEOUT', '60'))
+
+# Метрики: запросы дольше порога пишутся в лог cards.sql;
+# /metrics отдаётся персоналу, по токену (заголовок Authorization: Bearer)
+# и адресам из METRICS_ALLOWED_IPS. По умолчанию адресов нет: за обратным
+# прокси REMOTE_ADDR у всех запросов — адрес прокси (часто 127.0.0.1),
+# и разрешённый localhost открыл бы метрики всему интернету
+SLOW_QUERY_MS = int(os.getenv('SLOW_QUERY_MS', '200'))
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+METRICS_ALLOWED_IPS = [ip for ip in os.getenv('METRICS_ALLOWED_IPS', '').split(',') if ip]
+
 LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = '/'
\ No newline at end of file